@@ -1,5 +1,6 @@
-import time
 import json
+from picopayments import util
+from picopayments.watcher import ChainWatcher
 from picopayments.channel import Payer, Payee
 
 
@@ -8,8 +9,14 @@ PAYEE_WIF = "cNXoRUC2eqcBEv1AmvPgM6NgCYV1ReTTHuAmVxaAh6AvVLHroSfU"
 ASSET = "A14456548018133352000"
 URL = "http://127.0.0.1:14000/api/"
 
-payer = Payer(ASSET, api_url=URL, user="rpc", password="1234", testnet=True)
-payee = Payee(ASSET, api_url=URL, user="rpc", password="1234", testnet=True)
+# one watcher per process polls the chain tip for all channels
+watcher = ChainWatcher(testnet=True)
+watcher.start()
+
+payer = Payer(ASSET, api_url=URL, user="rpc", password="1234", testnet=True,
+              watcher=watcher)
+payee = Payee(ASSET, api_url=URL, user="rpc", password="1234", testnet=True,
+              watcher=watcher)
 
 
 # SETUP CHANNEL (DEPOSIT FUNDS)
@@ -38,8 +45,7 @@ payee.set_deposit(deposit["rawtx"], deposit["script"])
 print("Payee received deposit from payer.")
 
 # wait until deposit is confirmed
-while not payer.is_deposit_confirmed():  # FIXME pass minconfirms
-    time.sleep(1)
+watcher.wait_for_confirms(util.gettxid(deposit["rawtx"]), 1)
 print("Deposit confirmed, channel now open.")
 
 print("Channel transferred quantity {0}.".format(
@@ -101,3 +107,4 @@ print("Payee state:", json.dumps(payee.save(), indent=2))
 
 payer.stop()
 payee.stop()
+watcher.stop()
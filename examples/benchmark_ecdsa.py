@@ -0,0 +1,48 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+# Usage: python examples/benchmark_ecdsa.py [seconds per measurement]
+
+import sys
+import time
+from pycoin import ecdsa
+from picopayments import crypto
+
+
+SECRET_EXPONENT = 0x1337
+SIGN_VALUE = 0xdeadbeef
+
+
+def per_second(func, seconds):
+    count, begin = 0, time.time()
+    while time.time() - begin < seconds:
+        func()
+        count += 1
+    return count / (time.time() - begin)
+
+
+def main(seconds):
+    public_pair = ecdsa.public_pair_for_secret_exponent(
+        ecdsa.generator_secp256k1, SECRET_EXPONENT
+    )
+    print("Selected backend: {0}".format(crypto.get_backend().name))
+    for backend_class in crypto.BACKENDS:
+        try:
+            backend = backend_class()
+        except (OSError, AttributeError) as e:
+            print("{0:>10}: unavailable ({1})".format(backend_class.name, e))
+            continue
+        sig_pair = backend.sign(SECRET_EXPONENT, SIGN_VALUE)
+        signs = per_second(
+            lambda: backend.sign(SECRET_EXPONENT, SIGN_VALUE), seconds
+        )
+        verifies = per_second(
+            lambda: backend.verify(public_pair, SIGN_VALUE, sig_pair), seconds
+        )
+        print("{0:>10}: {1:>10.1f} signatures/s {2:>10.1f} verifications/s"
+              "".format(backend.name, signs, verifies))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
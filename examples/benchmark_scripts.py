@@ -0,0 +1,68 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+# Usage: python examples/benchmark_scripts.py [seconds per measurement]
+
+import sys
+import time
+from pycoin.tx.script import tools
+from picopayments import scripts
+
+
+ARGS = {
+    "payer_pubkey": (
+        "02a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d5"
+    ),
+    "payee_pubkey": (
+        "03c7b09d53bdb0ef9cfea06c1e6f2192e6a91cdeac209402bc36c1c368021a8611"
+    ),
+    "spend_secret_hash": "4cc776751eb4d41f23feaf94697cb7ec2fe597a4",
+}
+
+
+def per_second(func, seconds):
+    count, begin = 0, time.time()
+    while time.time() - begin < seconds:
+        func()
+        count += 1
+    return count / (time.time() - begin)
+
+
+def text_deposit():
+    return tools.compile(scripts.DEPOSIT_SCRIPT.format(
+        expire_time=str(1337), **ARGS
+    ))
+
+
+def text_commit():
+    return tools.compile(scripts.COMMIT_SCRIPT.format(
+        revoke_secret_hash=ARGS["spend_secret_hash"], delay_time=str(1337),
+        **ARGS
+    ))
+
+
+def bytes_deposit():
+    return scripts.compile_deposit_script(expire_time=1337, **ARGS)
+
+
+def bytes_commit():
+    return scripts.compile_commit_script(
+        revoke_secret_hash=ARGS["spend_secret_hash"], delay_time=1337, **ARGS
+    )
+
+
+def main(seconds):
+    assert text_deposit() == bytes_deposit()
+    assert text_commit() == bytes_commit()
+    for name, text, spliced in [("deposit", text_deposit, bytes_deposit),
+                                ("commit", text_commit, bytes_commit)]:
+        text_rate = per_second(text, seconds)
+        spliced_rate = per_second(spliced, seconds)
+        print("{0:>8}: text {1:>10.1f}/s bytes {2:>10.1f}/s ({3:.1f}x)"
+              "".format(name, text_rate, spliced_rate,
+                        spliced_rate / text_rate))
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
@@ -5,6 +5,16 @@
 
 from .version import __version__  # NOQA
 from . import util  # NOQA
+from . import crypto  # NOQA
 from . import scripts  # NOQA
+from . import counterparty  # NOQA
+from . import cache  # NOQA
+from . import ledger  # NOQA
+from . import keyring  # NOQA
+from . import journal  # NOQA
+from . import snapshot  # NOQA
+from . import scheduler  # NOQA
+from . import watcher  # NOQA
+from . import signing  # NOQA
 from . import control  # NOQA
 from . import channel  # NOQA
@@ -0,0 +1,11 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+# python 3.5+ only, not imported by the picopayments package
+from .control import AsyncControl  # NOQA
+from .control import AsyncRpcBatch  # NOQA
+from .channel import AsyncBase  # NOQA
+from .channel import AsyncPayer  # NOQA
+from .channel import AsyncPayee  # NOQA
@@ -0,0 +1,282 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import os
+import asyncio
+from picopayments import util
+from picopayments.channel import Base
+from picopayments.channel import Payer
+from picopayments.channel import Payee
+from picopayments.scripts import get_deposit_expire_time
+from picopayments.scripts import get_commit_delay_time
+from picopayments.aio.control import AsyncControl
+
+
+class AsyncBase(Base):
+    """Channel state machine with coroutines for all blockchain queries.
+
+    State changing operations are serialized by an asyncio lock. Local
+    operations without remote calls (save, revoke, ...) are inherited
+    unchanged. Auto update threads are not supported, schedule update
+    in the event loop instead.
+    """
+
+    control_class = AsyncControl
+    _async_mutex = None
+
+    def _get_async_mutex(self):
+        # created lazily so the lock binds to the running loop
+        if self._async_mutex is None:
+            self._async_mutex = asyncio.Lock()
+        return self._async_mutex
+
+    async def load(self, data):
+        rawtxs = [commit["rawtx"] for commit in data["commits_active"]]
+        quantities = await self.control.get_quantities(rawtxs)
+        async with self._get_async_mutex():
+            self._load(data, quantities)
+
+    async def _get_height(self, watcher, max_age=None):
+        # the watcher may query the chain tip, keep it out of the loop
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, watcher.get_height, max_age)
+
+    async def get_confirms(self, rawtx):
+        """Returns confirms of rawtx, see Base.get_confirms."""
+        txid = util.gettxid(rawtx)
+        watcher = self.control.get_watcher()
+        tip_height = await self._get_height(watcher)
+        confirms = self._get_cached_confirms(txid, watcher, tip_height)
+        if confirms is not None:
+            return confirms
+        confirms = (await self.control.confirms(txid)) or 0
+        if confirms > 0:
+            fresh_height = await self._get_height(watcher, max_age=0)
+            self._set_confirm_height(txid, confirms, tip_height,
+                                     fresh_height)
+        return confirms
+
+    async def get_deposit_confirms(self):
+        assert(self.deposit_rawtx is not None)
+        assert(self.deposit_script_hex is not None)
+        return await self.get_confirms(self.deposit_rawtx)
+
+    async def get_timeout_confirms(self):
+        assert(self.timeout_rawtx is not None)
+        return await self.get_confirms(self.timeout_rawtx)
+
+    async def get_change_confirms(self):
+        assert(self.change_rawtx is not None)
+        return await self.get_confirms(self.change_rawtx)
+
+    async def is_deposit_confirmed(self):
+        return (await self.get_deposit_confirms()) > 0
+
+    async def is_deposit_expired(self):
+        script = util.h2b(self.deposit_script_hex)
+        t = get_deposit_expire_time(script)
+        return (await self.get_deposit_confirms()) >= t
+
+    async def is_timeout_confirmed(self):
+        assert(self.timeout_rawtx is not None)
+        return (await self.get_timeout_confirms()) > 0
+
+    async def is_change_confirmed(self):
+        assert(self.change_rawtx is not None)
+        return (await self.get_change_confirms()) > 0
+
+    async def is_closing(self):
+        unconfirmed_change = (
+            self.change_rawtx is not None and
+            not await self.is_change_confirmed()
+        )
+        unconfirmed_timeout = (
+            self.timeout_rawtx is not None and
+            not await self.is_timeout_confirmed()
+        )
+        return unconfirmed_change or unconfirmed_timeout
+
+    async def is_closed(self):
+        return (
+            self.change_rawtx is not None and
+            await self.is_change_confirmed() or
+            self.timeout_rawtx is not None and
+            await self.is_timeout_confirmed()
+        )
+
+    async def get_blocks_until_deadline(self):
+        """Returns blocks until the next deadline, see Base."""
+        deposit_confirms = None
+        if self._is_deposit_pending():
+            deposit_confirms = await self.get_deposit_confirms()
+        recover_confirms = [
+            await self.get_confirms(rawtx) for rawtx in self._get_recovers()
+        ]
+        commit_confirms = [
+            (commit["script"], await self.get_confirms(commit["rawtx"]))
+            for commit in self._get_published_commits()
+        ]
+        return self._get_blocks_until_deadline(
+            deposit_confirms, recover_confirms, commit_confirms
+        )
+
+    async def get_deposit_total(self):
+        """Returns the total deposit amount"""
+        assert(self.deposit_rawtx is not None)
+        return await self.control.get_quantity(self.deposit_rawtx)
+
+    async def get_deposit_remaining(self):
+        """Returns the remaining deposit amount"""
+        total = await self.get_deposit_total()
+        return total - self.get_transferred_amount()
+
+    async def _validate_transfer_quantity(self, quantity):
+        transferred = self.get_transferred_amount()
+        if quantity <= transferred:
+            msg = "Amount not greater transferred: {0} <= {1}"
+            raise ValueError(msg.format(quantity, transferred))
+
+        total = await self.get_deposit_total()
+        if quantity > total:
+            msg = "Amount greater total: {0} > {1}"
+            raise ValueError(msg.format(quantity, total))
+
+
+class AsyncPayer(AsyncBase, Payer):
+
+    async def can_timeout_recover(self):
+        return (
+            # we know the payer wif
+            self.payer_wif is not None and
+
+            # deposit was made
+            self.deposit_rawtx is not None and
+            self.deposit_script_hex is not None and
+
+            # deposit expired
+            await self.is_deposit_expired() and
+
+            # not already recovering
+            not await self.is_closing()
+        )
+
+    async def update(self):
+        async with self._get_async_mutex():
+
+            # If deposit expired recover the coins!
+            if await self.can_timeout_recover():
+                await self._timeout_recover()
+
+            # If spend secret exposed recover the coins!
+            if self.can_change_recover():
+                await self._change_recover()
+
+    async def deposit(self, payer_wif, payee_pubkey, spend_secret_hash,
+                      expire_time, quantity):
+        """Create deposit for given quantity, see Payer.deposit."""
+        async with self._get_async_mutex():
+            self.clear()
+            self._set(payer_wif=payer_wif)
+            rawtx, script = await self.control.create_deposit(
+                self.payer_wif, payee_pubkey,
+                spend_secret_hash, expire_time, quantity
+            )
+            self._set(deposit_rawtx=rawtx,
+                      deposit_script_hex=util.b2h(script))
+            await self.control.publish(rawtx, scripts=[script])
+            return {"rawtx": rawtx, "script": util.b2h(script)}
+
+    async def timeout_recover(self):
+        async with self._get_async_mutex():
+            await self._timeout_recover()
+
+    async def _timeout_recover(self):
+        script = util.h2b(self.deposit_script_hex)
+        rawtx = await self.control.create_timeout_recover(self.payer_wif,
+                                                          script)
+        await self._publish_recover("timeout_rawtx", rawtx)
+
+    async def change_recover(self):
+        async with self._get_async_mutex():
+            await self._change_recover()
+
+    async def _change_recover(self):
+        script = util.h2b(self.deposit_script_hex)
+        rawtx = await self.control.create_change_recover(
+            self.payer_wif, script, self.spend_secret
+        )
+        await self._publish_recover("change_rawtx", rawtx)
+
+    async def _publish_recover(self, field, rawtx):
+        self._set(**{field: rawtx})
+        try:
+            await self.control.publish(rawtx)
+        except Exception:
+            self._set(**{field: None})
+            raise
+
+    async def create_commit(self, quantity, revoke_secret_hash, delay_time):
+        async with self._get_async_mutex():
+            await self._validate_transfer_quantity(quantity)
+            self._validate_revoke_secret_hash(revoke_secret_hash)
+            rawtx, script = await self.control.create_commit(
+                self.payer_wif, util.h2b(self.deposit_script_hex),
+                quantity, revoke_secret_hash, delay_time
+            )
+            script_hex = util.b2h(script)
+            commit = {
+                "rawtx": rawtx, "script": script_hex, "revoke_secret": None
+            }
+            self._add_active(commit, quantity)
+            self._record("active", commit, quantity)
+            return {"rawtx": rawtx, "script": script_hex}
+
+
+class AsyncPayee(AsyncBase, Payee):
+
+    async def request_commit(self, quantity):
+        async with self._get_async_mutex():
+            await self._validate_transfer_quantity(quantity)
+            self._expire_commit_requests()
+            secret = util.b2h(os.urandom(32))  # secure random number
+            secret_hash = self._add_commit_request(secret)
+            requested = self.commits_requested[secret_hash][1]
+            self._record("request", secret, requested)
+            return quantity, secret_hash
+
+    async def set_commit(self, rawtx, script_hex):
+        async with self._get_async_mutex():
+            self._assert_open_state()
+            quantity = await self.control.get_quantity(rawtx)
+            return self._set_commit(rawtx, script_hex, quantity)
+
+    async def close_channel(self):
+        async with self._get_async_mutex():
+            self._assert_open_state()
+            assert(len(self.commits_active) > 0)
+            commit = self.commits_active[-1]
+            rawtx = await self.control.finalize_commit(
+                self.payee_wif, commit["rawtx"],
+                util.h2b(self.deposit_script_hex)
+            )
+            commit["rawtx"] = rawtx  # update commit
+            self._record("finalize", rawtx)
+            return util.gettxid(rawtx)
+
+    async def update(self):
+        async with self._get_async_mutex():
+
+            if await self.can_payout_recover():
+                self.payout_recover()
+
+    async def can_payout_recover(self):
+        for commit in (self.commits_active + self.commits_revoked):
+            rawtx = commit["rawtx"]
+            if self.control.can_publish(rawtx):
+                delay_time = get_commit_delay_time(commit["script"])
+                confirms = await self.get_confirms(rawtx)
+                if confirms >= delay_time:
+                    return True
+        return False
@@ -0,0 +1,401 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import json
+import base64
+import asyncio
+import functools
+import pycoin
+from pycoin.convention import btc_to_satoshi
+from picopayments import util
+from picopayments.control import Control
+from picopayments.control import RpcBatch
+from picopayments.control import RpcCache
+from picopayments.control import DEFAULT_BITCOIND_RPC_URL
+from picopayments.control import DEFAULT_POOL_SIZE
+from picopayments.scripts import get_commit_delay_time
+from picopayments.scripts import get_deposit_expire_time
+from picopayments.scripts import compile_deposit_script
+
+
+class AsyncRpcBatch(RpcBatch):
+
+    async def send(self, timeout=None):
+        """Send all collected calls in one round trip.
+
+        Return:
+            Dict of request id to call result.
+        """
+        if not self.payloads:
+            return {}
+        payloads, self.payloads = self.payloads, []
+        return await self.control._rpc_call(payloads, timeout=timeout)
+
+
+class AsyncControl(Control):
+
+    def __init__(self, *args, **kwargs):
+        """Payment channel controler with coroutines for all remote calls.
+
+        Takes the same arguments as Control plus the optional keyword
+        arguments http_session (an aiohttp.ClientSession shared between
+        controls), insight_url and bitcoind_url. Requires aiohttp if no
+        http_session is given.
+        """
+        self.http_session = kwargs.pop("http_session", None)
+        insight_url = kwargs.pop("insight_url", None)
+        self.pool_size = kwargs.get("pool_size", DEFAULT_POOL_SIZE)
+        self.bitcoind_url = kwargs.pop("bitcoind_url",
+                                       DEFAULT_BITCOIND_RPC_URL)
+        super(AsyncControl, self).__init__(*args, **kwargs)
+        self.insight_url = insight_url or self.btctxstore.service.base_url
+
+    def _get_http_session(self):
+        if self.http_session is None:
+            import aiohttp  # optional dependency
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.http_session = aiohttp.ClientSession(connector=connector)
+        return self.http_session
+
+    async def close(self):
+        if self.http_session is not None:
+            await self.http_session.close()
+
+    async def _http_get(self, url):
+        """Return (status, parsed json) of a http get request."""
+        session = self._get_http_session()
+        async with session.get(url, timeout=self.timeout) as response:
+            text = await response.text()
+            if response.status != 200:
+                return response.status, None
+            return response.status, json.loads(text)
+
+    def _auth_header(self):
+        """Basic auth header, so no aiohttp import is needed to build it."""
+        credentials = "{0}:{1}".format(self.user, self.password)
+        token = base64.b64encode(credentials.encode("utf-8"))
+        return "Basic " + token.decode("ascii")
+
+    async def _http_post(self, url, payload, headers=None, timeout=None):
+        session = self._get_http_session()
+        headers = dict(headers or {}, **{'content-type': 'application/json'})
+        async with session.post(url, data=json.dumps(payload),
+                                headers=headers,
+                                timeout=timeout or self.timeout) as response:
+            return await response.text()
+
+    async def _rpc_call(self, payload, timeout=None):
+        results, missing = self._rpc_cache_lookup(payload)
+        if missing:
+            fetched = await self._rpc_post(missing, timeout=timeout)
+            results.update(self._rpc_cache_store(missing, fetched))
+        if isinstance(payload, list):
+            return results
+        return results[payload["id"]]
+
+    async def _rpc_post(self, payload, timeout=None):
+        headers = {"Authorization": self._auth_header()}
+        text = await self._http_post(self.api_url, payload, headers=headers,
+                                     timeout=timeout)
+        return self._rpc_parse(payload, text)
+
+    def batch(self):
+        return AsyncRpcBatch(self)
+
+    async def get_tx(self, tx_hash):
+        """Get transaction from memory, the persistent cache or remotely."""
+        tx = self.tx_cache.get(tx_hash)
+        if tx is not None:
+            return tx
+        txid = util.b2h_rev(tx_hash)
+        if self.rpc_cache is not None:
+            rawtx = self.rpc_cache.get(RpcCache.key("get_tx", txid))
+            if rawtx is not None:
+                return self.add_tx(rawtx, persist=False)
+        url = "{0}/rawtx/{1}".format(self.insight_url, txid)
+        status, result = await self._http_get(url)
+        if result is None:
+            raise Exception("Transaction lookup failed: {0}".format(status))
+        return self.add_tx(result["rawtx"])
+
+    async def _add_unspents(self, tx):
+        for txin in tx.txs_in:
+            utxo_tx = await self.get_tx(txin.previous_hash)
+            tx.unspents.append(utxo_tx.txs_out[txin.previous_index])
+
+    async def get_utxos(self, address):
+        if self.ledger.is_tracked(address):
+            return self.ledger.get_utxos(address)
+        url = "{0}/addr/{1}/utxo".format(self.insight_url, address)
+        status, result = await self._http_get(url)
+        if result is None:
+            raise Exception("Utxo lookup failed: {0}".format(status))
+        utxos = []
+        for utxo in result:
+            utxos.append({
+                "txid": utxo["txid"],
+                "index": utxo["vout"],
+                "value": btc_to_satoshi(str(utxo["amount"])),
+                "script": utxo["scriptPubKey"]
+            })
+        return utxos
+
+    async def confirms(self, txid):
+        """Returns number of confirms or None if unpublished."""
+        if self.watcher is not None and self.watcher.is_watched(txid):
+            return self.watcher.get_confirms(txid)
+        url = "{0}/tx/{1}".format(self.insight_url, txid)
+        status, result = await self._http_get(url)
+        if status == 404:  # unpublished tx
+            return None
+        if result is None:
+            raise Exception("Transaction lookup failed: {0}".format(status))
+        return result.get("confirmations", 0)
+
+    async def create_tx(self, source_address, dest_address, quantity,
+                        extra_btc=0):
+        utxos = await self.get_utxos(source_address)
+        return self._build_send_tx(utxos, source_address, dest_address,
+                                   quantity, extra_btc)
+
+    async def get_balance(self, address):
+        return (await self.get_balances([address]))[0]
+
+    async def get_balances(self, addresses):
+        batch, request_ids = self._balance_requests(addresses)
+        results = await batch.send()
+        balances = []
+        for address in addresses:
+            if address not in request_ids:
+                balances.append(self.ledger.get_balance(address))
+                continue
+            asset_balance = results[request_ids[address]][0]["quantity"]
+            utxos = await self.get_utxos(address)
+            btc_balance = sum(map(lambda utxo: utxo["value"], utxos))
+            balances.append((asset_balance, btc_balance))
+        return balances
+
+    async def publish(self, rawtx, scripts=None):
+        """Broadcast rawtx, the ledger is only updated if that succeeds."""
+        if self.dryrun:
+            print("PUBLISH:", rawtx)
+        else:
+            text = await self._http_post(self.bitcoind_url, {
+                "method": "sendrawtransaction",
+                "params": [rawtx],
+                "jsonrpc": "1.0",
+                "id": 0,
+            })
+            response_data = json.loads(text)
+            if response_data.get("error") is not None:
+                raise Exception("Publish failed! {0}".format(repr(text)))
+        self.observe(rawtx, scripts=scripts)
+
+    async def get_quantity(self, rawtx):
+        return (await self.get_quantities([rawtx]))[0]
+
+    async def get_quantities(self, rawtxs):
+        quantities = self._decode_quantities(rawtxs)
+        if self.rpc_verify and rawtxs:
+            rpc_quantities = await self._rpc_get_quantities(rawtxs)
+            self._verify_quantities(quantities, rpc_quantities)
+        return quantities
+
+    async def _rpc_get_quantities(self, rawtxs):
+        batch = self.batch()
+        request_ids = [
+            batch.add("get_tx_info", {"tx_hex": rawtx}) for rawtx in rawtxs
+        ]
+        results = await batch.send()
+        batch, unpack_ids = self._unpack_requests(request_ids, results)
+        results = await batch.send()
+        return [self._unpacked_quantity(results[i]) for i in unpack_ids]
+
+    async def _valid_deposit_request(self, payer_wif, payee_pubkey,
+                                     spend_secret_hash, expire_time,
+                                     quantity):
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise ValueError()
+        address = self.keyring.wif2address(payer_wif)
+        asset_balance, btc_balance = await self.get_balance(address)
+        self._check_deposit_funds(quantity, asset_balance, btc_balance)
+
+    async def deposit(self, payer_wif, payee_pubkey, spend_secret_hash,
+                      expire_time, quantity):
+        rawtx, script = await self.create_deposit(
+            payer_wif, payee_pubkey, spend_secret_hash, expire_time, quantity
+        )
+        await self.publish(rawtx, scripts=[script])
+        return rawtx, script
+
+    async def create_deposit(self, payer_wif, payee_pubkey,
+                             spend_secret_hash, expire_time, quantity):
+
+        await self._valid_deposit_request(payer_wif, payee_pubkey,
+                                          spend_secret_hash, expire_time,
+                                          quantity)
+
+        payer_pubkey = self.keyring.wif2pubkey(payer_wif)
+        script = compile_deposit_script(payer_pubkey, payee_pubkey,
+                                        spend_secret_hash, expire_time)
+        dest_address = util.script2address(script, self.netcode)
+        payer_address = self.keyring.wif2address(payer_wif)
+
+        rawtx = await self.create_tx(payer_address, dest_address, quantity,
+                                     extra_btc=self._deposit_extra_btc())
+        tx = pycoin.tx.Tx.from_hex(rawtx)
+        await self._add_unspents(tx)
+        rawtx = await self._sign_deposit(tx, payer_wif)
+        self.add_tx(rawtx)
+        return rawtx, script
+
+    async def _run_in_executor(self, func, *args, **kwargs):
+        # signing is cpu bound or waits on the signing pool
+        loop = asyncio.get_event_loop()
+        call = functools.partial(func, *args, **kwargs)
+        return await loop.run_in_executor(None, call)
+
+    async def _sign(self, kind, tx, **kwargs):
+        return await self._run_in_executor(Control._sign, self, kind, tx,
+                                           **kwargs)
+
+    async def sign_all(self, jobs):
+        """Sign jobs off the event loop, see Control.sign_all."""
+        return await self._run_in_executor(Control.sign_all, self, jobs)
+
+    async def _sign_deposit(self, tx, payer_wif):
+        return await self._sign("deposit", tx, payer_wif=payer_wif)
+
+    async def _sign_create_commit(self, tx, payer_wif, deposit_script):
+        return await self._sign("create_commit", tx, payer_wif=payer_wif,
+                                deposit_script=deposit_script)
+
+    async def _sign_recover_deposit(self, tx, wif, script, spend_type,
+                                    spend_secret):
+        rawtx = await self._sign("recover_deposit", tx, wif=wif,
+                                 script=script, spend_type=spend_type,
+                                 spend_secret=spend_secret)
+        assert(self.can_publish(rawtx))
+        return rawtx
+
+    async def create_commit(self, payer_wif, deposit_script, quantity,
+                            revoke_secret_hash, delay_time):
+        commit_script = self._compile_commit_script(
+            payer_wif, deposit_script, revoke_secret_hash, delay_time
+        )
+        src_address = util.script2address(deposit_script, self.netcode)
+        dest_address = util.script2address(commit_script, self.netcode)
+        asset_balance, btc_balance = await self.get_balance(src_address)
+        extra_btc = self._commit_extra_btc(quantity, asset_balance,
+                                           btc_balance)
+        rawtx = await self.create_tx(src_address, dest_address,
+                                     quantity, extra_btc=extra_btc)
+        tx = pycoin.tx.Tx.from_hex(rawtx)
+        await self._add_unspents(tx)
+        rawtx = await self._sign_create_commit(tx, payer_wif, deposit_script)
+        return rawtx, commit_script
+
+    async def finalize_commit(self, payee_wif, commit_rawtx, deposit_script):
+        return (await self.finalize_commits([
+            (payee_wif, commit_rawtx, deposit_script)
+        ]))[0]
+
+    async def finalize_commits(self, commits):
+        jobs = []
+        for payee_wif, commit_rawtx, deposit_script in commits:
+            tx = pycoin.tx.Tx.from_hex(commit_rawtx)
+            await self._add_unspents(tx)
+            jobs.append(self._create_job(
+                "finalize_commit", tx, payee_wif=payee_wif,
+                deposit_script=deposit_script
+            ))
+        rawtxs = await self.sign_all(jobs)
+        for rawtx in rawtxs:
+            self.add_tx(rawtx)
+            await self.publish(rawtx)
+        return rawtxs
+
+    async def _recover_tx(self, dest_address, script, sequence=None):
+        src_address = util.script2address(script, self.netcode)
+        self.ledger.forget(src_address)  # counterparty may have spent it
+        asset_balance, btc_balance = await self.get_balance(src_address)
+        rawtx = await self.create_tx(src_address, dest_address, asset_balance,
+                                     extra_btc=btc_balance - self.fee)
+        tx = self._prepare_recover_tx(rawtx, sequence)
+        await self._add_unspents(tx)
+        return tx
+
+    async def _recover_commit(self, wif, script, revoke_secret,
+                              spend_secret, spend_type):
+        return (await self._recover_commits([
+            (wif, script, revoke_secret, spend_secret, spend_type)
+        ]))[0]
+
+    async def _recover_commits(self, recovers):
+        jobs = []
+        for wif, script, revoke_secret, spend_secret, spend_type in recovers:
+            dest_address = self.keyring.wif2address(wif)
+            delay_time = get_commit_delay_time(script)
+            tx = await self._recover_tx(dest_address, script, delay_time)
+            jobs.append(self._create_job(
+                "recover_commit", tx, wif=wif, script=script,
+                revoke_secret=revoke_secret, spend_secret=spend_secret,
+                spend_type=spend_type
+            ))
+        rawtxs = await self.sign_all(jobs)
+        for rawtx in rawtxs:
+            assert(self.can_publish(rawtx))
+            await self.publish(rawtx)
+        return rawtxs
+
+    async def _recover_deposit(self, wif, script, spend_type, spend_secret):
+        rawtx = await self._create_recover_deposit(wif, script, spend_type,
+                                                   spend_secret)
+        await self.publish(rawtx)
+        return rawtx
+
+    async def _create_recover_deposit(self, wif, script, spend_type,
+                                      spend_secret):
+        dest_address = self.keyring.wif2address(wif)
+        expire_time = get_deposit_expire_time(script)
+        sequence = expire_time if spend_type == "timeout" else None
+        tx = await self._recover_tx(dest_address, script, sequence)
+        return await self._sign_recover_deposit(tx, wif, script, spend_type,
+                                                spend_secret)
+
+    async def payout_recover(self, wif, script, spend_secret):
+        return await self._recover_commit(wif, script, None, spend_secret,
+                                          "payout")
+
+    async def revoke_recover(self, wif, script, revoke_secret):
+        return await self._recover_commit(wif, script, revoke_secret, None,
+                                          "revoke")
+
+    async def payout_recover_all(self, recovers):
+        return await self._recover_commits([
+            (wif, script, None, spend_secret, "payout")
+            for wif, script, spend_secret in recovers
+        ])
+
+    async def revoke_recover_all(self, recovers):
+        return await self._recover_commits([
+            (wif, script, revoke_secret, None, "revoke")
+            for wif, script, revoke_secret in recovers
+        ])
+
+    async def timeout_recover(self, wif, script):
+        return await self._recover_deposit(wif, script, "timeout", None)
+
+    async def change_recover(self, wif, script, spend_secret):
+        return await self._recover_deposit(wif, script, "change",
+                                           spend_secret)
+
+    async def create_timeout_recover(self, wif, script):
+        return await self._create_recover_deposit(wif, script, "timeout",
+                                                  None)
+
+    async def create_change_recover(self, wif, script, spend_secret):
+        return await self._create_recover_deposit(wif, script, "change",
+                                                  spend_secret)
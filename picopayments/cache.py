@@ -0,0 +1,123 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAX_ENTRIES = 100000
+EVICT_INTERVAL = 1000  # inserts between eviction checks
+DEFAULT_LRU_SIZE = 1000
+
+
+class LruCache(object):
+
+    def __init__(self, max_entries=DEFAULT_LRU_SIZE):
+        """Thread safe in memory cache evicting least recently used entries.
+
+        Args:
+            max_entries (int): Max number of entries kept in memory.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._mutex = threading.RLock()
+
+    def get(self, key):
+        """Return cached value for key or None if not cached."""
+        with self._mutex:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value  # move to most recently used
+            return value
+
+    def set(self, key, value):
+        with self._mutex:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._mutex:
+            return key in self._entries
+
+    def __len__(self):
+        with self._mutex:
+            return len(self._entries)
+
+
+class RpcCache(object):
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        """Persistent cache for immutable counterparty api results.
+
+        Entries are keyed by a hash of the call method and params, so any
+        number of processes on one host can share the same cache file.
+
+        Args:
+            path (str): Sqlite database file to store the cache in.
+            max_entries (int): Oldest entries are evicted above this size.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._inserts = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT, created REAL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_created ON cache (created)"
+            )
+
+    def _connection(self):
+        # sqlite connections may not be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def key(method, params):
+        data = json.dumps([method, params], sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return cached value for key or None if not cached."""
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, value):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created) "
+                "VALUES (?, ?, ?)", (key, json.dumps(value), time.time())
+            )
+        self._inserts += 1
+        if self._inserts % EVICT_INTERVAL == 0:
+            self.evict()
+
+    def evict(self):
+        """Remove oldest entries until at most max_entries remain."""
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM cache"
+        ).fetchone()
+        return row[0]
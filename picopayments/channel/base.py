@@ -4,12 +4,16 @@
 
 
 import copy
+import time
+import bisect
+from collections import OrderedDict
 from threading import RLock
 from picopayments import util
 from picopayments import control
 from picopayments.scripts import get_deposit_spend_secret_hash
 from picopayments.scripts import get_deposit_expire_time
 from picopayments.scripts import get_commit_revoke_secret_hash
+from picopayments.scripts import get_commit_delay_time
 
 
 class Base(util.UpdateThreadMixin):
@@ -25,9 +29,16 @@ class Base(util.UpdateThreadMixin):
     # Quantity not needed as payer may change it. If its heigher its against
     # our self intrest to throw away money. If its lower it gives us a better
     # resolution when reversing the channel.
-    commits_requested = []  # ["revoke_secret_hex"]
+    # pending requests by revoke secret hash, oldest first
+    commits_requested = OrderedDict()  # {
+    #                                      "revoke_secret_hash_hex": (
+    #                                          "revoke_secret_hex",
+    #                                          request unixtime
+    #                                      )
+    #                                  }
 
     # must be ordered lowest to heighest at all times!
+    # use _add_active and revoke_all to keep the quantity index in sync
     commits_active = []     # [{
     #                             "rawtx": hex,
     #                             "script": hex,
@@ -40,27 +51,45 @@ class Base(util.UpdateThreadMixin):
     #                            "revoke_secret": hex
     #                         }]
 
+    # quantities of commits_active, same order, set once when commit is added
+    active_quantities = []  # [int]
+
+    # commits_active by revoke secret hash, kept in sync by _add_active
+    active_revoke_hashes = {}  # {revoke_secret_hash_hex: (quantity, commit)}
+
+    # block heights transactions were first seen confirmed in
+    confirm_heights = {}  # {txid: height}
+    forks_seen = 0  # number of chain watcher reorgs already handled
+
+    # optional write ahead log of all state changes, see open_journal
+    journal = None
+
+    control_class = control.Control
+
     def __init__(self, asset, user=control.DEFAULT_COUNTERPARTY_RPC_USER,
                  password=control.DEFAULT_COUNTERPARTY_RPC_PASSWORD,
                  api_url=None, testnet=control.DEFAULT_TESTNET, dryrun=False,
-                 auto_update_interval=0):
+                 auto_update_interval=0, scheduler=None, watcher=None,
+                 max_update_interval=None):
 
         # TODO validate input
 
-        self.control = control.Control(
+        self.control = self.control_class(
             asset, user=user, password=password, api_url=api_url,
             testnet=testnet, dryrun=dryrun, fee=control.DEFAULT_TXFEE,
-            dust_size=control.DEFAULT_DUSTSIZE
+            dust_size=control.DEFAULT_DUSTSIZE, watcher=watcher
         )
+        self.keyring = self.control.keyring
 
         self.mutex = RLock()
+        self.clear()
         if auto_update_interval > 0:
             self.interval = auto_update_interval
-            self.start()
+            self.max_interval = max_update_interval
+            self.start(scheduler=scheduler)
 
     def save(self):
         with self.mutex:
-            self._order_active()
             return copy.deepcopy({
                 "payer_wif": self.payer_wif,
                 "payee_wif": self.payee_wif,
@@ -69,13 +98,24 @@ class Base(util.UpdateThreadMixin):
                 "deposit_rawtx": self.deposit_rawtx,
                 "timeout_rawtx": self.timeout_rawtx,
                 "change_rawtx": self.change_rawtx,
-                "commits_requested": self.commits_requested,
+                "commits_requested": [
+                    secret for secret, requested in
+                    self.commits_requested.values()
+                ],
+                "commits_requested_times": [
+                    requested for secret, requested in
+                    self.commits_requested.values()
+                ],
                 "commits_active": self.commits_active,
                 "commits_revoked": self.commits_revoked,
             })
 
     def load(self, data):
         # TODO validate input
+        rawtxs = [commit["rawtx"] for commit in data["commits_active"]]
+        self._load(data, self.control.get_quantities(rawtxs))
+
+    def _load(self, data, active_quantities):
         with self.mutex:
             data = copy.deepcopy(data)
             self.payer_wif = data["payer_wif"]
@@ -85,10 +125,35 @@ class Base(util.UpdateThreadMixin):
             self.deposit_rawtx = data["deposit_rawtx"]
             self.timeout_rawtx = data["timeout_rawtx"]
             self.change_rawtx = data["change_rawtx"]
-            self.commits_requested = data["commits_requested"]
-            self.commits_active = data["commits_active"]
+            self.commits_requested = OrderedDict()
+            secrets = data["commits_requested"]
+            times = data.get("commits_requested_times")
+            if times is None:  # saved before request times were kept
+                times = [None] * len(secrets)
+            for secret, requested in zip(secrets, times):
+                self._add_commit_request(secret, requested)
             self.commits_revoked = data["commits_revoked"]
-            self._order_active()
+            self.commits_active = []
+            self.active_quantities = []
+            self.active_revoke_hashes = {}
+            commits = data["commits_active"]
+            for commit, quantity in zip(commits, active_quantities):
+                self._add_active(commit, quantity)
+            self._add_known_txs()
+            if self.journal is not None:
+                self._compact_journal()
+
+    def _add_known_txs(self):
+        with self.mutex:
+
+            # known transactions never need to be looked up for signing,
+            # they are kept in the channel state so need no persisting
+            if self.deposit_rawtx is not None:
+                self.control.add_tx(self.deposit_rawtx, persist=False)
+                script = util.h2b(self.deposit_script_hex)
+                self.control.observe(self.deposit_rawtx, scripts=[script])
+            for commit in self.commits_active + self.commits_revoked:
+                self.control.add_tx(commit["rawtx"], persist=False)
 
     def clear(self):
         with self.mutex:
@@ -99,14 +164,134 @@ class Base(util.UpdateThreadMixin):
             self.deposit_rawtx = None
             self.timeout_rawtx = None
             self.change_rawtx = None
-            self.commits_requested = []
+            self.commits_requested = OrderedDict()
             self.commits_active = []
+            self.active_quantities = []
+            self.active_revoke_hashes = {}
             self.commits_revoked = []
+            self.confirm_heights = {}
+            self._record("clear")
+
+    def open_journal(self, journal):
+        """Restore state from journal and record all further changes in it.
+
+        Replaces the current state with the journals snapshot and
+        replays the records after it, no remote calls are made.
+        """
+        with self.mutex:
+            self.journal = None  # replay must not be recorded again
+            state, records = journal.read()
+            if state is not None:
+                self._load(state["channel"], state["active_quantities"])
+            for record in records:
+                getattr(self, "_replay_" + record[0])(*record[1:])
+            self._add_known_txs()
+            self.journal = journal
+            self._compact_journal()
+
+    def _compact_journal(self):
+        self.journal.compact({
+            "channel": self.save(),
+            "active_quantities": self.active_quantities
+        })
+
+    def _record(self, op, *args):
+        """Append a state change to the journal if one is open.
+
+        Must be called after the change is applied, as the journal may be
+        compacted into a snapshot of the current state right away.
+        """
+        if self.journal is not None and self.journal.append(op, *args):
+            self._compact_journal()
+
+    def _set(self, **fields):
+        with self.mutex:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._record("set", fields)
+
+    def _replay_set(self, fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def _replay_clear(self):
+        self.clear()
+
+    def _replay_request(self, secret, requested=None):
+        self._add_commit_request(secret, requested)
+
+    def _replay_expire(self, secret_hashes):
+        for secret_hash in secret_hashes:
+            self.commits_requested.pop(secret_hash, None)
+
+    def _replay_active(self, commit, quantity):
+        script = util.h2b(commit["script"])
+        self.commits_requested.pop(get_commit_revoke_secret_hash(script),
+                                   None)
+        self._add_active(commit, quantity)
+
+    def _replay_revoke(self, secrets):
+        self.revoke_all(secrets)
+
+    def _replay_finalize(self, rawtx):
+        self.commits_active[-1]["rawtx"] = rawtx
+
+    def _add_commit_request(self, secret, requested=None):
+        """Add pending request, requested defaults to now."""
+        if requested is None:
+            requested = time.time()
+        secret_hash = self.keyring.hash160hex(secret)
+        self.commits_requested[secret_hash] = (secret, requested)
+        return secret_hash
 
     def get_confirms(self, rawtx):
+        """Returns confirms of rawtx, 0 if unconfirmed or unpublished.
+
+        The inclusion height is recorded the first time a transaction is
+        seen confirmed, after that confirms are derived from the shared
+        chain tip height without remote queries.
+        """
         with self.mutex:
             txid = util.gettxid(rawtx)
-            return self.control.btctxstore.confirms(txid) or 0
+            watcher = self.control.get_watcher()
+            tip_height = watcher.get_height()
+            confirms = self._get_cached_confirms(txid, watcher, tip_height)
+            if confirms is not None:
+                return confirms
+            confirms = self.control.confirms(txid) or 0
+            if confirms > 0:
+                fresh_height = watcher.get_height(max_age=0)
+                self._set_confirm_height(txid, confirms, tip_height,
+                                         fresh_height)
+            return confirms
+
+    def _get_cached_confirms(self, txid, watcher, tip_height):
+        """Return confirms derived from the inclusion height or None."""
+        self._invalidate_confirm_heights(watcher)
+        height = self.confirm_heights.get(txid)
+        if height is not None and height <= tip_height:
+            return tip_height - height + 1
+        return None
+
+    def _set_confirm_height(self, txid, confirms, tip_height, fresh_height):
+        """Record inclusion height if confirms were queried at tip_height.
+
+        Confirms are only known to match the tip if it did not change
+        between the cached and the fresh tip height, otherwise the height
+        is recorded on a later call.
+        """
+        if fresh_height == tip_height:
+            self.confirm_heights[txid] = tip_height - confirms + 1
+
+    def _invalidate_confirm_heights(self, watcher):
+        """Forget inclusion heights of blocks replaced by a reorg."""
+        with self.mutex:
+            self.forks_seen, fork = watcher.get_forks(self.forks_seen)
+            if fork is None:
+                return
+            for txid, height in list(self.confirm_heights.items()):
+                if height >= fork:
+                    del self.confirm_heights[txid]
 
     def get_deposit_confirms(self):
         with self.mutex:
@@ -146,15 +331,11 @@ class Base(util.UpdateThreadMixin):
 
     def is_timeout_confirmed(self):
         with self.mutex:
-            assert(self.timeout_rawtx is not None)
-            txid = util.gettxid(self.timeout_rawtx)
-            return bool(self.control.btctxstore.confirms(txid))
+            return self.get_timeout_confirms() > 0
 
     def is_change_confirmed(self):
         with self.mutex:
-            assert(self.change_rawtx is not None)
-            txid = util.gettxid(self.change_rawtx)
-            return bool(self.control.btctxstore.confirms(txid))
+            return self.get_change_confirms() > 0
 
     def is_closing(self):
         with self.mutex:
@@ -175,19 +356,94 @@ class Base(util.UpdateThreadMixin):
                 self.timeout_rawtx is not None and self.is_timeout_confirmed()
             )
 
+    def get_blocks_until_deadline(self):
+        """Returns blocks until the next state change update must act on.
+
+        Deadlines are the deposit confirming and expiring, the commit delay
+        of published commits passing and recover transactions confirming.
+        Deadlines already passed are not pending, as waiting for them
+        again would poll at the fastest interval forever.
+
+        Return:
+            Number of blocks, or None if no deadline is pending.
+        """
+        with self.mutex:
+            deposit_confirms = None
+            if self._is_deposit_pending():
+                deposit_confirms = self.get_deposit_confirms()
+            recover_confirms = [
+                self.get_confirms(rawtx) for rawtx in self._get_recovers()
+            ]
+            commit_confirms = [
+                (commit["script"], self.get_confirms(commit["rawtx"]))
+                for commit in self._get_published_commits()
+            ]
+            return self._get_blocks_until_deadline(
+                deposit_confirms, recover_confirms, commit_confirms
+            )
+
+    def _is_deposit_pending(self):
+        """True if the deposit confirming or expiring is a deadline."""
+        closing = (self.timeout_rawtx is not None or
+                   self.change_rawtx is not None)
+        return self.deposit_rawtx is not None and not closing
+
+    def _get_recovers(self):
+        """Return published recover transactions."""
+        return [rawtx for rawtx in [self.timeout_rawtx, self.change_rawtx]
+                if rawtx is not None]
+
+    def _get_published_commits(self):
+        """Return commits already seen confirmed, only those are published
+        so their confirms are derived without remote queries."""
+        return [commit for commit in self.commits_active + self.commits_revoked
+                if util.gettxid(commit["rawtx"]) in self.confirm_heights]
+
+    def _get_blocks_until_deadline(self, deposit_confirms, recover_confirms,
+                                   commit_confirms):
+        """Returns blocks until the nearest pending deadline or None.
+
+        Args:
+            deposit_confirms (int): Deposit confirms, None if not pending.
+            recover_confirms (list): Confirms of recover transactions.
+            commit_confirms (list): (script_hex, confirms) of commits.
+        """
+        deadlines = []
+
+        # deposit confirming or expiring
+        if deposit_confirms == 0:
+            deadlines.append(1)
+        elif deposit_confirms is not None:
+            script = util.h2b(self.deposit_script_hex)
+            expire_time = get_deposit_expire_time(script)
+            deadlines.append(expire_time - deposit_confirms)
+
+        # recover transactions confirming
+        for confirms in recover_confirms:
+            if confirms == 0:
+                deadlines.append(1)
+
+        # delay time of published commits passing
+        for script_hex, confirms in commit_confirms:
+            if confirms > 0:
+                script = util.h2b(script_hex)
+                deadlines.append(get_commit_delay_time(script) - confirms)
+
+        deadlines = [blocks for blocks in deadlines if blocks > 0]
+        if not deadlines:
+            return None
+        return min(deadlines)
+
     def set_spend_secret(self, secret):
         with self.mutex:
-            self.spend_secret = secret
+            self._set(spend_secret=secret)
 
     def get_transferred_amount(self):
         """Returns funds transferred from payer to payee."""
         with self.mutex:
-            # FIXME sort first!
-            if len(self.commits_active) == 0:
+            if len(self.active_quantities) == 0:
                 return 0
-            self._order_active()
-            commit = self.commits_active[-1]
-            return self.control.get_quantity(commit["rawtx"])
+            return self.active_quantities[-1]
 
     def get_deposit_total(self):
         """Returns the total deposit amount"""
@@ -213,23 +469,72 @@ class Base(util.UpdateThreadMixin):
                 msg = "Amount greater total: {0} > {1}"
                 raise ValueError(msg.fromat(quantity, total))
 
-    def _order_active(self):
+    def _validate_revoke_secret_hash(self, revoke_secret_hash):
+        # an active commit with the same hash could never be revoked
+        if revoke_secret_hash in self.active_revoke_hashes:
+            msg = "Revoke secret hash already used: {0}"
+            raise ValueError(msg.format(revoke_secret_hash))
 
-        def sort_func(entry):
-            return self.control.get_quantity(entry["rawtx"])
-        self.commits_active.sort(key=sort_func)
+    def _add_active(self, commit, quantity=None):
+        """Insert commit into commits_active keeping it ordered by quantity."""
+        with self.mutex:
+            script = util.h2b(commit["script"])
+            revoke_secret_hash = get_commit_revoke_secret_hash(script)
+            self._validate_revoke_secret_hash(revoke_secret_hash)
+            if quantity is None:
+                quantity = self.control.get_quantity(commit["rawtx"])
+            index = bisect.bisect_right(self.active_quantities, quantity)
+            self.active_quantities.insert(index, quantity)
+            self.commits_active.insert(index, commit)
+            self.active_revoke_hashes[revoke_secret_hash] = (quantity, commit)
+
+    def _active_index(self, quantity, commit):
+        """Index of commit in commits_active found by its quantity."""
+        begin = bisect.bisect_left(self.active_quantities, quantity)
+        end = bisect.bisect_right(self.active_quantities, quantity)
+        for index in range(begin, end):
+            if self.commits_active[index] is commit:
+                return index
+        raise ValueError("Commit not active!")
 
     def revoke_all(self, secrets):
-        return list(map(self.revoke, secrets))
+        """Revoke the active commits of all secrets in one batch.
 
-    def revoke(self, secret):
+        Return:
+            Copy of the revoked commit or None for each secret.
+        """
         with self.mutex:
-            secret_hash = util.hash160hex(secret)
-            for commit in self.commits_active[:]:
-                script = util.h2b(commit["script"])
-                if secret_hash == get_commit_revoke_secret_hash(script):
-                    self.commits_active.remove(commit)  # remove from active
-                    commit["revoke_secret"] = secret  # save secret
-                    self.commits_revoked.append(commit)  # add to revoked
-                    return copy.deepcopy(commit)
-            return None
+            revoked = []
+            found = []
+            for secret in secrets:
+                secret_hash = self.keyring.hash160hex(secret)
+                entry = self.active_revoke_hashes.pop(secret_hash, None)
+                if entry is None:
+                    revoked.append(None)
+                    continue
+                quantity, commit = entry
+                commit["revoke_secret"] = secret  # save secret
+                self.commits_revoked.append(commit)  # add to revoked
+                revoked.append(commit)
+                found.append(entry)
+
+            if len(found) == 1:  # single revoke, remove in place
+                index = self._active_index(*found[0])
+                del self.active_quantities[index]
+                del self.commits_active[index]
+            elif found:  # rebuild active commits once for the batch
+                removed = set(id(commit) for quantity, commit in found)
+                active = [
+                    (quantity, commit) for quantity, commit
+                    in zip(self.active_quantities, self.commits_active)
+                    if id(commit) not in removed
+                ]
+                self.active_quantities = [q for q, c in active]
+                self.commits_active = [c for q, c in active]
+            if found:
+                self._record("revoke", [c["revoke_secret"] for q, c in found])
+            return [copy.deepcopy(commit) if commit is not None else None
+                    for commit in revoked]
+
+    def revoke(self, secret):
+        return self.revoke_all([secret])[0]
@@ -4,6 +4,8 @@
 
 
 import os
+import time
+import bisect
 from picopayments import util
 from picopayments.scripts import get_deposit_spend_secret_hash
 from picopayments.scripts import get_deposit_payee_pubkey
@@ -16,19 +18,21 @@ from picopayments.channel.base import Base
 
 class Payee(Base):
 
+    # seconds unanswered commit requests are kept, forever if None
+    commit_request_ttl = None
+
     def setup(self, payee_wif):
         with self.mutex:
             self.clear()
-            self.payee_wif = payee_wif
-            payee_pubkey = util.wif2pubkey(self.payee_wif)
+            payee_pubkey = self.keyring.wif2pubkey(payee_wif)
             secret = os.urandom(32)  # secure random number
-            self.spend_secret = util.b2h(secret)
-            spend_secret_hash = util.b2h(util.hash160(secret))
+            self._set(payee_wif=payee_wif, spend_secret=util.b2h(secret))
+            spend_secret_hash = self.keyring.hash160hex(self.spend_secret)
             return payee_pubkey, spend_secret_hash
 
     def _validate_deposit_spend_secret_hash(self, script):
         given_spend_secret_hash = get_deposit_spend_secret_hash(script)
-        own_spend_secret_hash = util.hash160hex(self.spend_secret)
+        own_spend_secret_hash = self.keyring.hash160hex(self.spend_secret)
         if given_spend_secret_hash != own_spend_secret_hash:
             msg = "Incorrect spend secret hash: {0} != {1}"
             raise ValueError(msg.format(
@@ -37,7 +41,7 @@ class Payee(Base):
 
     def _validate_deposit_payee_pubkey(self, script):
         given_payee_pubkey = get_deposit_payee_pubkey(script)
-        own_payee_pubkey = util.wif2pubkey(self.payee_wif)
+        own_payee_pubkey = self.keyring.wif2pubkey(self.payee_wif)
         if given_payee_pubkey != own_payee_pubkey:
             msg = "Incorrect payee pubkey: {0} != {1}"
             raise ValueError(msg.format(
@@ -65,20 +69,39 @@ class Payee(Base):
             script = util.h2b(script_hex)
             self._validate_deposit_spend_secret_hash(script)
             self._validate_deposit_payee_pubkey(script)
-            self.deposit_rawtx = rawtx
-            self.deposit_script_hex = script_hex
+            self._set(deposit_rawtx=rawtx, deposit_script_hex=script_hex)
+            self.control.add_tx(rawtx)
+            self.control.observe(rawtx, scripts=[script])
 
     def request_commit(self, quantity):
         with self.mutex:
             self._validate_transfer_quantity(quantity)
+            self._expire_commit_requests()
             secret = util.b2h(os.urandom(32))  # secure random number
-            secret_hash = util.hash160hex(secret)
-            self.commits_requested.append(secret)
+            secret_hash = self._add_commit_request(secret)
+            requested = self.commits_requested[secret_hash][1]
+            self._record("request", secret, requested)
             return quantity, secret_hash
 
+    def _expire_commit_requests(self):
+        """Drop pending requests older than commit_request_ttl seconds."""
+        if self.commit_request_ttl is None:
+            return
+        expired = time.time() - self.commit_request_ttl
+        requests = self.commits_requested
+        secret_hashes = []
+        while requests:
+            secret_hash = next(iter(requests))
+            if requests[secret_hash][1] >= expired:
+                break
+            del requests[secret_hash]
+            secret_hashes.append(secret_hash)
+        if secret_hashes:
+            self._record("expire", secret_hashes)
+
     def _validate_commit_secret_hash(self, script):
         given_spend_secret_hash = get_commit_spend_secret_hash(script)
-        own_spend_secret_hash = util.hash160hex(self.spend_secret)
+        own_spend_secret_hash = self.keyring.hash160hex(self.spend_secret)
         if given_spend_secret_hash != own_spend_secret_hash:
             msg = "Incorrect spend secret hash: {0} != {1}"
             raise ValueError(msg.format(
@@ -87,7 +110,7 @@ class Payee(Base):
 
     def _validate_commit_payee_pubkey(self, script):
         given_payee_pubkey = get_commit_payee_pubkey(script)
-        own_payee_pubkey = util.wif2pubkey(self.payee_wif)
+        own_payee_pubkey = self.keyring.wif2pubkey(self.payee_wif)
         if given_payee_pubkey != own_payee_pubkey:
             msg = "Incorrect payee pubkey: {0} != {1}"
             raise ValueError(msg.format(
@@ -112,40 +135,41 @@ class Payee(Base):
             # TODO check given script and rawtx match
             # TODO check given script is commit script
 
+            quantity = self.control.get_quantity(rawtx)
+            return self._set_commit(rawtx, script_hex, quantity)
+
+    def _set_commit(self, rawtx, script_hex, quantity):
+        with self.mutex:
             script = util.h2b(script_hex)
             self._validate_commit_secret_hash(script)
             self._validate_commit_payee_pubkey(script)
 
-            quantity = self.control.get_quantity(rawtx)
+            # revoke secret hash must match a pending request as it would
+            # otherwise break the channels reversability
+            self._expire_commit_requests()
             revoke_secret_hash = get_commit_revoke_secret_hash(script)
-            for revoke_secret in self.commits_requested[:]:
-
-                # revoke secret hash must match as it would
-                # otherwise break the channels reversability
-                if revoke_secret_hash == util.hash160hex(revoke_secret):
-
-                    # remove from requests
-                    self.commits_requested.remove(revoke_secret)
-
-                    # add to active
-                    self._order_active()
-                    self.commits_active.append({
-                        "rawtx": rawtx, "script": script_hex,
-                        "revoke_secret": revoke_secret
-                    })
-                    return self.get_transferred_amount()
-
-            return None
+            request = self.commits_requested.pop(revoke_secret_hash, None)
+            if request is None:
+                return None
+            revoke_secret, requested = request
+            commit = {
+                "rawtx": rawtx, "script": script_hex,
+                "revoke_secret": revoke_secret
+            }
+            self._add_active(commit, quantity)
+            self._record("active", commit, quantity)
+            return self.get_transferred_amount()
 
     def revoke_until(self, quantity):
+        """Revoke all commits above quantity, highest first.
+
+        Uses the quantities stored when commits were added, so no remote
+        calls are made.
+        """
         with self.mutex:
-            secrets = []
-            self._order_active()
-            for commit in reversed(self.commits_active[:]):
-                if quantity < self.control.get_quantity(commit["rawtx"]):
-                    secrets.append(commit["revoke_secret"])
-                else:
-                    break
+            index = bisect.bisect_right(self.active_quantities, quantity)
+            secrets = [commit["revoke_secret"]
+                       for commit in reversed(self.commits_active[index:])]
             self.revoke_all(secrets)
             return secrets
 
@@ -153,13 +177,13 @@ class Payee(Base):
         with self.mutex:
             self._assert_open_state()
             assert(len(self.commits_active) > 0)
-            self._order_active()
             commit = self.commits_active[-1]
             rawtx = self.control.finalize_commit(
                 self.payee_wif, commit["rawtx"],
                 util.h2b(self.deposit_script_hex)
             )
             commit["rawtx"] = rawtx  # update commit
+            self._record("finalize", rawtx)
             return util.gettxid(rawtx)
 
     def update(self):
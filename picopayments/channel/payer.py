@@ -85,39 +85,57 @@ class Payer(Base):
 
         with self.mutex:
             self.clear()
-            self.payer_wif = payer_wif
-            rawtx, script = self.control.deposit(
+            self._set(payer_wif=payer_wif)
+            rawtx, script = self.control.create_deposit(
                 self.payer_wif, payee_pubkey,
                 spend_secret_hash, expire_time, quantity
             )
-            self.deposit_rawtx = rawtx
-            self.deposit_script_hex = util.b2h(script)
+
+            # journaled before publishing, so a crash can't lose the script
+            self._set(deposit_rawtx=rawtx,
+                      deposit_script_hex=util.b2h(script))
+            self.control.publish(rawtx, scripts=[script])
             return {"rawtx": rawtx, "script": util.b2h(script)}
 
     def timeout_recover(self):
         with self.mutex:
             script = util.h2b(self.deposit_script_hex)
-            self.timeout_rawtx = self.control.timeout_recover(
-                self.payer_wif, script
-            )
+            rawtx = self.control.create_timeout_recover(self.payer_wif,
+                                                        script)
+            self._publish_recover("timeout_rawtx", rawtx)
 
     def change_recover(self):
         with self.mutex:
             script = util.h2b(self.deposit_script_hex)
-            self.change_rawtx = self.control.change_recover(
+            rawtx = self.control.create_change_recover(
                 self.payer_wif, script, self.spend_secret
             )
+            self._publish_recover("change_rawtx", rawtx)
+
+    def _publish_recover(self, field, rawtx):
+        """Journal recover transaction before publishing it.
+
+        A failed publish is rolled back so the next update retries it.
+        """
+        self._set(**{field: rawtx})
+        try:
+            self.control.publish(rawtx)
+        except Exception:
+            self._set(**{field: None})
+            raise
 
     def create_commit(self, quantity, revoke_secret_hash, delay_time):
         with self.mutex:
             self._validate_transfer_quantity(quantity)
+            self._validate_revoke_secret_hash(revoke_secret_hash)
             rawtx, script = self.control.create_commit(
                 self.payer_wif, util.h2b(self.deposit_script_hex),
                 quantity, revoke_secret_hash, delay_time
             )
             script_hex = util.b2h(script)
-            self._order_active()
-            self.commits_active.append({
+            commit = {
                 "rawtx": rawtx, "script": script_hex, "revoke_secret": None
-            })
+            }
+            self._add_active(commit, quantity)
+            self._record("active", commit, quantity)
             return {"rawtx": rawtx, "script": script_hex}
@@ -0,0 +1,131 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import six
+import struct
+import pycoin
+from pycoin.tx.script import tools
+
+
+PREFIX = b"CNTRPRTY"
+SEND_ID = 0
+SEND_FORMAT = ">QQ"
+B26_DIGITS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+MIN_NUMERIC_ASSET_ID = 26 ** 12 + 1
+MAX_NUMERIC_ASSET_ID = 2 ** 64 - 1
+OP_RETURN = 0x6a
+
+
+def arc4(key, data):
+    """Encrypt or decrypt data with the ARC4 stream cipher."""
+    key = bytearray(key)
+    state = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + state[i] + key[i % len(key)]) % 256
+        state[i], state[j] = state[j], state[i]
+    i = j = 0
+    result = bytearray()
+    for byte in bytearray(data):
+        i = (i + 1) % 256
+        j = (j + state[i]) % 256
+        state[i], state[j] = state[j], state[i]
+        result.append(byte ^ state[(state[i] + state[j]) % 256])
+    return bytes(result)
+
+
+def get_asset_id(asset):
+    if asset == "BTC":
+        return 0
+    if asset == "XCP":
+        return 1
+    if asset.startswith("A"):  # numeric asset
+        asset_id = int(asset[1:])
+        if not MIN_NUMERIC_ASSET_ID <= asset_id <= MAX_NUMERIC_ASSET_ID:
+            raise ValueError("Invalid numeric asset: {0}".format(asset))
+        return asset_id
+    asset_id = 0
+    for char in asset:
+        if char not in B26_DIGITS:
+            raise ValueError("Invalid asset name: {0}".format(asset))
+        asset_id = asset_id * 26 + B26_DIGITS.index(char)
+    if asset_id < 26 ** 3:
+        raise ValueError("Invalid asset name: {0}".format(asset))
+    return asset_id
+
+
+def get_asset_name(asset_id):
+    if asset_id == 0:
+        return "BTC"
+    if asset_id == 1:
+        return "XCP"
+    if asset_id < 26 ** 3:
+        raise ValueError("Invalid asset id: {0}".format(asset_id))
+    if asset_id >= MIN_NUMERIC_ASSET_ID:
+        return "A{0}".format(asset_id)
+    name = ""
+    while asset_id > 0:
+        asset_id, remainder = divmod(asset_id, 26)
+        name = B26_DIGITS[remainder] + name
+    return name
+
+
+def get_encryption_key(tx):
+    """Counterparty data is obfuscated with the first input txid."""
+    return tx.txs_in[0].previous_hash[::-1]
+
+
+def pack_send(asset, quantity):
+    message = struct.pack(SEND_FORMAT, get_asset_id(asset), quantity)
+    return PREFIX + struct.pack(">I", SEND_ID) + message
+
+
+def unpack(data):
+    """Unpack counterparty data into message type id and message bytes."""
+    if not data.startswith(PREFIX):
+        raise ValueError("Not a counterparty message!")
+    data = data[len(PREFIX):]
+    if six.indexbytes(data, 0) > 0:  # short type id
+        return six.indexbytes(data, 0), data[1:]
+    message_type_id, = struct.unpack(">I", data[:4])
+    return message_type_id, data[4:]
+
+
+def unpack_send(data):
+    message_type_id, message = unpack(data)
+    if message_type_id != SEND_ID:
+        msg = "Incorrect message type id: {0} != {1}"
+        raise ValueError(msg.format(message_type_id, SEND_ID))
+    if len(message) != struct.calcsize(SEND_FORMAT):
+        raise ValueError("Invalid send message length!")
+    asset_id, quantity = struct.unpack(SEND_FORMAT, message)
+    return get_asset_name(asset_id), quantity
+
+
+def get_data(tx):
+    """Return decrypted counterparty data embedded in an OP_RETURN output."""
+    for txout in tx.txs_out:
+        script = txout.script
+        if len(script) > 0 and six.indexbytes(script, 0) == OP_RETURN:
+            if len(script) == 1:
+                raise ValueError("OP_RETURN output without data!")
+            opcode, data, pc = tools.get_opcode(script, 1)
+            if data is None:
+                raise ValueError("OP_RETURN output without data push!")
+            return arc4(get_encryption_key(tx), data)
+    raise ValueError("No counterparty data output found!")
+
+
+def decode_send(rawtx):
+    """Decode a counterparty send transaction.
+
+    Args:
+        rawtx: Hex encoded counterparty send transaction.
+
+    Return:
+        Tuple of asset name and quantity.
+    """
+    tx = pycoin.tx.Tx.from_hex(rawtx)
+    return unpack_send(get_data(tx))
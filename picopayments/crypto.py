@@ -0,0 +1,282 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import os
+import ctypes
+import logging
+import threading
+from ctypes.util import find_library
+from pycoin import ecdsa
+from pycoin.ecdsa.ecdsa import deterministic_generate_k
+from pycoin.encoding import to_bytes_32, from_bytes_32
+from pycoin.tx.script import check_signature
+from .cache import LruCache
+
+
+BACKEND_ENV = "PICOPAYMENTS_ECDSA"  # force a backend by name
+SECP256K1_ENV = "PICOPAYMENTS_SECP256K1"  # path of libsecp256k1
+ORDER = ecdsa.generator_secp256k1.order()
+NID_SECP256K1 = 714  # OpenSSL curve id
+VERIFIED_CACHE_SIZE = 10000  # signature verification results kept
+
+
+_log = logging.getLogger(__name__)
+_backend = None
+_backend_mutex = threading.RLock()
+_verified = LruCache(max_entries=VERIFIED_CACHE_SIZE)
+
+
+def _low_s(r, s):
+    """Normalize to low s as required by bitcoin standardness rules."""
+    return r, s if s <= ORDER // 2 else ORDER - s
+
+
+class PythonBackend(object):
+
+    name = "python"
+
+    def sign(self, secret_exponent, sign_value):
+        """Return deterministic (RFC6979) low s signature pair."""
+        r, s = ecdsa.sign(ecdsa.generator_secp256k1, secret_exponent,
+                          sign_value)
+        return _low_s(r, s)
+
+    def verify(self, public_pair, sign_value, sig_pair):
+        return ecdsa.verify(ecdsa.generator_secp256k1, public_pair,
+                            sign_value, sig_pair)
+
+
+class Secp256k1Backend(object):
+
+    name = "secp256k1"
+    CONTEXT_FLAGS = 0x301  # SECP256K1_CONTEXT_SIGN | SECP256K1_CONTEXT_VERIFY
+
+    def __init__(self, path=None):
+        """Bitcoin core's libsecp256k1 loaded through ctypes.
+
+        Args:
+            path (str): Library path, system library if None.
+        """
+        path = path or os.environ.get(SECP256K1_ENV)
+        path = path or find_library("secp256k1")
+        if not path:
+            raise OSError("libsecp256k1 not found!")
+        lib = ctypes.CDLL(path)
+        lib.secp256k1_context_create.restype = ctypes.c_void_p
+        lib.secp256k1_context_create.argtypes = [ctypes.c_uint]
+        for name in ["secp256k1_ec_pubkey_parse",
+                     "secp256k1_ecdsa_signature_parse_compact",
+                     "secp256k1_ecdsa_signature_normalize",
+                     "secp256k1_ecdsa_signature_serialize_compact",
+                     "secp256k1_ecdsa_verify", "secp256k1_ecdsa_sign"]:
+            getattr(lib, name).argtypes = None
+            getattr(lib, name).restype = ctypes.c_int
+        self._lib = lib
+        self._ctx = ctypes.c_void_p(lib.secp256k1_context_create(
+            self.CONTEXT_FLAGS
+        ))
+
+    def sign(self, secret_exponent, sign_value):
+        """Return deterministic (RFC6979) low s signature pair."""
+        sig = ctypes.create_string_buffer(64)
+        if not self._lib.secp256k1_ecdsa_sign(
+                self._ctx, sig, to_bytes_32(sign_value % ORDER),
+                to_bytes_32(secret_exponent), None, None):
+            raise ValueError("Invalid secret exponent!")
+        compact = ctypes.create_string_buffer(64)
+        self._lib.secp256k1_ecdsa_signature_serialize_compact(
+            self._ctx, compact, sig
+        )
+        return from_bytes_32(compact.raw[:32]), from_bytes_32(compact.raw[32:])
+
+    def verify(self, public_pair, sign_value, sig_pair):
+        r, s = sig_pair
+        if not (0 < r < ORDER and 0 < s < ORDER):
+            return False
+        lib, ctx = self._lib, self._ctx
+        x, y = public_pair
+        sec = b"\x04" + to_bytes_32(x) + to_bytes_32(y)
+        pubkey = ctypes.create_string_buffer(64)
+        if not lib.secp256k1_ec_pubkey_parse(ctx, pubkey, sec, len(sec)):
+            return False
+        sig = ctypes.create_string_buffer(64)
+        if not lib.secp256k1_ecdsa_signature_parse_compact(
+                ctx, sig, to_bytes_32(r) + to_bytes_32(s)):
+            return False
+        # libsecp256k1 only accepts low s, consensus accepts both
+        lib.secp256k1_ecdsa_signature_normalize(ctx, sig, sig)
+        message = to_bytes_32(sign_value % ORDER)
+        return lib.secp256k1_ecdsa_verify(ctx, sig, message, pubkey) == 1
+
+
+class OpenSslBackend(object):
+
+    name = "openssl"
+
+    def __init__(self, path=None):
+        """OpenSSL libcrypto loaded through ctypes.
+
+        Verification is done entirely by OpenSSL, signing only uses it for
+        the point multiplication so nonces stay deterministic (RFC6979).
+
+        Args:
+            path (str): Library path, system library if None.
+        """
+        path = path or find_library("crypto")
+        if not path:
+            raise OSError("libcrypto not found!")
+        lib = ctypes.CDLL(path)
+        pointer_functions = [
+            "BN_bin2bn", "BN_new", "EC_KEY_new_by_curve_name",
+            "EC_GROUP_new_by_curve_name", "EC_POINT_new", "ECDSA_SIG_new",
+        ]
+        for name in pointer_functions:
+            getattr(lib, name).restype = ctypes.c_void_p
+        lib.BN_bin2bn.argtypes = [ctypes.c_char_p, ctypes.c_int,
+                                  ctypes.c_void_p]
+        lib.BN_bn2binpad.argtypes = [ctypes.c_void_p, ctypes.c_char_p,
+                                     ctypes.c_int]
+        lib.EC_KEY_set_public_key_affine_coordinates.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p
+        ]
+        lib.ECDSA_SIG_set0.argtypes = [ctypes.c_void_p, ctypes.c_void_p,
+                                       ctypes.c_void_p]
+        lib.ECDSA_do_verify.argtypes = [ctypes.c_char_p, ctypes.c_int,
+                                        ctypes.c_void_p, ctypes.c_void_p]
+        lib.EC_POINT_new.argtypes = [ctypes.c_void_p]
+        lib.EC_POINT_mul.argtypes = [ctypes.c_void_p] * 6
+        lib.EC_POINT_get_affine_coordinates_GFp.argtypes = [
+            ctypes.c_void_p] * 5
+        for name in ["BN_free", "EC_KEY_free",
+                     "EC_POINT_free", "ECDSA_SIG_free"]:
+            getattr(lib, name).argtypes = [ctypes.c_void_p]
+            getattr(lib, name).restype = None
+        lib.EC_KEY_new_by_curve_name.argtypes = [ctypes.c_int]
+        lib.EC_GROUP_new_by_curve_name.argtypes = [ctypes.c_int]
+        self._lib = lib
+        self._group = ctypes.c_void_p(
+            lib.EC_GROUP_new_by_curve_name(NID_SECP256K1)
+        )
+        if not self._group:
+            raise OSError("libcrypto without secp256k1 support!")
+
+    def _bn(self, value):
+        return ctypes.c_void_p(self._lib.BN_bin2bn(to_bytes_32(value), 32,
+                                                   None))
+
+    def _int(self, bn):
+        data = ctypes.create_string_buffer(32)
+        self._lib.BN_bn2binpad(bn, data, 32)
+        return from_bytes_32(data.raw)
+
+    def sign(self, secret_exponent, sign_value):
+        """Return deterministic (RFC6979) low s signature pair."""
+        lib = self._lib
+        k = deterministic_generate_k(ORDER, secret_exponent, sign_value)
+        k_bn = self._bn(k)
+        x = ctypes.c_void_p(lib.BN_new())
+        y = ctypes.c_void_p(lib.BN_new())
+        point = ctypes.c_void_p(lib.EC_POINT_new(self._group))
+        try:
+            lib.EC_POINT_mul(self._group, point, k_bn, None, None, None)
+            lib.EC_POINT_get_affine_coordinates_GFp(self._group, point,
+                                                    x, y, None)
+            r = self._int(x) % ORDER
+        finally:
+            lib.EC_POINT_free(point)
+            for bn in (k_bn, x, y):
+                lib.BN_free(bn)
+        s = (ecdsa.numbertheory.inverse_mod(k, ORDER) *
+             (sign_value + secret_exponent * r)) % ORDER
+        return _low_s(r, s)
+
+    def verify(self, public_pair, sign_value, sig_pair):
+        r, s = sig_pair
+        if not (0 < r < ORDER and 0 < s < ORDER):
+            return False
+        lib = self._lib
+        key = ctypes.c_void_p(lib.EC_KEY_new_by_curve_name(NID_SECP256K1))
+        sig = ctypes.c_void_p(lib.ECDSA_SIG_new())
+        x, y = self._bn(public_pair[0]), self._bn(public_pair[1])
+        try:
+            lib.ECDSA_SIG_set0(sig, self._bn(r), self._bn(s))  # owned by sig
+            if lib.EC_KEY_set_public_key_affine_coordinates(key, x, y) != 1:
+                return False
+            message = to_bytes_32(sign_value % ORDER)
+            return lib.ECDSA_do_verify(message, 32, sig, key) == 1
+        finally:
+            lib.BN_free(x)
+            lib.BN_free(y)
+            lib.ECDSA_SIG_free(sig)
+            lib.EC_KEY_free(key)
+
+
+BACKENDS = [Secp256k1Backend, OpenSslBackend, PythonBackend]  # preference
+
+
+class _CheckSignatureEcdsa(object):
+    """Stand in for the ecdsa module used by pycoin's OP_CHECKSIG."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        return getattr(ecdsa, name)
+
+    def verify(self, generator, public_pair, sign_value, sig_pair):
+        return self.backend.verify(public_pair, sign_value, sig_pair)
+
+
+def load_backend(name=None):
+    """Load the named or the first available backend."""
+    name = name or os.environ.get(BACKEND_ENV)
+    for backend_class in BACKENDS:
+        if name and backend_class.name != name:
+            continue
+        try:
+            return backend_class()
+        except (OSError, AttributeError) as e:
+            if name:
+                raise
+            _log.debug("ECDSA backend {0} unavailable: {1}".format(
+                backend_class.name, e
+            ))
+    raise ValueError("Unknown ECDSA backend {0}!".format(name))
+
+
+def set_backend(backend):
+    """Use backend for all signing and signature verification.
+
+    Also routes pycoin's OP_CHECKSIG verification (Tx.bad_signature_count)
+    through the backend, as pycoin has no hook for it.
+    """
+    global _backend
+    with _backend_mutex:
+        _backend = backend
+        check_signature.ecdsa = _CheckSignatureEcdsa(backend)
+        _log.info("Using {0} ECDSA backend.".format(backend.name))
+    return backend
+
+
+def get_backend():
+    """Get the process wide backend, auto detected on first use."""
+    with _backend_mutex:
+        if _backend is None:
+            set_backend(load_backend())
+        return _backend
+
+
+def sign(secret_exponent, sign_value):
+    return get_backend().sign(secret_exponent, sign_value)
+
+
+def verify(public_pair, sign_value, sig_pair):
+    """Verify signature, results are cached as they never change."""
+    key = (tuple(public_pair), sign_value, tuple(sig_pair))
+    valid = _verified.get(key)
+    if valid is None:
+        valid = get_backend().verify(public_pair, sign_value, sig_pair)
+        _verified.set(key, valid)
+    return valid
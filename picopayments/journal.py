@@ -0,0 +1,137 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import os
+import json
+import time
+import logging
+import threading
+from . import util
+
+
+DEFAULT_SYNC_INTERVAL = 1.0  # max seconds between fsyncs
+DEFAULT_COMPACT_RECORDS = 1000  # records before compacting into a snapshot
+SNAPSHOT_SUFFIX = ".snapshot"
+
+
+_log = logging.getLogger(__name__)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+class Journal(object):
+
+    def __init__(self, path, sync_interval=DEFAULT_SYNC_INTERVAL,
+                 compact_records=DEFAULT_COMPACT_RECORDS):
+        """Append only write ahead log of channel state changes.
+
+        Every record is written to the os right away, so it survives a
+        crash of the process. Fsyncs for power loss are batched to at
+        most one every sync_interval seconds, a timer syncs records not
+        followed by another append within that time. After
+        compact_records records the channel state is written to a
+        snapshot and the log restarts empty.
+
+        Args:
+            path (str): Log file, the snapshot is kept next to it.
+            sync_interval (float): Max seconds between fsyncs, 0 for every
+                                   record.
+            compact_records (int): Records before the log is compacted.
+        """
+        self.path = path
+        self.snapshot_path = path + SNAPSHOT_SUFFIX
+        self.sync_interval = sync_interval
+        self.compact_records = compact_records
+        self.generation = 0
+        self.records = 0  # records since last compaction
+        self._file = None
+        self._last_sync = 0
+        self._timer = None  # pending sync of unsynced records
+        self._mutex = threading.RLock()
+
+    def read(self):
+        """Return snapshot (None if missing) and the records after it.
+
+        A torn last record from a crash during a write is ignored, as are
+        records written before the snapshot. A log without generation
+        header was never compacted and belongs to generation 0.
+        """
+        with self._mutex:
+            snapshot = None
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r") as f:
+                    snapshot = json.load(f)
+            generation = snapshot["generation"] if snapshot else 0
+            records = []
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    lines = f.read().split("\n")
+                for index, line in enumerate(lines):
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        if index < len(lines) - 1:
+                            raise  # corrupt, not just an unfinished write
+                        break
+            log_generation = 0  # never compacted logs have no header
+            if records and records[0][0] == "generation":
+                log_generation = records.pop(0)[1]
+            if log_generation != generation:
+                records = []  # log predates snapshot, already included
+            self.generation = generation
+            return snapshot and snapshot["state"], records
+
+    def append(self, op, *args):
+        """Record one state change and return True if compaction is due."""
+        with self._mutex:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(_dumps([op] + list(args)) + "\n")
+            self._file.flush()
+            self.records += 1
+            if time.time() - self._last_sync >= self.sync_interval:
+                self.sync()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.sync_interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+            return self.records >= self.compact_records
+
+    def sync(self):
+        with self._mutex:
+            if self._timer is not None:
+                self._timer.cancel()  # no op if called by the timer
+                self._timer = None
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._last_sync = time.time()
+
+    def compact(self, state):
+        """Replace snapshot and log with the given full channel state."""
+        with self._mutex:
+            self.generation += 1
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(_dumps({"generation": self.generation,
+                                "state": state}))
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_path, self.snapshot_path)  # atomic on posix
+            util.fsync_dir(self.snapshot_path)
+            self.close()
+            self._file = open(self.path, "w")  # stale records dropped
+            self._file.write(_dumps(["generation", self.generation]) + "\n")
+            self.records = 0
+            self.sync()
+
+    def close(self):
+        with self._mutex:
+            self.sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,78 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import threading
+import pycoin
+from pycoin.tx.pay_to import build_hash160_lookup
+from . import util
+from .cache import LruCache
+from .cache import DEFAULT_LRU_SIZE
+
+
+_default_keyring = None
+_default_keyring_mutex = threading.RLock()
+
+
+def get_default_keyring():
+    """Get the key ring shared by all controls of the process."""
+    global _default_keyring
+    with _default_keyring_mutex:
+        if _default_keyring is None:
+            _default_keyring = KeyRing()
+        return _default_keyring
+
+
+class KeyRing(object):
+
+    def __init__(self, max_entries=DEFAULT_LRU_SIZE):
+        """Derive keys, addresses and secret hashes once and keep them.
+
+        Parsing a wif and deriving its public key are elliptic curve
+        operations, channels need the results on every call.
+
+        Args:
+            max_entries (int): Max number of wifs and secrets kept.
+        """
+        self._keys = LruCache(max_entries=max_entries)
+        self._hashes = LruCache(max_entries=max_entries)
+
+    def _get(self, wif):
+        keys = self._keys.get(wif)
+        if keys is None:
+            key = pycoin.key.Key.from_text(wif)
+            secret_exponent = key.secret_exponent()
+            sec = key.sec()
+            keys = {
+                "sec": sec,
+                "pubkey": util.b2h(sec),
+                "address": key.address(),
+                "secret_exponent": secret_exponent,
+                "hash160_lookup": build_hash160_lookup([secret_exponent]),
+            }
+            self._keys.set(wif, keys)
+        return keys
+
+    def wif2sec(self, wif):
+        return self._get(wif)["sec"]
+
+    def wif2pubkey(self, wif):
+        return self._get(wif)["pubkey"]
+
+    def wif2address(self, wif):
+        return self._get(wif)["address"]
+
+    def wif2secretexponent(self, wif):
+        return self._get(wif)["secret_exponent"]
+
+    def hash160_lookup(self, wif):
+        """Return pycoin signing lookup for the key of wif."""
+        return self._get(wif)["hash160_lookup"]
+
+    def hash160hex(self, hexdata):
+        digest = self._hashes.get(hexdata)
+        if digest is None:
+            digest = util.hash160hex(hexdata)
+            self._hashes.set(hexdata, digest)
+        return digest
@@ -0,0 +1,138 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import pycoin
+import logging
+from threading import RLock
+from pycoin.tx.pay_to import ScriptPayToScript
+from . import util
+from . import counterparty
+
+
+_log = logging.getLogger(__name__)
+
+
+def get_script_address(script, netcode="BTC"):
+    """Return address of a pay to script output script or None."""
+    try:
+        return ScriptPayToScript.from_script(script).info(netcode)["address"]
+    except ValueError:
+        return None
+
+
+class Ledger(object):
+
+    def __init__(self, asset, netcode="BTC"):
+        """Local utxo and asset balance ledger for channel script addresses.
+
+        Only addresses of deposit and commit scripts the channel created
+        start being tracked, as their balance is known to start at zero.
+        Tracked addresses are then updated by every observed transaction.
+
+        Args:
+            asset (str): Counterparty asset name.
+            netcode (str): Network code of the tracked addresses.
+        """
+        self.asset = asset
+        self.netcode = netcode
+        self.mutex = RLock()
+        self.asset_balances = {}  # {address: quantity}
+        self.utxos = {}           # {address: {(txid, index): utxo}}
+        self.outpoints = {}       # {(txid, index): address}
+        self.observed = set()     # {txid}
+
+    def is_tracked(self, address):
+        with self.mutex:
+            return address in self.utxos
+
+    def track(self, address):
+        with self.mutex:
+            if address not in self.utxos:
+                self.utxos[address] = {}
+                self.asset_balances[address] = 0
+
+    def forget(self, address):
+        """Stop tracking address so its balance is queried remotely."""
+        with self.mutex:
+            for outpoint in self.utxos.pop(address, {}):
+                del self.outpoints[outpoint]
+            self.asset_balances.pop(address, None)
+
+    def get_utxos(self, address):
+        with self.mutex:
+            return list(self.utxos[address].values())
+
+    def get_balance(self, address):
+        with self.mutex:
+            utxos = self.utxos[address].values()
+            btc_balance = sum(map(lambda utxo: utxo["value"], utxos))
+            return self.asset_balances[address], btc_balance
+
+    def observe(self, rawtx, scripts=None):
+        """Update ledger from a published transaction.
+
+        Args:
+            rawtx (str): Published transaction hex.
+            scripts (list): Channel scripts the transaction funds, their
+                            addresses start being tracked.
+        """
+        with self.mutex:
+            created = set(
+                util.script2address(script, self.netcode)
+                for script in scripts or []
+            )
+            tx = pycoin.tx.Tx.from_hex(rawtx)
+            txid = tx.id()
+            if txid in self.observed:
+                return
+            self.observed.add(txid)
+
+            # remove spent outputs, counterparty source is the first input
+            source = None
+            for txin in tx.txs_in:
+                prev_txid = util.b2h_rev(txin.previous_hash)
+                outpoint = (prev_txid, txin.previous_index)
+                address = self.outpoints.pop(outpoint, None)
+                if address is not None:
+                    del self.utxos[address][outpoint]
+                    if txin is tx.txs_in[0]:
+                        source = address
+
+            # add created outputs
+            dest = None
+            for index, txout in enumerate(tx.txs_out):
+                address = get_script_address(txout.script, self.netcode)
+                if index == 0:
+                    dest = address
+                if address is None:
+                    continue
+                if address not in created and not self.is_tracked(address):
+                    continue  # unknown prior balance
+                self.track(address)
+                outpoint = (txid, index)
+                self.outpoints[outpoint] = address
+                self.utxos[address][outpoint] = {
+                    "txid": txid, "index": index, "value": txout.coin_value,
+                    "script": util.b2h(txout.script)
+                }
+
+            # move asset
+            try:
+                asset, quantity = counterparty.decode_send(rawtx)
+            except ValueError:
+                return  # not a counterparty send
+            if asset != self.asset:
+                return
+            if source is not None and self.asset_balances[source] < quantity:
+                _log.warning("Ledger balance of {0} too low, forgetting "
+                             "it!".format(source))
+                self.forget(source)  # queried remotely from now on
+                if dest is not None:
+                    self.forget(dest)
+                return
+            if source is not None:
+                self.asset_balances[source] -= quantity
+            if dest is not None and self.is_tracked(dest):
+                self.asset_balances[dest] += quantity
@@ -0,0 +1,172 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+from six.moves import queue
+
+
+DEFAULT_WORKERS = 4
+DEFAULT_INTERVAL = 0.1  # seconds
+BLOCK_TIME = 600  # expected seconds between blocks
+DEADLINE_SHARE = 0.5  # part of the time until a deadline to wait
+
+
+_log = logging.getLogger(__name__)
+
+
+class Scheduler(object):
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        """Run the update calls of many channels from one timer thread.
+
+        Due updates are taken from a timer heap and executed by a bounded
+        pool of worker threads. A channel is never updated concurrently,
+        it is rescheduled interval seconds after its update returned.
+
+        Args:
+            workers (int): Number of worker threads calling update.
+        """
+        self.workers = workers
+        self._heap = []        # [(due, token, channel)]
+        self._tokens = {}      # {channel: token of its valid heap entry}
+        self._intervals = {}   # {channel: (interval, max_interval)}
+        self._updating = set()  # channels currently in a worker
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._stopped = True
+
+    def register(self, channel, interval=DEFAULT_INTERVAL, max_interval=None):
+        """Call channel.update every interval seconds until unregistered.
+
+        If max_interval is given updates are scheduled adaptively from the
+        blocks returned by channel.get_blocks_until_deadline, between
+        interval seconds for imminent and max_interval seconds for no
+        pending deadline.
+        """
+        with self._condition:
+            self._intervals[channel] = (interval, max_interval)
+            if channel not in self._updating:
+                self._push(channel, time.time())
+
+    def unregister(self, channel):
+        with self._condition:
+            self._intervals.pop(channel, None)
+            self._tokens.pop(channel, None)  # invalidates heap entry
+
+    def reschedule(self, channel, delay):
+        """Move the next update of a registered channel delay seconds ahead.
+
+        Has no effect while the channel is being updated, as it will be
+        rescheduled once its update returns.
+        """
+        with self._condition:
+            if channel in self._intervals and channel not in self._updating:
+                self._push(channel, time.time() + delay)
+
+    def is_registered(self, channel):
+        with self._condition:
+            return channel in self._intervals
+
+    def __len__(self):
+        with self._condition:
+            return len(self._intervals)
+
+    def _push(self, channel, due):
+        token = next(self._counter)
+        self._tokens[channel] = token
+        heapq.heappush(self._heap, (due, token, channel))
+        self._condition.notify()
+
+    def _pop_due(self):
+        """Block until a channel is due, return None if stopped."""
+        with self._condition:
+            while not self._stopped:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due, token, channel = self._heap[0]
+                if self._tokens.get(channel) != token:  # stale entry
+                    heapq.heappop(self._heap)
+                    continue
+                now = time.time()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+                del self._tokens[channel]
+                self._updating.add(channel)
+                return channel
+            return None
+
+    def _dispatch(self):
+        while True:
+            channel = self._pop_due()
+            if channel is None:
+                return
+            self._queue.put(channel)
+
+    def _next_delay(self, channel, interval, max_interval):
+        """Seconds until the next update, shorter as a deadline nears."""
+        if max_interval is None:
+            return interval
+        try:
+            blocks = channel.get_blocks_until_deadline()
+        except Exception:
+            _log.exception("Channel deadline lookup failed!")
+            return interval
+        if blocks is None:  # idle channel
+            return max_interval
+        delay = blocks * BLOCK_TIME * DEADLINE_SHARE
+        return min(max(delay, interval), max_interval)
+
+    def _work(self):
+        while True:
+            channel = self._queue.get()
+            if channel is None:  # stop sentinel
+                return
+            try:
+                channel.update()
+            except Exception:
+                _log.exception("Channel update failed!")
+            with self._condition:
+                intervals = self._intervals.get(channel)
+            delay = None
+            if intervals is not None:
+                delay = self._next_delay(channel, *intervals)
+            with self._condition:
+                self._updating.discard(channel)
+                if delay is not None and channel in self._intervals:
+                    self._push(channel, time.time() + delay)
+
+    def start(self):
+        with self._condition:
+            if not self._stopped:
+                return
+            self._stopped = False
+            self._threads = [threading.Thread(target=self._dispatch)]
+            for i in range(self.workers):
+                self._threads.append(threading.Thread(target=self._work))
+            for thread in self._threads:
+                thread.daemon = True
+                thread.start()
+
+    def stop(self):
+        """Stop dispatching and wait for running updates to finish."""
+        with self._condition:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._condition.notify_all()
+            threads, self._threads = self._threads, []
+        for i in range(self.workers):
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
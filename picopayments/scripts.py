@@ -3,16 +3,24 @@
 # License: MIT (see LICENSE file)
 
 
+import six
+from string import Formatter
+from threading import RLock
 from pycoin.serialize import b2h, h2b
 from pycoin import encoding
 from pycoin.tx.script import tools
+from pycoin.tx.script.opcodes import OPCODE_TO_INT
 from pycoin.tx.pay_to.ScriptType import ScriptType
 from pycoin.tx.pay_to import SUBCLASSES
+from pycoin.tx.exceptions import SolvingError
 from pycoin.encoding import hash160
 from pycoin.tx.pay_to.ScriptType import DEFAULT_PLACEHOLDER_SIGNATURE
 from pycoin.tx.script.check_signature import parse_signature_blob
 from pycoin.tx.script.der import UnexpectedDER
-from pycoin import ecdsa
+from pycoin.tx.script.der import sigencode_der
+from pycoin.intbytes import bytes_from_int
+from . import crypto
+from .cache import LruCache
 
 
 MAX_SEQUENCE = 0x0000FFFF
@@ -70,50 +78,168 @@ def parse_sequence_value(opcode, data, disassembled):
 
 
 def get_commit_payer_pubkey(script):
-    opcode, data, disassembled = get_word(script, 13)
-    return b2h(data)
+    return CommitScript.parse(script).payer_pubkey
 
 
 def get_commit_payee_pubkey(script):
-    opcode, data, disassembled = get_word(script, 7)
-    return b2h(data)
+    return CommitScript.parse(script).payee_pubkey
 
 
 def get_commit_delay_time(script):
-    opcode, data, disassembled = get_word(script, 1)
-    return parse_sequence_value(opcode, data, disassembled)
+    return CommitScript.parse(script).delay_time
 
 
 def get_commit_spend_secret_hash(script):
-    opcode, data, disassembled = get_word(script, 5)
-    return b2h(data)
+    return CommitScript.parse(script).spend_secret_hash
 
 
 def get_commit_revoke_secret_hash(script):
-    opcode, data, disassembled = get_word(script, 11)
-    return b2h(data)
+    return CommitScript.parse(script).revoke_secret_hash
 
 
 def get_deposit_payer_pubkey(script):
-    opcode, data, disassembled = get_word(script, 2)
-    return b2h(data)
+    return DepositScript.parse(script).payer_pubkey
 
 
 def get_deposit_payee_pubkey(script):
-    opcode, data, disassembled = get_word(script, 3)
-    return b2h(data)
+    return DepositScript.parse(script).payee_pubkey
 
 
 def get_deposit_expire_time(script):
-    opcode, data, disassembled = get_word(script, 14)
-    return parse_sequence_value(opcode, data, disassembled)
+    return DepositScript.parse(script).expire_time
 
 
 def get_deposit_spend_secret_hash(script):
-    opcode, data, disassembled = get_word(script, 9)
+    return DepositScript.parse(script).spend_secret_hash
+
+
+def _compile_template(script_text):
+    """Compile the constant parts of a script template once.
+
+    Return:
+        List of (compiled bytes before field, field name or None).
+    """
+    return [(tools.compile(literal), field)
+            for literal, field, spec, conversion
+            in Formatter().parse(script_text)]
+
+
+DEPOSIT_TEMPLATE = _compile_template(DEPOSIT_SCRIPT)
+COMMIT_TEMPLATE = _compile_template(COMMIT_SCRIPT)
+
+
+def _template_layout(template):
+    """Expected opcodes and field names in script order."""
+    layout = []
+    for compiled, field in template:
+        layout.extend(bytearray(compiled))
+        if field:
+            layout.append(field)
+    return layout
+
+
+def _parse_field(field, opcode, data):
+    if field.endswith("_time"):
+        disassembled = tools.disassemble_for_opcode_data(opcode, data)
+        return parse_sequence_value(opcode, data, disassembled)
+    sizes = (33, 65) if field.endswith("_pubkey") else (20,)
+    if data is None or len(data) not in sizes:
+        raise ValueError("Invalid {0}!".format(field))
     return b2h(data)
 
 
+class _ParsedScript(object):
+
+    LAYOUT = None  # see _template_layout
+    _cache = None
+
+    def __init__(self, script, fields):
+        self.script = script
+        self.__dict__.update(fields)
+
+    @classmethod
+    def parse(cls, script):
+        """Parse and validate script in one pass, results are cached.
+
+        Raises:
+            ValueError: If script does not match the template.
+        """
+        script = bytes(script)
+        parsed = cls._cache.get(script)
+        if parsed is None:
+            parsed = cls(script, cls._parse_fields(script))
+            cls._cache.set(script, parsed)
+        return parsed
+
+    @classmethod
+    def _parse_fields(cls, script):
+        view = memoryview(script)
+        fields = {}
+        pc = 0
+        for expected in cls.LAYOUT:
+            if pc >= len(view):
+                raise ValueError("Script too short!")
+            opcode = six.indexbytes(view, pc)
+            pc += 1
+            if not isinstance(expected, str):
+                if opcode != expected:
+                    raise ValueError("Unexpected opcode at {0}!".format(pc))
+                continue
+            data = None
+            if 0 < opcode < OPCODE_TO_INT["OP_PUSHDATA1"]:
+                data = view[pc:pc + opcode].tobytes()
+                if len(data) < opcode:
+                    raise ValueError("Script too short!")
+                pc += opcode
+            value = _parse_field(expected, opcode, data)
+            if fields.setdefault(expected, value) != value:
+                raise ValueError("Inconsistent {0}!".format(expected))
+        if pc != len(view):
+            raise ValueError("Unexpected data after script!")
+        return fields
+
+
+class DepositScript(_ParsedScript):
+    """Parsed deposit script with payer_pubkey, payee_pubkey,
+    spend_secret_hash and expire_time."""
+
+    LAYOUT = _template_layout(DEPOSIT_TEMPLATE)
+    _cache = LruCache()
+
+
+class CommitScript(_ParsedScript):
+    """Parsed commit script with payer_pubkey, payee_pubkey,
+    spend_secret_hash, revoke_secret_hash and delay_time."""
+
+    LAYOUT = _template_layout(COMMIT_TEMPLATE)
+    _cache = LruCache()
+
+
+def _compile_push(word):
+    """Compile hex data to its push, opcode names (OP_PUBKEY) as is."""
+    opcode = OPCODE_TO_INT.get(word)
+    if opcode is not None:
+        return bytes_from_int(opcode)
+    data = h2b(word)
+    if 1 < len(data) < OPCODE_TO_INT["OP_PUSHDATA1"]:
+        return bytes_from_int(len(data)) + data
+    return tools.bin_script([data])  # small and large pushes
+
+
+def _compile_number(value):
+    value = int(value)
+    if 0 <= value <= 16:  # OP_0 - OP_16
+        return bytes_from_int(OPCODE_TO_INT["OP_{0}".format(value)])
+    return tools.bin_script([tools.int_to_script_bytes(value)])
+
+
+def _splice(template, fields):
+    return b"".join([
+        compiled + fields[field] if field else compiled
+        for compiled, field in template
+    ])
+
+
 def compile_deposit_script(payer_pubkey, payee_pubkey,
                            spend_secret_hash, expire_time):
     """Compile deposit transaction pay ot script.
@@ -127,28 +253,34 @@ def compile_deposit_script(payer_pubkey, payee_pubkey,
     Return:
         Compiled bitcoin script.
     """
-    script_text = DEPOSIT_SCRIPT.format(
-        payer_pubkey=payer_pubkey,
-        payee_pubkey=payee_pubkey,
-        spend_secret_hash=spend_secret_hash,
-        expire_time=str(expire_time)
-    )
-    return tools.compile(script_text)
+    return _splice(DEPOSIT_TEMPLATE, {
+        "payer_pubkey": _compile_push(payer_pubkey),
+        "payee_pubkey": _compile_push(payee_pubkey),
+        "spend_secret_hash": _compile_push(spend_secret_hash),
+        "expire_time": _compile_number(expire_time),
+    })
 
 
 def compile_commit_script(payer_pubkey, payee_pubkey, spend_secret_hash,
                           revoke_secret_hash, delay_time):
-    script_text = COMMIT_SCRIPT.format(
-        payer_pubkey=payer_pubkey,
-        payee_pubkey=payee_pubkey,
-        spend_secret_hash=spend_secret_hash,
-        revoke_secret_hash=revoke_secret_hash,
-        delay_time=str(delay_time)
-    )
-    return tools.compile(script_text)
+    return _splice(COMMIT_TEMPLATE, {
+        "payer_pubkey": _compile_push(payer_pubkey),
+        "payee_pubkey": _compile_push(payee_pubkey),
+        "spend_secret_hash": _compile_push(spend_secret_hash),
+        "revoke_secret_hash": _compile_push(revoke_secret_hash),
+        "delay_time": _compile_number(delay_time),
+    })
+
+
+class AbsScriptChannelType(ScriptType):
 
+    def _create_script_signature(self, secret_exponent, sign_value,
+                                 signature_type):
+        r, s = crypto.sign(secret_exponent, sign_value)
+        return sigencode_der(r, s) + bytes_from_int(signature_type)
 
-class AbsScriptChannelCommit(ScriptType):
+
+class AbsScriptChannelCommit(AbsScriptChannelType):
 
     def __init__(self, delay_time, spend_secret_hash,
                  payee_sec, payer_sec, revoke_secret_hash):
@@ -166,7 +298,7 @@ class AbsScriptChannelCommit(ScriptType):
     def from_script(cls, script):
         r = cls.match(script)
         if r:
-            delay_time = get_commit_delay_time(cls.TEMPLATE)
+            delay_time = cls.DELAY_TIME
             spend_secret_hash = b2h(r["PUBKEYHASH_LIST"][0])
             payee_sec = r["PUBKEY_LIST"][0]
             revoke_secret_hash = b2h(r["PUBKEYHASH_LIST"][1])
@@ -214,7 +346,7 @@ class AbsScriptChannelCommit(ScriptType):
         return "<ScriptChannelCommit: {0}".format(script_text)
 
 
-class AbsScriptChannelDeposit(ScriptType):
+class AbsScriptChannelDeposit(AbsScriptChannelType):
 
     def __init__(self, payer_sec, payee_sec, spend_secret_hash, expire_time):
         self.payer_sec = payer_sec
@@ -233,7 +365,7 @@ class AbsScriptChannelDeposit(ScriptType):
             assert(payer_sec == r["PUBKEY_LIST"][2])
             assert(payer_sec == r["PUBKEY_LIST"][3])
             spend_secret_hash = b2h(r["PUBKEYHASH_LIST"][0])
-            expire_time = get_deposit_expire_time(cls.TEMPLATE)
+            expire_time = cls.EXPIRE_TIME
             obj = cls(payer_sec, payee_sec, spend_secret_hash, expire_time)
             assert(obj.script == script)
             return obj
@@ -292,8 +424,7 @@ class AbsScriptChannelDeposit(ScriptType):
         try:
             public_pair = encoding.sec_to_public_pair(self.payer_sec)
             sig_pair, signature_type = parse_signature_blob(payer_sig)
-            valid = ecdsa.verify(ecdsa.generator_secp256k1, public_pair,
-                                 sign_value, sig_pair)
+            valid = crypto.verify(public_pair, sign_value, sig_pair)
             if not valid:
                 raise Exception("Invalid payer public_pair!")
         except (encoding.EncodingError, UnexpectedDER):
@@ -326,15 +457,85 @@ class AbsScriptChannelDeposit(ScriptType):
         return "<ScriptChannelDeposit: {0}".format(script_text)
 
 
-class CommitScriptHandler():
+_solvers = {}  # {(script type, expire or delay time): solver class}
+_solvers_mutex = RLock()
 
-    def __init__(self, delay_time):
-        class ScriptChannelCommit(AbsScriptChannelCommit):
-            TEMPLATE = compile_deposit_script(
-                "OP_PUBKEY", "OP_PUBKEY",
+
+def get_commit_solver(delay_time):
+    """Get the cached commit script solver class for a delay time."""
+    with _solvers_mutex:
+        key = ("commit", delay_time)
+        if key not in _solvers:
+            _solvers[key] = type("ScriptChannelCommit", (
+                AbsScriptChannelCommit,
+            ), {"DELAY_TIME": delay_time, "TEMPLATE": compile_commit_script(
+                "OP_PUBKEY", "OP_PUBKEY", "OP_PUBKEYHASH",
                 "OP_PUBKEYHASH", delay_time
+            )})
+        return _solvers[key]
+
+
+def get_deposit_solver(expire_time):
+    """Get the cached deposit script solver class for an expire time."""
+    with _solvers_mutex:
+        key = ("deposit", expire_time)
+        if key not in _solvers:
+            _solvers[key] = type("ScriptChannelDeposit", (
+                AbsScriptChannelDeposit,
+            ), {"EXPIRE_TIME": expire_time, "TEMPLATE": compile_deposit_script(
+                "OP_PUBKEY", "OP_PUBKEY", "OP_PUBKEYHASH", expire_time
+            )})
+        return _solvers[key]
+
+
+def sign_p2sh(tx, script, solver, hash160_lookup, hash_type=None,
+              **kwargs):
+    """Sign all inputs of tx spending from the pay to script hash of script.
+
+    Equivalent to tx.sign with a p2sh_lookup for script, but the script is
+    solved with the given solver class instead of the global pycoin
+    SUBCLASSES list, so transactions may be signed in parallel threads.
+
+    Args:
+        tx: Transaction with unspents set.
+        script: Redeem script of the spent outputs.
+        solver: Solver class from get_deposit_solver or get_commit_solver.
+        hash160_lookup: Private keys as built by build_hash160_lookup.
+        kwargs: Passed to the solver (spend_type, spend_secret, ...).
+
+    Return:
+        The signed tx.
+    """
+    if hash_type is None:
+        hash_type = tx.SIGHASH_ALL
+    tx.check_unspents()
+    script_obj = solver.from_script(script)
+    p2sh_script = tools.compile("OP_HASH160 {0} OP_EQUAL".format(
+        b2h(encoding.hash160(script))
+    ))
+    for idx, tx_in in enumerate(tx.txs_in):
+        if tx.is_signature_ok(idx) or tx_in.is_coinbase():
+            continue
+        if tx.unspents[idx].script != p2sh_script:
+            raise ValueError("Input {0} not spending from script!".format(idx))
+        sign_value = tx.signature_hash(script, idx, hash_type=hash_type)
+        try:
+            solution = script_obj.solve(
+                hash160_lookup=hash160_lookup, sign_value=sign_value,
+                signature_type=hash_type, existing_script=tx_in.script,
+                **kwargs
             )
-        self.script_handler = ScriptChannelCommit
+        except SolvingError:
+            continue
+        tx_in.script = solution + tools.bin_script([script])
+    return tx
+
+
+class CommitScriptHandler():
+    """Deprecated, mutates pycoin global state, use sign_p2sh instead."""
+
+    def __init__(self, delay_time):
+        self.script_handler = get_commit_solver(delay_time)
 
     def __enter__(self):
         SUBCLASSES.insert(0, self.script_handler)
@@ -344,14 +545,10 @@ class CommitScriptHandler():
 
 
 class DepositScriptHandler():
+    """Deprecated, mutates pycoin global state, use sign_p2sh instead."""
 
     def __init__(self, expire_time):
-        class ScriptChannelDeposit(AbsScriptChannelDeposit):
-            TEMPLATE = compile_deposit_script(
-                "OP_PUBKEY", "OP_PUBKEY",
-                "OP_PUBKEYHASH", expire_time
-            )
-        self.script_handler = ScriptChannelDeposit
+        self.script_handler = get_deposit_solver(expire_time)
 
     def __enter__(self):
         SUBCLASSES.insert(0, self.script_handler)
@@ -0,0 +1,199 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import pycoin
+import threading
+import multiprocessing
+from pycoin.tx.TxOut import TxOut
+from .keyring import get_default_keyring
+from .scripts import get_deposit_expire_time
+from .scripts import get_commit_delay_time
+from .scripts import get_deposit_solver
+from .scripts import get_commit_solver
+from .scripts import sign_p2sh
+
+
+WIF_ARGS = ["payer_wif", "payee_wif", "wif"]  # signer arguments with keys
+
+
+_worker_keys = None  # shared {key reference: wif} of the signing service
+_worker_cache = {}   # {key reference: wif} already fetched by this worker
+
+
+def _init_worker(keys):
+    global _worker_keys
+    _worker_keys = keys
+
+
+def _resolve_key(reference):
+    wif = _worker_cache.get(reference)
+    if wif is None and _worker_keys is not None:
+        wif = _worker_keys.get(reference)
+    if wif is None:
+        raise ValueError("Unknown signing key reference!")
+    _worker_cache[reference] = wif
+    return wif
+
+
+def _hash160_lookup(wif):
+    return get_default_keyring().hash160_lookup(wif)
+
+
+def sign_deposit(tx, payer_wif):
+    tx.sign(_hash160_lookup(payer_wif))
+    return tx.as_hex()
+
+
+def sign_create_commit(tx, payer_wif, deposit_script):
+    solver = get_deposit_solver(get_deposit_expire_time(deposit_script))
+    sign_p2sh(tx, deposit_script, solver, _hash160_lookup(payer_wif),
+              spend_type="create_commit", spend_secret=None)
+    return tx.as_hex()
+
+
+def sign_finalize_commit(tx, payee_wif, deposit_script):
+    solver = get_deposit_solver(get_deposit_expire_time(deposit_script))
+    sign_p2sh(tx, deposit_script, solver, _hash160_lookup(payee_wif),
+              spend_type="finalize_commit", spend_secret=None)
+    return tx.as_hex()
+
+
+def sign_recover_commit(tx, wif, script, revoke_secret, spend_secret,
+                        spend_type):
+    solver = get_commit_solver(get_commit_delay_time(script))
+    sign_p2sh(tx, script, solver, _hash160_lookup(wif),
+              spend_type=spend_type, spend_secret=spend_secret,
+              revoke_secret=revoke_secret)
+    return tx.as_hex()
+
+
+def sign_recover_deposit(tx, wif, script, spend_type, spend_secret):
+    solver = get_deposit_solver(get_deposit_expire_time(script))
+    sign_p2sh(tx, script, solver, _hash160_lookup(wif),
+              spend_type=spend_type, spend_secret=spend_secret)
+    return tx.as_hex()
+
+
+SIGNERS = {
+    "deposit": sign_deposit,
+    "create_commit": sign_create_commit,
+    "finalize_commit": sign_finalize_commit,
+    "recover_commit": sign_recover_commit,
+    "recover_deposit": sign_recover_deposit,
+}
+
+
+def sign(kind, tx, **kwargs):
+    """Sign tx in this process with the signer for kind."""
+    return SIGNERS[kind](tx, **kwargs)
+
+
+def create_job(kind, tx, **kwargs):
+    """Serialize a signing request so it can be sent to another process.
+
+    Args:
+        kind (str): One of the SIGNERS keys.
+        tx: Unsigned transaction with unspents set.
+        kwargs: Arguments of the signer besides tx (wif, scripts, ...).
+    """
+    unspents = [(txout.coin_value, txout.script) for txout in tx.unspents]
+    return kind, tx.as_hex(), unspents, kwargs
+
+
+def run_job(job):
+    kind, rawtx, unspents, kwargs = job
+    tx = pycoin.tx.Tx.from_hex(rawtx)
+    tx.unspents = [TxOut(value, script) for value, script in unspents]
+    return sign(kind, tx, **kwargs)
+
+
+def _run_worker_job(job):
+    """Resolve the key references of a SigningService job and run it."""
+    kind, rawtx, unspents, kwargs = job
+    kwargs = dict(kwargs)
+    for name in WIF_ARGS:
+        if name in kwargs:
+            kwargs[name] = _resolve_key(kwargs[name])
+    return run_job((kind, rawtx, unspents, kwargs))
+
+
+class SigningService(object):
+
+    def __init__(self, processes=None):
+        """Sign transactions in a pool of worker processes.
+
+        Signing is cpu bound and holds the GIL, the pool lets concurrent
+        controls and bulk requests use all cores. Share one service
+        between all controls of a process.
+
+        Jobs only reference keys by public key, the wifs are kept in a
+        key store shared with the workers, which fetch each key once.
+
+        Args:
+            processes (int): Number of worker processes, cpu count if None.
+        """
+        self.processes = processes
+        self._pool = None
+        self._manager = None
+        self._keys = {}  # {key reference: wif}
+        self._shared_keys = None  # _keys shared with the workers
+        self._mutex = threading.RLock()
+
+    def _get_pool(self):
+        with self._mutex:
+            if self._pool is None:
+                self._manager = multiprocessing.Manager()
+                self._shared_keys = self._manager.dict(self._keys)
+                self._pool = multiprocessing.Pool(
+                    self.processes, initializer=_init_worker,
+                    initargs=(self._shared_keys,)
+                )
+            return self._pool
+
+    def add_key(self, wif):
+        """Make wif known to the workers and return its key reference."""
+        reference = get_default_keyring().wif2pubkey(wif)
+        with self._mutex:
+            if reference not in self._keys:
+                self._keys[reference] = wif
+                if self._shared_keys is not None:
+                    self._shared_keys[reference] = wif
+        return reference
+
+    def create_job(self, kind, tx, **kwargs):
+        """Like create_job, but with key references instead of wifs."""
+        for name in WIF_ARGS:
+            if name in kwargs:
+                kwargs[name] = self.add_key(kwargs[name])
+        return create_job(kind, tx, **kwargs)
+
+    def sign(self, kind, tx, **kwargs):
+        """Sign tx in a worker process and return the signed hex."""
+        job = self.create_job(kind, tx, **kwargs)
+        with self._mutex:  # pool may not be closed while submitting
+            result = self._get_pool().apply_async(_run_worker_job, (job,))
+        return result.get()
+
+    def sign_all(self, jobs):
+        """Sign jobs created by SigningService.create_job in parallel.
+
+        Return:
+            Signed transactions hex in the order of jobs.
+        """
+        if not jobs:
+            return []
+        with self._mutex:  # pool may not be closed while submitting
+            result = self._get_pool().map_async(_run_worker_job, jobs)
+        return result.get()
+
+    def close(self):
+        with self._mutex:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._manager.shutdown()
+                self._pool = None
+                self._manager = None
+                self._shared_keys = None
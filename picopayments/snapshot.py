@@ -0,0 +1,246 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import os
+import mmap
+import struct
+from . import util
+
+
+# File layout, all integers big endian:
+#
+#   header   MAGIC, version u16, channel count u32, index offset u64
+#   channels encoded channel states, see _encode_channel
+#   index    per channel: key length u16, key utf8, offset u64, length u32
+MAGIC = b"PPSNAP"
+VERSION = 1
+HEADER = struct.Struct(">6sHIQ")
+INDEX_ENTRY = struct.Struct(">QI")
+NONE = 0xFFFFFFFF  # length of missing optional fields
+
+
+_FIELDS = [  # (name, is hex) of the scalar channel fields in file order
+    ("payer_wif", False),
+    ("payee_wif", False),
+    ("spend_secret", True),
+    ("deposit_script_hex", True),
+    ("deposit_rawtx", True),
+    ("timeout_rawtx", True),
+    ("change_rawtx", True),
+]
+
+
+def _pack_bytes(data):
+    if data is None:
+        return struct.pack(">I", NONE)
+    return struct.pack(">I", len(data)) + data
+
+
+def _pack_field(value, is_hex):
+    if value is None:
+        return _pack_bytes(None)
+    return _pack_bytes(util.h2b(value) if is_hex else value.encode("utf8"))
+
+
+def _pack_commit(commit, quantity=None):
+    data = b"".join([
+        _pack_field(commit["rawtx"], True),
+        _pack_field(commit["script"], True),
+        _pack_field(commit["revoke_secret"], True),
+    ])
+    if quantity is not None:
+        data += struct.pack(">Q", quantity)
+    return data
+
+
+def _encode_channel(state, active_quantities):
+    """Encode a channel state as returned by Base.save."""
+    parts = [_pack_field(state[name], is_hex) for name, is_hex in _FIELDS]
+    parts.append(struct.pack(">I", len(state["commits_requested"])))
+    parts.extend([_pack_field(secret, True) + struct.pack(">d", requested)
+                  for secret, requested in zip(
+                      state["commits_requested"],
+                      state["commits_requested_times"])])
+    parts.append(struct.pack(">I", len(state["commits_active"])))
+    parts.extend([_pack_commit(commit, quantity) for commit, quantity
+                  in zip(state["commits_active"], active_quantities)])
+    parts.append(struct.pack(">I", len(state["commits_revoked"])))
+    parts.extend([_pack_commit(commit)
+                  for commit in state["commits_revoked"]])
+    return b"".join(parts)
+
+
+class _Reader(object):
+
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.view, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def field(self, is_hex):
+        size, = self.unpack(">I")
+        if size == NONE:
+            return None
+        data = self.view[self.pos:self.pos + size].tobytes()
+        if len(data) != size:
+            raise ValueError("Truncated snapshot!")
+        self.pos += size
+        return util.b2h(data) if is_hex else data.decode("utf8")
+
+    def commit(self):
+        return {
+            "rawtx": self.field(True),
+            "script": self.field(True),
+            "revoke_secret": self.field(True),
+        }
+
+
+def _decode_channel(view):
+    """Return channel state and active quantities encoded in view."""
+    reader = _Reader(view)
+    state = dict((name, reader.field(is_hex)) for name, is_hex in _FIELDS)
+    count, = reader.unpack(">I")
+    state["commits_requested"] = []
+    state["commits_requested_times"] = []
+    for i in range(count):
+        state["commits_requested"].append(reader.field(True))
+        state["commits_requested_times"].append(reader.unpack(">d")[0])
+    count, = reader.unpack(">I")
+    state["commits_active"] = []
+    active_quantities = []
+    for i in range(count):
+        state["commits_active"].append(reader.commit())
+        active_quantities.append(reader.unpack(">Q")[0])
+    count, = reader.unpack(">I")
+    state["commits_revoked"] = [reader.commit() for i in range(count)]
+    return state, active_quantities
+
+
+def write(path, channels):
+    """Write channels atomically to a snapshot file.
+
+    Args:
+        path (str): Snapshot file to create or replace.
+        channels (dict): Channels to store by key, {str: Base}.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            _write_channels(f, channels)
+        os.rename(tmp_path, path)  # atomic on posix
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    util.fsync_dir(path)
+
+
+def _write_channels(f, channels):
+    f.write(HEADER.pack(MAGIC, VERSION, 0, 0))  # placeholder
+    offset = HEADER.size
+    index = []
+    for key in sorted(channels):
+        channel = channels[key]
+        with channel.mutex:
+            data = _encode_channel(channel.save(), channel.active_quantities)
+        f.write(data)
+        index.append((key, offset, len(data)))
+        offset += len(data)
+    for key, entry_offset, length in index:
+        key = key.encode("utf8")
+        f.write(struct.pack(">H", len(key)) + key +
+                INDEX_ENTRY.pack(entry_offset, length))
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, len(index), offset))
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class Snapshot(object):
+
+    def __init__(self, path):
+        """Memory mapped snapshot, channels are decoded on access.
+
+        Only the offset index is read on open, so opening is fast and
+        the os pages in just the channels that are loaded.
+
+        Args:
+            path (str): Snapshot file written by write.
+        """
+        self.path = path
+        self._mmap = None
+        self._view = None
+        self._file = open(path, "rb")
+        try:
+            if os.fstat(self._file.fileno()).st_size < HEADER.size:
+                raise ValueError("Truncated snapshot!")  # mmap needs data
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+            self._index = self._read_index()  # {key: (offset, length)}
+        except struct.error:
+            self.close()
+            raise ValueError("Truncated snapshot!")
+        except Exception:
+            self.close()
+            raise
+
+    def _read_index(self):
+        magic, version, count, index_offset = HEADER.unpack_from(self._view)
+        if magic != MAGIC:
+            raise ValueError("Not a channel snapshot: {0}".format(self.path))
+        if version != VERSION:
+            raise ValueError("Unsupported snapshot version: {0}".format(
+                version
+            ))
+        index = {}
+        reader = _Reader(self._view)
+        reader.pos = index_offset
+        for i in range(count):
+            size, = reader.unpack(">H")
+            key = reader.view[reader.pos:reader.pos + size].tobytes()
+            reader.pos += size
+            offset, length = reader.unpack(">QI")
+            if offset + length > len(self._view):
+                raise ValueError("Truncated snapshot!")
+            index[key.decode("utf8")] = (offset, length)
+        return index
+
+    def keys(self):
+        return list(self._index.keys())
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key):
+        """Decode channel state and active quantities of key."""
+        offset, length = self._index[key]
+        return _decode_channel(self._view[offset:offset + length])
+
+    def load(self, key, channel):
+        """Load the state of key into channel without remote calls."""
+        state, active_quantities = self.get(key)
+        channel._load(state, active_quantities)
+        return channel
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
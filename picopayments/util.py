@@ -1,10 +1,13 @@
+import os
 import pycoin
 import time
 from threading import Thread
 from pycoin.serialize import b2h  # NOQA
 from pycoin.serialize import h2b  # NOQA
 from pycoin.serialize import b2h_rev  # NOQA
+from pycoin.serialize import h2b_rev  # NOQA
 from pycoin.encoding import hash160  # NOQA
+from pycoin.tx.script import tools
 
 
 def gettxid(rawtx):
@@ -38,15 +41,41 @@ def script2address(script, netcode="BTC"):
     return pycoin.tx.pay_to.address_for_pay_to_script(script, netcode=netcode)
 
 
+def address2script(address, netcode="BTC"):
+    """Return pay to pubkey hash or pay to script output script."""
+    data = pycoin.encoding.a2b_hashed_base58(address)
+    prefix, digest = data[:1], b2h(data[1:])
+    if prefix == pycoin.networks.pay_to_script_prefix_for_netcode(netcode):
+        return tools.compile("OP_HASH160 {0} OP_EQUAL".format(digest))
+    if prefix == pycoin.networks.address_prefix_for_netcode(netcode):
+        return tools.compile(
+            "OP_DUP OP_HASH160 {0} OP_EQUALVERIFY OP_CHECKSIG".format(digest)
+        )
+    raise ValueError("Invalid {0} address: {1}".format(netcode, address))
+
+
 def hash160hex(hexdata):
     return b2h(hash160(h2b(hexdata)))
 
 
+def fsync_dir(path):
+    """Fsync the directory of path so a rename into it is durable."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return  # windows, directory entries can not be synced
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 class UpdateThreadMixin(object):
 
     interval = 0.1
+    max_interval = None  # adaptive scheduling upper bound
     _update_stop = False
     _update_thread = None
+    _update_scheduler = None
 
     def _update_target(self):
         last_call = 0
@@ -56,11 +85,24 @@ class UpdateThreadMixin(object):
                 self.update()
             time.sleep(0.01)
 
-    def start(self):
+    def start(self, scheduler=None):
+        """Call update every interval seconds.
+
+        Uses the given shared scheduler, or a dedicated thread if None.
+        """
+        if scheduler is not None:
+            self._update_scheduler = scheduler
+            scheduler.register(self, self.interval,
+                               max_interval=self.max_interval)
+            return
+        self._update_stop = False
         self._update_thread = Thread(target=self._update_target)
         self._update_thread.start()
 
     def stop(self):
+        if self._update_scheduler is not None:
+            self._update_scheduler.unregister(self)
+            self._update_scheduler = None
         if self._update_thread is not None:
             self._update_stop = True
             self._update_thread.join()
@@ -0,0 +1,233 @@
+# coding: utf-8
+# Copyright (c) 2016 Fabian Barkhau <fabian.barkhau@gmail.com>
+# License: MIT (see LICENSE file)
+
+
+import time
+import logging
+import threading
+from btctxstore import BtcTxStore
+from . import util
+
+
+DEFAULT_INTERVAL = 10.0  # seconds between chain tip checks
+MAX_BLOCK_HASHES = 100  # recent block hashes kept to detect reorgs
+
+
+_log = logging.getLogger(__name__)
+_default_watchers = {}
+_default_watchers_mutex = threading.RLock()
+
+
+def get_default_watcher(testnet=False):
+    """Get the chain watcher shared by all controls of a network."""
+    with _default_watchers_mutex:
+        if testnet not in _default_watchers:
+            _default_watchers[testnet] = ChainWatcher(testnet=testnet)
+        return _default_watchers[testnet]
+
+
+class ChainWatcher(util.UpdateThreadMixin):
+
+    def __init__(self, testnet=False, interval=DEFAULT_INTERVAL,
+                 btctxstore=None):
+        """Process wide watcher of transaction confirmations.
+
+        Only the chain tip is polled, confirms of watched transactions are
+        refreshed once per new block and pushed to subscribers. Once a
+        transaction is confirmed its inclusion height is kept and further
+        confirms are derived from the tip until a reorg replaces its block.
+        Drive it by calling start (optionally with a shared scheduler) or
+        update.
+
+        Args:
+            testnet (bool): True if running on testnet, otherwise mainnet.
+            interval (float): Seconds between chain tip checks.
+            btctxstore (BtcTxStore): Blockchain service to query.
+        """
+        self.btctxstore = btctxstore or BtcTxStore(testnet=testnet,
+                                                   service="insight")
+        self.interval = interval
+        self.condition = threading.Condition(threading.RLock())
+        self._update_mutex = threading.RLock()  # one tip update at a time
+        self.tip = None           # block hash of the chain tip
+        self.height = None        # block height of the chain tip
+        self.confirms = {}        # {txid: confirms or None if unpublished}
+        self.heights = {}         # {txid: inclusion height} if confirmed
+        self.subscriptions = {}   # {txid: [callback(txid, confirms)]}
+        self.block_callbacks = []  # [callback(height)]
+        self.block_hashes = {}    # {height: block hash} of recent blocks
+        self.forks = []           # lowest replaced height of every reorg
+        self.last_update = 0
+
+    def _fetch(self, txid):
+        return self.btctxstore.confirms(txid)
+
+    def is_watched(self, txid):
+        with self.condition:
+            return txid in self.confirms
+
+    def watch(self, txid):
+        """Watch txid and return its current confirms."""
+        with self.condition:
+            if txid in self.confirms:
+                return self.confirms[txid]
+        confirms = self._fetch(txid)
+        with self.condition:
+            self.confirms.setdefault(txid, confirms)
+            self.condition.notify_all()
+            return self.confirms[txid]
+
+    def unwatch(self, txid):
+        with self.condition:
+            self.confirms.pop(txid, None)
+            self.heights.pop(txid, None)
+            self.subscriptions.pop(txid, None)
+
+    def get_confirms(self, txid):
+        """Returns number of confirms or None if unpublished."""
+        return self.watch(txid)
+
+    def subscribe(self, txid, callback):
+        """Call callback(txid, confirms) whenever the confirms change."""
+        with self.condition:
+            self.subscriptions.setdefault(txid, []).append(callback)
+        return self.watch(txid)
+
+    def unsubscribe(self, txid, callback):
+        with self.condition:
+            callbacks = self.subscriptions.get(txid, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def subscribe_blocks(self, callback):
+        """Call callback(height) once for every new chain tip."""
+        with self.condition:
+            self.block_callbacks.append(callback)
+
+    def unsubscribe_blocks(self, callback):
+        with self.condition:
+            if callback in self.block_callbacks:
+                self.block_callbacks.remove(callback)
+
+    def wait_for_confirms(self, txid, confirms=1, timeout=None):
+        """Block until txid has at least the given confirms.
+
+        Requires the watcher to be updated by another thread.
+
+        Return:
+            True if confirmed, False if the timeout expired.
+        """
+        self.watch(txid)
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while (self.confirms.get(txid) or 0) < confirms:
+                if txid not in self.confirms:
+                    return False  # unwatched by someone else
+                if deadline is None:
+                    self.condition.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def get_height(self, max_age=None):
+        """Return chain tip height, checked at most every max_age seconds.
+
+        Defaults to the update interval, so a watcher nobody updates still
+        serves all callers with one tip query per interval.
+        """
+        max_age = self.interval if max_age is None else max_age
+        if self.height is None or time.time() - self.last_update > max_age:
+            self.update()
+        return self.height
+
+    def get_forks(self, since=0):
+        """Return number of reorgs seen and lowest height replaced by the
+        reorgs after the first since ones, None if there were none."""
+        with self.condition:
+            forks = self.forks[since:]
+            return len(self.forks), min(forks) if forks else None
+
+    def _find_fork(self, service, height, header):
+        """Return lowest known height replaced by the new tip or None."""
+        fork = None
+        if any(h >= height for h in self.block_hashes):
+            fork = height
+        h, parent = height - 1, header.previous_block_hash
+        while self.block_hashes and h >= min(self.block_hashes):
+            known = self.block_hashes.get(h)
+            if known == parent:
+                break
+            if known is not None:
+                fork = h
+            parent = service.get_blockheader(parent).previous_block_hash
+            h -= 1
+        return fork
+
+    def update(self):
+        """Check the chain tip and refresh watched txids on new blocks.
+
+        Concurrent calls are serialized, otherwise two callers seeing the
+        same new tip would both process it and report a false reorg.
+        """
+        with self._update_mutex:
+            notifications = self._update()
+        if notifications is None:
+            return False
+        for callback, args in notifications:
+            try:
+                callback(*args)
+            except Exception:
+                _log.exception("Chain watcher callback failed!")
+        return True
+
+    def _update(self):
+        """Process a new chain tip, return notifications or None if none."""
+        service = self.btctxstore.service
+        tip = service.get_blockchain_tip()
+        self.last_update = time.time()
+        if tip == self.tip:
+            return None
+        header = service.get_blockheader(tip)
+        height = header.height
+        with self.condition:
+            fork = self._find_fork(service, height, header)
+            if fork is not None:
+                self.forks.append(fork)
+                for h in [h for h in self.block_hashes if h >= fork]:
+                    del self.block_hashes[h]
+                for txid, h in list(self.heights.items()):
+                    if h >= fork:
+                        del self.heights[txid]  # refetch, block replaced
+            self.block_hashes[height] = tip
+            for h in [h for h in self.block_hashes
+                      if h <= height - MAX_BLOCK_HASHES]:
+                del self.block_hashes[h]
+            txids = [t for t in self.confirms if t not in self.heights]
+        confirms = dict((txid, self._fetch(txid)) for txid in txids)
+
+        # confirms only match this tip if no block was found meanwhile
+        consistent = not confirms or service.get_blockchain_tip() == tip
+
+        notifications = []
+        with self.condition:
+            self.tip = tip
+            self.height = height
+            for txid, h in self.heights.items():
+                confirms[txid] = height - h + 1
+            for txid, count in confirms.items():
+                if txid not in self.confirms:
+                    continue  # unwatched meanwhile
+                if consistent and count:
+                    self.heights[txid] = height - count + 1
+                if self.confirms[txid] != count:
+                    for callback in self.subscriptions.get(txid, []):
+                        notifications.append((callback, (txid, count)))
+                self.confirms[txid] = count
+            for callback in self.block_callbacks:
+                notifications.append((callback, (height,)))
+            self.condition.notify_all()
+        return notifications
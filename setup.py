@@ -22,6 +22,7 @@ setup(
     dependency_links=[],
     install_requires=open("requirements.txt").readlines(),
     tests_require=open("test_requirements.txt").readlines(),
+    extras_require={"aio": ["aiohttp"]},
     packages=find_packages(),
     classifiers=[
         # "Development Status :: 1 - Planning",
@@ -1,3 +1,4 @@
+import sys
 import unittest
 
 
@@ -6,6 +7,19 @@ from . import timeout  # NOQA
 from . import change  # NOQA
 from . import commit  # NOQA
 from . import scripts  # NOQA
+from . import counterparty  # NOQA
+from . import control  # NOQA
+from . import cache  # NOQA
+from . import ledger  # NOQA
+from . import scheduler  # NOQA
+from . import watcher  # NOQA
+from . import signing  # NOQA
+from . import crypto  # NOQA
+from . import keyring  # NOQA
+from . import journal  # NOQA
+from . import snapshot  # NOQA
+if sys.version_info >= (3, 5):
+    from . import aio  # NOQA
 
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+import json
+import asyncio
+import unittest
+import picopayments
+from picopayments.aio import AsyncControl
+from picopayments.aio import AsyncPayee
+from picopayments.aio import AsyncPayer
+from pycoin.tx import Tx
+from picopayments.watcher import ChainWatcher
+from .watcher import FakeBtcTxStore
+from .control import ASSET
+from .control import DEPOSIT_SCRIPT
+from .control import DEPOSIT_RAWTX
+from .control import COMMIT_SCRIPT
+from .control import UNSIGNED_COMMIT_RAWTX
+from .scripts import DEPOSIT_PAYER_WIF
+
+
+INSIGHT_URL = "http://insight.test/api"
+
+
+class FakeResponse(object):
+
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def text(self):
+        return json.dumps(self.data)
+
+
+class FakeSession(object):
+
+    def __init__(self, responses):
+        self.responses = responses  # {url: (status, data)}
+        self.requested = []
+        self.posted = []
+
+    def get(self, url, timeout=None):
+        self.requested.append(url)
+        status, data = self.responses.get(url, (404, None))
+        return FakeResponse(status, data)
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.requested.append(url)
+        self.posted.append((json.loads(data), headers))
+        status, data = self.responses.get(url, (404, None))
+        return FakeResponse(status, data)
+
+
+class CountingControl(AsyncControl):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingControl, self).__init__(*args, **kwargs)
+        self.sent = []
+
+    async def _rpc_post(self, payload, timeout=None):
+        self.sent.append(payload)
+        return dict((entry["id"], entry["method"]) for entry in payload)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncControl(unittest.TestCase):
+
+    def setUp(self):
+        deposit_tx = Tx.from_hex(DEPOSIT_RAWTX)
+        self.deposit_txid = deposit_tx.id()
+        self.deposit_address = picopayments.util.script2address(
+            picopayments.util.h2b(DEPOSIT_SCRIPT), "XTN"
+        )
+        self.commit_address = picopayments.util.script2address(
+            picopayments.util.h2b(COMMIT_SCRIPT), "XTN"
+        )
+        utxos_url = "{0}/addr/{1}/utxo".format(INSIGHT_URL,
+                                               self.deposit_address)
+        self.session = FakeSession({
+            utxos_url: (200, [{
+                "txid": self.deposit_txid, "vout": 0, "amount": 0.0004629,
+                "scriptPubKey": picopayments.util.b2h(
+                    deposit_tx.txs_out[0].script
+                )
+            }]),
+            "{0}/rawtx/{1}".format(INSIGHT_URL, self.deposit_txid): (
+                200, {"rawtx": DEPOSIT_RAWTX}
+            ),
+            "{0}/tx/{1}".format(INSIGHT_URL, self.deposit_txid): (
+                200, {"confirmations": 3}
+            ),
+        })
+        self.control = CountingControl(
+            ASSET, testnet=True, http_session=self.session,
+            insight_url=INSIGHT_URL
+        )
+
+    def test_create_tx(self):
+        rawtx = run(self.control.create_tx(
+            self.deposit_address, self.commit_address, 1, extra_btc=15430
+        ))
+        self.assertEqual(rawtx, UNSIGNED_COMMIT_RAWTX)
+        self.assertEqual(run(self.control.get_quantity(rawtx)), 1)
+
+    def test_add_unspents(self):
+        tx = Tx.from_hex(UNSIGNED_COMMIT_RAWTX)
+        run(self.control._add_unspents(tx))
+        self.assertEqual(tx.unspents[0].coin_value, 46290)
+        tx = Tx.from_hex(UNSIGNED_COMMIT_RAWTX)
+        run(self.control._add_unspents(tx))  # served from tx cache
+        self.assertEqual(len(self.session.requested), 1)
+
+    def test_confirms(self):
+        self.assertEqual(run(self.control.confirms(self.deposit_txid)), 3)
+        self.assertIsNone(run(self.control.confirms("00" * 32)))
+
+    def test_batch(self):
+        batch = self.control.batch()
+        a = batch.add("get_balances", {})
+        b = batch.add("unpack", {"data_hex": "00"})
+        results = run(batch.send())
+        self.assertEqual(len(self.control.sent), 1)
+        self.assertEqual(results[a], "get_balances")
+        self.assertEqual(results[b], "unpack")
+        self.assertEqual(run(self.control.batch().send()), {})
+
+    def test_rpc_post(self):
+        api_url = "http://counterparty.test/api/"
+        session = FakeSession({api_url: (200, {"result": 42, "id": 0})})
+        control = AsyncControl(ASSET, testnet=True, http_session=session,
+                               api_url=api_url, user="rpc", password="1234")
+        payload = {"method": "get_running_info", "params": {},
+                   "jsonrpc": "2.0", "id": 0}
+        self.assertEqual(run(control._rpc_post(payload)), 42)
+        posted, headers = session.posted[0]
+        self.assertEqual(posted, payload)
+        self.assertEqual(headers["Authorization"], "Basic cnBjOjEyMzQ=")
+
+    def test_ledger_balance(self):
+        script = picopayments.util.h2b(DEPOSIT_SCRIPT)
+        self.control.observe(DEPOSIT_RAWTX, scripts=[script])
+        balance = run(self.control.get_balance(self.deposit_address))
+        self.assertEqual(balance, (1337, 46290))
+        self.assertEqual(self.control.sent, [])
+
+
+class TestAsyncSigning(unittest.TestCase):
+
+    def setUp(self):
+        self.service = picopayments.signing.SigningService(processes=2)
+        self.tx = Tx.from_hex(UNSIGNED_COMMIT_RAWTX)
+        self.tx.unspents = [Tx.from_hex(DEPOSIT_RAWTX).txs_out[0]]
+        self.script = picopayments.util.h2b(DEPOSIT_SCRIPT)
+        self.expected = picopayments.signing.sign(
+            "create_commit", self.tx, payer_wif=DEPOSIT_PAYER_WIF,
+            deposit_script=self.script
+        )
+
+    def tearDown(self):
+        self.service.close()
+
+    def test_sign(self):
+        for signer in [None, self.service]:
+            control = AsyncControl(ASSET, testnet=True, signer=signer)
+            rawtx = run(control._sign_create_commit(
+                self.tx, DEPOSIT_PAYER_WIF, self.script
+            ))
+            self.assertEqual(rawtx, self.expected)
+
+    def test_sign_all(self):
+        control = AsyncControl(ASSET, testnet=True, signer=self.service)
+        job = control._create_job("create_commit", self.tx,
+                                  payer_wif=DEPOSIT_PAYER_WIF,
+                                  deposit_script=self.script)
+        self.assertEqual(run(control.sign_all([job, job])),
+                         [self.expected] * 2)
+
+
+class TestAsyncChannel(unittest.TestCase):
+
+    def setUp(self):
+        self.btctxstore = FakeBtcTxStore()
+        self.watcher = ChainWatcher(btctxstore=self.btctxstore)
+        for i in range(3):
+            self.btctxstore.mine()
+
+    def _payee(self, session):
+        payee = AsyncPayee(ASSET, testnet=True, dryrun=True)
+        payee.control.http_session = session
+        payee.control.insight_url = INSIGHT_URL
+        payee.control.get_watcher = lambda: self.watcher
+        payee.deposit_rawtx = DEPOSIT_RAWTX
+        payee.deposit_script_hex = DEPOSIT_SCRIPT
+        return payee
+
+    def test_deposit_confirms(self):
+        deposit_txid = Tx.from_hex(DEPOSIT_RAWTX).id()
+        session = FakeSession({
+            "{0}/tx/{1}".format(INSIGHT_URL, deposit_txid): (
+                200, {"confirmations": 3}
+            ),
+        })
+        payee = self._payee(session)
+        self.assertEqual(run(payee.get_deposit_confirms()), 3)
+        self.assertTrue(run(payee.is_deposit_confirmed()))
+        self.assertEqual(run(payee.get_deposit_total()), 1337)
+        self.assertEqual(run(payee.get_deposit_remaining()), 1337)
+
+    def test_confirms_derived_from_tip(self):
+        deposit_txid = Tx.from_hex(DEPOSIT_RAWTX).id()
+        url = "{0}/tx/{1}".format(INSIGHT_URL, deposit_txid)
+        session = FakeSession({url: (200, {"confirmations": 3})})
+        payee = self._payee(session)
+        self.assertEqual(run(payee.get_deposit_confirms()), 3)
+        self.btctxstore.mine()
+        self.watcher.update()
+        self.assertEqual(run(payee.get_deposit_confirms()), 4)
+        self.assertEqual(session.requested, [url])
+
+    def test_blocks_until_deadline(self):
+        deposit_txid = Tx.from_hex(DEPOSIT_RAWTX).id()
+        url = "{0}/tx/{1}".format(INSIGHT_URL, deposit_txid)
+        session = FakeSession({})
+        payer = AsyncPayer(ASSET, testnet=True, dryrun=True)
+        payer.control.http_session = session
+        payer.control.insight_url = INSIGHT_URL
+        payer.control.get_watcher = lambda: self.watcher
+        self.assertIsNone(run(payer.get_blocks_until_deadline()))
+        payer.deposit_rawtx = DEPOSIT_RAWTX
+        payer.deposit_script_hex = DEPOSIT_SCRIPT
+        self.assertEqual(run(payer.get_blocks_until_deadline()), 1)
+        session.responses[url] = (200, {"confirmations": 3})
+        expire_time = 0xffff
+        self.assertEqual(run(payer.get_blocks_until_deadline()),
+                         expire_time - 3)
+
+    def test_reorg_invalidates(self):
+        deposit_txid = Tx.from_hex(DEPOSIT_RAWTX).id()
+        url = "{0}/tx/{1}".format(INSIGHT_URL, deposit_txid)
+        session = FakeSession({url: (200, {"confirmations": 1})})
+        payee = self._payee(session)
+        self.assertEqual(run(payee.get_deposit_confirms()), 1)
+        self.btctxstore.reorg(2)
+        self.btctxstore.mine(fork="b")
+        self.btctxstore.mine(fork="b")
+        self.watcher.update()
+        session.responses[url] = (200, {"confirmations": 2})
+        self.assertEqual(run(payee.get_deposit_confirms()), 2)
+        self.assertEqual(session.requested, [url, url])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+import picopayments
+
+
+ASSET = "A14456548018133352000"
+
+
+class CountingControl(picopayments.control.Control):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingControl, self).__init__(*args, **kwargs)
+        self.posted = []
+
+    def _rpc_post(self, payload, timeout=None):
+        self.posted.append(payload)
+        if isinstance(payload, list):
+            return dict((entry["id"], [entry["method"]]) for entry in payload)
+        return [payload["method"]]
+
+
+class TestLruCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = picopayments.cache.LruCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+
+class TestRpcCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "cache.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_set_get(self):
+        cache = picopayments.cache.RpcCache(self.path)
+        key = cache.key("unpack", {"data_hex": "00"})
+        self.assertIsNone(cache.get(key))
+        cache.set(key, [0, {"quantity": 1}])
+        self.assertEqual(cache.get(key), [0, {"quantity": 1}])
+
+    def test_shared_between_instances(self):
+        key = picopayments.cache.RpcCache.key("unpack", {"data_hex": "00"})
+        picopayments.cache.RpcCache(self.path).set(key, [1])
+        self.assertEqual(picopayments.cache.RpcCache(self.path).get(key), [1])
+
+    def test_evict(self):
+        cache = picopayments.cache.RpcCache(self.path, max_entries=2)
+        for i in range(5):
+            cache.set(cache.key("unpack", {"data_hex": str(i)}), [i])
+        cache.evict()
+        self.assertEqual(len(cache), 2)
+
+    def test_control_pure_methods_cached(self):
+        control = CountingControl(ASSET, testnet=True, cache_path=self.path)
+        payload = {
+            "method": "unpack", "params": {"data_hex": "00"},
+            "jsonrpc": "2.0", "id": 0,
+        }
+        self.assertEqual(control._rpc_call(payload), ["unpack"])
+        self.assertEqual(control._rpc_call(payload), ["unpack"])
+        self.assertEqual(len(control.posted), 1)
+
+    def test_control_batch_only_sends_missing(self):
+        control = CountingControl(ASSET, testnet=True, cache_path=self.path)
+        batch = control.batch()
+        batch.add("unpack", {"data_hex": "00"})
+        batch.send()
+        batch = control.batch()
+        cached_id = batch.add("unpack", {"data_hex": "00"})
+        balances_id = batch.add("get_balances", {"filters": []})
+        results = batch.send()
+        self.assertEqual(results[cached_id], ["unpack"])
+        self.assertEqual(results[balances_id], ["get_balances"])
+        self.assertEqual(len(control.posted[1]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -65,6 +65,7 @@ AFTER_STATE = {
     "commits_revoked": [],
     "commits_active": [],
     "commits_requested": [],
+    "commits_requested_times": [],
     "payee_wif": None,
     "payer_wif": "cNEC8Ftb6g8gmpthaSJd1bqFP811FFhykF4SK1jdByPJbxzbLGGw",
     "timeout_rawtx": None,
@@ -86,6 +86,7 @@ PAYER_AFTER = {
     "deposit_script_hex": "63522102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d52103c7b09d53bdb0ef9cfea06c1e6f2192e6a91cdeac209402bc36c1c368021a861152ae6763a9144cc776751eb4d41f23feaf94697cb7ec2fe597a4882102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d5ac6703ffff00b2752102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d5ac6868",
     "timeout_rawtx": None,
     "commits_requested": [],
+    "commits_requested_times": [],
     "change_rawtx": None,
     "commits_revoked": []
 }
@@ -143,7 +144,8 @@ PAYEE_AFTER_SET_COMMIT = {
     "change_rawtx": None,
     "payee_wif": "cVmyYsHfeJWmCFy7N6DUeC4aXMS8vRR57aW7eGmpFVLfSHWjZ4jc",
     "payer_wif": None,
-    "commits_requested": []
+    "commits_requested": [],
+    "commits_requested_times": []
 }
 
 
@@ -183,6 +185,7 @@ PAYEE_AFTER_CLOSE = {
     "deposit_rawtx": "0100000001d85205661d29fec2e5ede0dbb8eaa0e55655c7b14b1aeac9b0e72dae01596f63000000006b483045022100e631d8b259bd09ba8956a96e6e471e9938ddad1fa831bb12ffa690f2d0d2640002202cf3bcc376225e1861443608cad549d63a76b636225630946942205dfd8f4672012102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d5ffffffff03d2b400000000000017a9145c6f176aa8bab82688c8b07562595a622d7b889a8700000000000000001e6a1c6c4d9b5afac6415f4eff0ec371c5d8155b582176fa9e12aed0cc84645e310200000000001976a914a5efd9bcdc152be40dc2390607a806b32cf2902c88ac00000000",
     "payee_wif": "cVmyYsHfeJWmCFy7N6DUeC4aXMS8vRR57aW7eGmpFVLfSHWjZ4jc",
     "commits_requested": [],
+    "commits_requested_times": [],
     "commits_revoked": [],
     "commits_active": [
         {
@@ -221,6 +224,47 @@ class TestCommit(unittest.TestCase):
         self.assertEqual(len(hash_bin), 20)
         self.assertEqual(quantity, 1)
 
+    def test_request_commit_ttl(self):
+        self.payee.load(PAYEE_AFTER_REQUEST)
+        self.payee.commit_request_ttl = 60
+        secret_hash = self.payee.request_commit(1)[1]
+        self.assertEqual(len(self.payee.save()["commits_requested"]), 2)
+        for request_hash in self.payee.commits_requested:  # age requests
+            secret, requested = self.payee.commits_requested[request_hash]
+            self.payee.commits_requested[request_hash] = (secret, 0)
+        self.payee.request_commit(1)
+        self.assertNotIn(secret_hash, self.payee.commits_requested)
+        self.assertEqual(len(self.payee.commits_requested), 1)
+
+    def test_set_commit_expired_request(self):
+        commit = EXPECTED_COMMIT
+        self.payee.load(PAYEE_AFTER_REQUEST)
+        self.payee.commit_request_ttl = 60
+        request = self.payee.commits_requested[REVOKE_SECRET_HASH]
+        self.payee.commits_requested[REVOKE_SECRET_HASH] = (request[0], 0)
+        self.assertIsNone(self.payee.set_commit(commit["rawtx"],
+                                                commit["script"]))
+        self.assertEqual(self.payee.save()["commits_active"], [])
+
+    def test_create_commit_reused_revoke_hash(self):
+        self.payer.load(PAYER_BEFORE)
+        self.payer.create_commit(1, REVOKE_SECRET_HASH, DELAY_TIME)
+        self.assertRaises(ValueError, self.payer.create_commit, 2,
+                          REVOKE_SECRET_HASH, DELAY_TIME)
+        self.assertEqual(self.payer.active_quantities, [1])
+
+    def test_request_time_restored(self):
+        self.payee.load(PAYEE_AFTER_REQUEST)
+        self.payee.commit_request_ttl = 60
+        request = self.payee.commits_requested[REVOKE_SECRET_HASH]
+        self.payee.commits_requested[REVOKE_SECRET_HASH] = (request[0], 0)
+        self.payee.load(self.payee.save())  # restart keeps request age
+        self.assertEqual(self.payee.commits_requested[REVOKE_SECRET_HASH],
+                         (request[0], 0))
+        commit = EXPECTED_COMMIT
+        self.assertIsNone(self.payee.set_commit(commit["rawtx"],
+                                                commit["script"]))
+
     def test_create_commit(self):
         self.payer.load(PAYER_BEFORE)
         commit = self.payer.create_commit(1, REVOKE_SECRET_HASH, DELAY_TIME)
@@ -253,6 +297,61 @@ class TestCommit(unittest.TestCase):
         self.assertEqual(self.payer.get_transferred_amount(), 4)
         self.assertEqual(self.payee.get_transferred_amount(), 4)
 
+    def test_revoke_index(self):
+        self.payer.load(PAYER_BEFORE)
+        self.payee.load(PAYEE_BEFORE_REQUEST)
+        for quantity in range(1, 6):
+            amount, revoke_hash = self.payee.request_commit(quantity)
+            commit = self.payer.create_commit(amount, revoke_hash, DELAY_TIME)
+            self.payee.set_commit(commit["rawtx"], commit["script"])
+        self.assertEqual(len(self.payer.active_revoke_hashes), 5)
+        secrets = [c["revoke_secret"] for c in self.payee.commits_active]
+
+        # single revoke
+        revoked = self.payer.revoke(secrets[2])
+        self.assertEqual(revoked["revoke_secret"], secrets[2])
+        self.assertIsNone(self.payer.revoke(secrets[2]))
+        self.assertEqual(self.payer.active_quantities, [1, 2, 4, 5])
+
+        # batch with unknown and duplicate secrets
+        revoked = self.payer.revoke_all([secrets[4], "00" * 32, secrets[0],
+                                         secrets[4]])
+        self.assertEqual([c and c["revoke_secret"] for c in revoked],
+                         [secrets[4], None, secrets[0], None])
+        self.assertEqual(self.payer.active_quantities, [2, 4])
+        self.assertEqual(len(self.payer.active_revoke_hashes), 2)
+        self.assertEqual(len(self.payer.commits_revoked), 3)
+        self.assertEqual(self.payer.get_transferred_amount(), 4)
+
+    def test_revoke_until(self):
+        self.payer.load(PAYER_BEFORE)
+        self.payee.load(PAYEE_BEFORE_REQUEST)
+        for quantity in [1, 3, 4, 5]:
+            amount, revoke_hash = self.payee.request_commit(quantity)
+            commit = self.payer.create_commit(amount, revoke_hash, DELAY_TIME)
+            self.payee.set_commit(commit["rawtx"], commit["script"])
+        expected = [c["revoke_secret"] for c in self.payee.commits_active]
+        self.payee.control.get_quantity = None  # no remote calls allowed
+        self.assertEqual(self.payee.revoke_until(5), [])
+        self.assertEqual(self.payee.revoke_until(3), expected[:1:-1])
+        self.assertEqual(self.payee.active_quantities, [1, 3])
+        self.assertEqual(self.payee.revoke_until(0), expected[1::-1])
+        self.assertEqual(self.payee.commits_active, [])
+
+    def test_commits_ordered_by_quantity(self):
+        state = dict(PAYEE_BEFORE_CLOSE)
+        state["commits_active"] = (
+            PAYEE_BEFORE_CLOSE["commits_active"] +  # quantity 5
+            PAYEE_AFTER_SET_COMMIT["commits_active"]  # quantity 1
+        )
+        self.payee.load(state)
+        self.assertEqual(self.payee.active_quantities, [1, 5])
+        self.assertEqual(self.payee.get_transferred_amount(), 5)
+        self.assertEqual(self.payee.save()["commits_active"], [
+            PAYEE_AFTER_SET_COMMIT["commits_active"][0],
+            PAYEE_BEFORE_CLOSE["commits_active"][0],
+        ])
+
     def test_publish(self):
         self.payee.load(PAYEE_BEFORE_CLOSE)
         txid = self.payee.close_channel()
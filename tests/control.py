@@ -0,0 +1,252 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import picopayments
+from pycoin.tx import Tx
+
+
+ASSET = "A14456548018133352000"
+DEPOSIT_SCRIPT = (
+    "63522102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d5"
+    "2103c7b09d53bdb0ef9cfea06c1e6f2192e6a91cdeac209402bc36c1c368021a861152ae"
+    "6763a9144cc776751eb4d41f23feaf94697cb7ec2fe597a4882102a73443bc32f5fec6a5"
+    "51f71af75311b0876686156d16d367562d3d29987792d5ac6703ffff00b2752102a73443"
+    "bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d5ac6868"
+)
+DEPOSIT_RAWTX = (
+    "0100000001d85205661d29fec2e5ede0dbb8eaa0e55655c7b14b1aeac9b0e72dae01596f"
+    "63000000006b483045022100e631d8b259bd09ba8956a96e6e471e9938ddad1fa831bb12"
+    "ffa690f2d0d2640002202cf3bcc376225e1861443608cad549d63a76b636225630946942"
+    "205dfd8f4672012102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d"
+    "29987792d5ffffffff03d2b400000000000017a9145c6f176aa8bab82688c8b07562595a"
+    "622d7b889a8700000000000000001e6a1c6c4d9b5afac6415f4eff0ec371c5d8155b5821"
+    "76fa9e12aed0cc84645e310200000000001976a914a5efd9bcdc152be40dc2390607a806"
+    "b32cf2902c88ac00000000"
+)
+COMMIT_SCRIPT = (
+    "6355b275a9144cc776751eb4d41f23feaf94697cb7ec2fe597a4882103c7b09d53bdb0ef"
+    "9cfea06c1e6f2192e6a91cdeac209402bc36c1c368021a8611ac67a914bcc82b07e3c131"
+    "7a52d7adbff1ef869d4e46ac35882102a73443bc32f5fec6a551f71af75311b0876686156"
+    "d16d367562d3d29987792d5ac68"
+)
+UNSIGNED_COMMIT_RAWTX = (
+    "01000000017231934b8873769b325c090a99dd7e5a3d8708bf13e94f677228b90787631f"
+    "070000000017a9145c6f176aa8bab82688c8b07562595a622d7b889a87ffffffff03463c"
+    "00000000000017a914b57a70f9301cfd13603fc36b3162b57340b3958b87000000000000"
+    "00001e6a1c5144cf3299cdb4115af7e5b1a21ecac52fedaf164910f4fe4beb0a877c5100"
+    "000000000017a9145c6f176aa8bab82688c8b07562595a622d7b889a8700000000"
+)
+
+
+class OfflineControl(picopayments.control.Control):
+
+    def __init__(self, utxos, *args, **kwargs):
+        super(OfflineControl, self).__init__(*args, **kwargs)
+        self.utxos = utxos
+
+    def get_utxos(self, address):
+        return self.utxos
+
+
+class TestCreateTx(unittest.TestCase):
+
+    def setUp(self):
+        deposit_tx = Tx.from_hex(DEPOSIT_RAWTX)
+        self.deposit_utxo = {
+            "txid": deposit_tx.id(), "index": 0, "value": 46290,
+            "script": picopayments.util.b2h(deposit_tx.txs_out[0].script)
+        }
+        self.deposit_address = picopayments.util.script2address(
+            picopayments.util.h2b(DEPOSIT_SCRIPT), "XTN"
+        )
+        self.commit_address = picopayments.util.script2address(
+            picopayments.util.h2b(COMMIT_SCRIPT), "XTN"
+        )
+
+    def test_matches_create_send(self):
+        control = OfflineControl([self.deposit_utxo], ASSET, testnet=True)
+        rawtx = control.create_tx(self.deposit_address, self.commit_address,
+                                  1, extra_btc=15430)
+        self.assertEqual(rawtx, UNSIGNED_COMMIT_RAWTX)
+        self.assertEqual(control.get_quantity(rawtx), 1)
+
+    def test_spend_all_without_change(self):
+        control = OfflineControl([self.deposit_utxo], ASSET, testnet=True)
+        rawtx = control.create_tx(self.deposit_address, self.commit_address,
+                                  1337, extra_btc=46290 - control.fee)
+        tx = Tx.from_hex(rawtx)
+        self.assertEqual(len(tx.txs_out), 2)
+        self.assertEqual(tx.txs_out[0].coin_value, 46290 - control.fee)
+        self.assertEqual(control.get_quantity(rawtx), 1337)
+
+    def test_insufficient_funds(self):
+        control = OfflineControl([self.deposit_utxo], ASSET, testnet=True)
+
+        def callback():
+            control.create_tx(self.deposit_address, self.commit_address,
+                              1, extra_btc=46290)
+        self.assertRaises(picopayments.exceptions.InsufficientFunds, callback)
+
+    def test_address2script(self):
+        outputs = Tx.from_hex(DEPOSIT_RAWTX).txs_out
+        script = picopayments.util.address2script(self.deposit_address,
+                                                  "XTN")
+        self.assertEqual(script, outputs[0].script)  # pay to script
+        address = "mveM7p994367Kn8hCzeMAoV2Y5Q2xtkpMd"  # deposit payer
+        script = picopayments.util.address2script(address, "XTN")
+        self.assertEqual(script, outputs[2].script)  # pay to pubkey hash
+        self.assertRaises(ValueError, picopayments.util.address2script,
+                          address, "BTC")
+
+
+class TestTxCache(unittest.TestCase):
+
+    def test_unspents_from_known_tx(self):
+        control = picopayments.control.Control(ASSET, testnet=True)
+        control.add_tx(DEPOSIT_RAWTX)
+        tx = Tx.from_hex(UNSIGNED_COMMIT_RAWTX)
+        control._add_unspents(tx)  # no remote lookup needed
+        self.assertEqual(tx.unspents[0].coin_value, 46290)
+
+    def test_persistent(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, "cache.db")
+            control = picopayments.control.Control(ASSET, cache_path=path)
+            txid = control.add_tx(DEPOSIT_RAWTX).id()
+            control = picopayments.control.Control(ASSET, cache_path=path)
+            tx = control.get_tx(picopayments.util.h2b_rev(txid))
+            self.assertEqual(tx.as_hex(), DEPOSIT_RAWTX)
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_persist_only_new(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, "cache.db")
+            control = picopayments.control.Control(ASSET, cache_path=path)
+            control.add_tx(DEPOSIT_RAWTX, persist=False)
+            self.assertEqual(len(control.rpc_cache), 0)
+            control = picopayments.control.Control(ASSET, cache_path=path)
+            txid = control.add_tx(DEPOSIT_RAWTX).id()
+            inserts = control.rpc_cache._inserts
+            control.add_tx(DEPOSIT_RAWTX)  # already known
+            self.assertEqual(control.rpc_cache._inserts, inserts)
+            control = picopayments.control.Control(ASSET, cache_path=path)
+            control.get_tx(picopayments.util.h2b_rev(txid))
+            self.assertEqual(control.rpc_cache._inserts, 0)  # cache hit
+        finally:
+            shutil.rmtree(tempdir)
+
+
+class TestSession(unittest.TestCase):
+
+    def test_shared_between_controls(self):
+        api_url = "http://127.0.0.1:14000/api/"
+        a = picopayments.control.Control(ASSET, api_url=api_url)
+        b = picopayments.control.Control(ASSET, api_url=api_url)
+        self.assertIs(a.session, b.session)
+
+    def test_pool_size(self):
+        api_url = "http://127.0.0.1:14000/api/"
+        a = picopayments.control.Control(ASSET, api_url=api_url)
+        b = picopayments.control.Control(ASSET, api_url=api_url, pool_size=1)
+        self.assertIsNot(a.session, b.session)
+
+
+class BatchControl(picopayments.control.Control):
+
+    def __init__(self, *args, **kwargs):
+        super(BatchControl, self).__init__(*args, **kwargs)
+        self.sent = []
+
+    def _rpc_call(self, payload, timeout=None):
+        self.sent.append(payload)
+        return dict((entry["id"], entry["method"]) for entry in payload)
+
+
+class TestRpcBatch(unittest.TestCase):
+
+    def test_single_round_trip(self):
+        control = BatchControl(ASSET, testnet=True)
+        batch = control.batch()
+        a = batch.add("get_tx_info", {"tx_hex": DEPOSIT_RAWTX})
+        b = batch.add("unpack", {"data_hex": "00"})
+        results = batch.send()
+        self.assertEqual(len(control.sent), 1)
+        self.assertEqual(len(control.sent[0]), 2)
+        self.assertEqual(results[a], "get_tx_info")
+        self.assertEqual(results[b], "unpack")
+
+    def test_empty(self):
+        control = BatchControl(ASSET, testnet=True)
+        self.assertEqual(control.batch().send(), {})
+        self.assertEqual(control.sent, [])
+
+
+class FakeResponse(object):
+
+    def __init__(self, data):
+        self.text = json.dumps(data)
+
+
+class FakeSession(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.posted = []
+
+    def post(self, url, data=None, headers=None, auth=None, timeout=None):
+        self.posted.append(json.loads(data))
+        return FakeResponse(self.data)
+
+
+class TestRpcBatchResponse(unittest.TestCase):
+
+    def _send(self, response):
+        control = picopayments.control.Control(ASSET, testnet=True)
+        control.session = FakeSession(response)
+        batch = control.batch()
+        batch.add("get_tx_info", {"tx_hex": DEPOSIT_RAWTX})
+        batch.add("unpack", {"data_hex": "00"})
+        return batch.send()
+
+    def _assert_fails(self, response):
+        with self.assertRaises(Exception) as context:
+            self._send(response)
+        self.assertIn("Counterparty rpc", str(context.exception))
+
+    def test_out_of_order(self):
+        results = self._send([
+            {"jsonrpc": "2.0", "id": 1, "result": "b"},
+            {"jsonrpc": "2.0", "id": 0, "result": "a"},
+        ])
+        self.assertEqual(results, {0: "a", 1: "b"})
+
+    def test_entry_error(self):
+        self._assert_fails([
+            {"jsonrpc": "2.0", "id": 0, "result": "a"},
+            {"jsonrpc": "2.0", "id": 1, "error": {"code": -32601}},
+        ])
+
+    def test_missing_id(self):
+        self._assert_fails([
+            {"jsonrpc": "2.0", "id": 0, "result": "a"},
+        ])
+
+    def test_unexpected_id(self):
+        self._assert_fails([
+            {"jsonrpc": "2.0", "id": 0, "result": "a"},
+            {"jsonrpc": "2.0", "id": 7, "result": "b"},
+        ])
+
+    def test_error_body(self):
+        self._assert_fails({
+            "jsonrpc": "2.0", "id": None, "error": {"code": -32700}
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
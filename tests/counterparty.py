@@ -0,0 +1,72 @@
+import pycoin
+import unittest
+import picopayments
+
+
+ASSET = "A14456548018133352000"
+DEPOSIT_RAWTX = (
+    "0100000001d85205661d29fec2e5ede0dbb8eaa0e55655c7b14b1aeac9b0e72dae01596f"
+    "63000000006b483045022100e631d8b259bd09ba8956a96e6e471e9938ddad1fa831bb12"
+    "ffa690f2d0d2640002202cf3bcc376225e1861443608cad549d63a76b636225630946942"
+    "205dfd8f4672012102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d"
+    "29987792d5ffffffff03d2b400000000000017a9145c6f176aa8bab82688c8b07562595a"
+    "622d7b889a8700000000000000001e6a1c6c4d9b5afac6415f4eff0ec371c5d8155b5821"
+    "76fa9e12aed0cc84645e310200000000001976a914a5efd9bcdc152be40dc2390607a806"
+    "b32cf2902c88ac00000000"
+)
+
+
+class TestCounterparty(unittest.TestCase):
+
+    def test_decode_send(self):
+        asset, quantity = picopayments.counterparty.decode_send(DEPOSIT_RAWTX)
+        self.assertEqual(asset, ASSET)
+        self.assertEqual(quantity, 1337)
+
+    def test_pack_unpack_send(self):
+        data = picopayments.counterparty.pack_send(ASSET, 42)
+        asset, quantity = picopayments.counterparty.unpack_send(data)
+        self.assertEqual(asset, ASSET)
+        self.assertEqual(quantity, 42)
+
+    def test_asset_id(self):
+        for asset in ["BTC", "XCP", "STORJCOIN", ASSET]:
+            asset_id = picopayments.counterparty.get_asset_id(asset)
+            name = picopayments.counterparty.get_asset_name(asset_id)
+            self.assertEqual(name, asset)
+
+    def test_arc4_roundtrip(self):
+        key = b"secret"
+        data = picopayments.counterparty.arc4(key, b"plaintext")
+        self.assertEqual(picopayments.counterparty.arc4(key, data),
+                         b"plaintext")
+
+    def test_unpack_invalid_prefix(self):
+
+        def callback():
+            picopayments.counterparty.unpack_send(b"NOTCNTRP" + b"\x00" * 20)
+        self.assertRaises(ValueError, callback)
+
+    def test_bare_op_return(self):
+        tx = pycoin.tx.Tx.from_hex(DEPOSIT_RAWTX)
+        tx.txs_out[1].script = b"\x6a"  # OP_RETURN without push
+        self.assertRaises(ValueError, picopayments.counterparty.decode_send,
+                          tx.as_hex())
+        tx.txs_out[1].script = b"\x6a\x51"  # OP_RETURN OP_1
+        self.assertRaises(ValueError, picopayments.counterparty.decode_send,
+                          tx.as_hex())
+
+    def test_control_get_quantity(self):
+        control = picopayments.control.Control(ASSET, testnet=True)
+        self.assertEqual(control.get_quantity(DEPOSIT_RAWTX), 1337)
+
+    def test_control_get_quantity_wrong_asset(self):
+        control = picopayments.control.Control("XCP", testnet=True)
+
+        def callback():
+            control.get_quantity(DEPOSIT_RAWTX)
+        self.assertRaises(ValueError, callback)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from pycoin import ecdsa
+from pycoin.tx import Tx
+from picopayments import crypto
+from picopayments import signing
+from picopayments.control import Control
+from picopayments.util import h2b
+from .control import ASSET
+from .control import DEPOSIT_SCRIPT
+from .scripts import DEPOSIT_PAYER_WIF
+from .signing import unsigned_commit
+
+
+SECRET_EXPONENT = 0x1337
+SIGN_VALUE = 0xdeadbeef
+
+
+def available_backends():
+    backends = []
+    for backend_class in crypto.BACKENDS:
+        try:
+            backends.append(backend_class())
+        except OSError:
+            pass
+    return backends
+
+
+class SpyBackend(object):
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+        self.verified = 0
+
+    def sign(self, secret_exponent, sign_value):
+        return self.backend.sign(secret_exponent, sign_value)
+
+    def verify(self, public_pair, sign_value, sig_pair):
+        self.verified += 1
+        return self.backend.verify(public_pair, sign_value, sig_pair)
+
+
+class TestBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.backends = available_backends()
+        self.public_pair = ecdsa.public_pair_for_secret_exponent(
+            ecdsa.generator_secp256k1, SECRET_EXPONENT
+        )
+
+    def test_python_always_available(self):
+        self.assertEqual(self.backends[-1].name, "python")
+        self.assertIn(crypto.load_backend().name,
+                      [backend.name for backend in self.backends])
+
+    def test_sign_deterministic_low_s(self):
+        r, s = ecdsa.sign(ecdsa.generator_secp256k1, SECRET_EXPONENT,
+                          SIGN_VALUE)
+        expected = (r, min(s, crypto.ORDER - s))
+        for backend in self.backends:
+            self.assertEqual(backend.sign(SECRET_EXPONENT, SIGN_VALUE),
+                             expected)
+
+    def test_verify(self):
+        r, s = crypto.PythonBackend().sign(SECRET_EXPONENT, SIGN_VALUE)
+        for backend in self.backends:
+            self.assertTrue(backend.verify(self.public_pair, SIGN_VALUE,
+                                           (r, s)))
+            self.assertTrue(backend.verify(self.public_pair, SIGN_VALUE,
+                                           (r, crypto.ORDER - s)))
+            self.assertFalse(backend.verify(self.public_pair, SIGN_VALUE + 1,
+                                            (r, s)))
+            self.assertFalse(backend.verify(self.public_pair, SIGN_VALUE,
+                                            (0, s)))
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, crypto.load_backend, "unknown")
+
+    def test_signature_checks_use_backend(self):
+        tx = unsigned_commit()
+        rawtx = signing.sign(
+            "recover_deposit", tx, wif=DEPOSIT_PAYER_WIF,
+            script=h2b(DEPOSIT_SCRIPT), spend_type="timeout",
+            spend_secret=None
+        )
+        signed = Tx.from_hex(rawtx)
+        signed.unspents = tx.unspents
+        previous = crypto.get_backend()
+        try:
+            for backend in self.backends:
+                spy = SpyBackend(backend)
+                crypto.set_backend(spy)
+                self.assertEqual(signed.bad_signature_count(), 0)
+                self.assertEqual(spy.verified, 1)
+        finally:
+            crypto.set_backend(previous)
+
+
+class TestVerifiedCache(unittest.TestCase):
+
+    def test_signature_verified_once(self):
+        public_pair = ecdsa.public_pair_for_secret_exponent(
+            ecdsa.generator_secp256k1, SECRET_EXPONENT
+        )
+        previous = crypto.get_backend()
+        spy = SpyBackend(previous)
+        crypto.set_backend(spy)
+        try:
+            sig_pair = spy.sign(SECRET_EXPONENT, SIGN_VALUE + 1)
+            for i in range(3):
+                self.assertTrue(crypto.verify(public_pair, SIGN_VALUE + 1,
+                                              sig_pair))
+                self.assertFalse(crypto.verify(public_pair, SIGN_VALUE + 2,
+                                               sig_pair))
+            self.assertEqual(spy.verified, 2)
+        finally:
+            crypto.set_backend(previous)
+
+    def test_can_publish_cached_by_txid(self):
+        control = Control(ASSET, testnet=True, dryrun=True)
+        rawtx = signing.sign("create_commit", unsigned_commit(),
+                             payer_wif=DEPOSIT_PAYER_WIF,
+                             deposit_script=h2b(DEPOSIT_SCRIPT))
+        publishable = control.can_publish(rawtx)
+        txid = Tx.from_hex(rawtx).id()
+        self.assertEqual(control.verified_cache.get(txid), publishable)
+        control.verified_cache.set(txid, not publishable)  # not reverified
+        self.assertEqual(control.can_publish(rawtx), not publishable)
+
+
+if __name__ == "__main__":
+    unittest.main()
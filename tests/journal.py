@@ -0,0 +1,216 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import picopayments
+from picopayments.journal import Journal
+from .commit import ASSET
+from .commit import API_URL
+from .commit import DELAY_TIME
+from .commit import PAYER_BEFORE
+from .commit import PAYEE_BEFORE_REQUEST
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.journals = []
+
+    def tearDown(self):
+        for journal in self.journals:
+            journal.close()
+        shutil.rmtree(self.tempdir)
+
+    def _journal(self, name, **kwargs):
+        journal = Journal(os.path.join(self.tempdir, name), **kwargs)
+        self.journals.append(journal)
+        return journal
+
+    def _channel(self, cls, journal=None):
+        channel = cls(ASSET, api_url=API_URL, testnet=True, dryrun=True)
+        if journal is not None:
+            channel.open_journal(journal)
+        return channel
+
+    def _transfer(self, payer, payee, quantities):
+        for quantity in quantities:
+            amount, revoke_hash = payee.request_commit(quantity)
+            commit = payer.create_commit(amount, revoke_hash, DELAY_TIME)
+            payee.set_commit(commit["rawtx"], commit["script"])
+
+    def test_replay(self):
+        payer = self._channel(picopayments.channel.Payer,
+                              self._journal("payer"))
+        payee = self._channel(picopayments.channel.Payee,
+                              self._journal("payee"))
+        payer.load(PAYER_BEFORE)
+        payee.load(PAYEE_BEFORE_REQUEST)
+        self._transfer(payer, payee, range(1, 6))
+        payee.request_commit(6)  # unanswered
+        payer.revoke_all(payee.revoke_until(3))
+
+        restored_payer = self._channel(picopayments.channel.Payer,
+                                       self._journal("payer"))
+        restored_payee = self._channel(picopayments.channel.Payee,
+                                       self._journal("payee"))
+        self.assertEqual(restored_payer.save(), payer.save())
+        self.assertEqual(restored_payee.save(), payee.save())
+        self.assertEqual(restored_payee.commits_requested,
+                         payee.commits_requested)  # request times kept
+        self.assertEqual(restored_payee.active_quantities, [1, 2, 3])
+        self.assertEqual(restored_payee.get_transferred_amount(), 3)
+
+    def test_compaction(self):
+        payer = self._channel(picopayments.channel.Payer,
+                              self._journal("payer", compact_records=2))
+        payee = self._channel(picopayments.channel.Payee,
+                              self._journal("payee", compact_records=2))
+        payer.load(PAYER_BEFORE)
+        payee.load(PAYEE_BEFORE_REQUEST)
+        self._transfer(payer, payee, range(1, 6))
+        self.assertLess(payee.journal.records, 2)
+        restored = self._channel(picopayments.channel.Payee,
+                                 self._journal("payee"))
+        self.assertEqual(restored.save(), payee.save())
+
+    def test_compaction_on_revoke(self):
+        payer = self._channel(picopayments.channel.Payer,
+                              self._journal("payer", compact_records=6))
+        payee = self._channel(picopayments.channel.Payee,
+                              self._journal("payee", compact_records=11))
+        payer.load(PAYER_BEFORE)
+        payee.load(PAYEE_BEFORE_REQUEST)
+        self._transfer(payer, payee, range(1, 6))  # 5 and 10 records
+        payer.revoke_all(payee.revoke_until(2))  # compacts both
+        self.assertEqual(payee.journal.records, 0)
+        self.assertEqual(payer.journal.records, 0)
+        restored_payer = self._channel(picopayments.channel.Payer,
+                                       self._journal("payer"))
+        restored_payee = self._channel(picopayments.channel.Payee,
+                                       self._journal("payee"))
+        self.assertEqual(restored_payer.save(), payer.save())
+        self.assertEqual(restored_payee.save(), payee.save())
+        self.assertEqual(restored_payee.active_quantities, [1, 2])
+
+    def test_compaction_on_clear(self):
+        journal = self._journal("payee", compact_records=3)
+        payee = self._channel(picopayments.channel.Payee, journal)
+        payee.load(PAYEE_BEFORE_REQUEST)
+        payee.request_commit(1)
+        payee.request_commit(2)
+        payee.setup(PAYEE_BEFORE_REQUEST["payee_wif"])  # compacts on clear
+        self.assertEqual(journal.records, 1)
+        restored = self._channel(picopayments.channel.Payee,
+                                 self._journal("payee"))
+        self.assertEqual(restored.save(), payee.save())
+        self.assertIsNone(restored.deposit_rawtx)
+
+    def test_spend_secret_recorded(self):
+        payer = self._channel(picopayments.channel.Payer,
+                              self._journal("payer"))
+        payer.load(PAYER_BEFORE)
+        payer.set_spend_secret("00" * 32)
+        restored = self._channel(picopayments.channel.Payer,
+                                 self._journal("payer"))
+        self.assertEqual(restored.spend_secret, "00" * 32)
+
+    def test_timed_sync(self):
+        journal = self._journal("log", sync_interval=0.05)
+        synced = []
+        sync = journal.sync
+        journal.sync = lambda: synced.append(1) or sync()
+        journal.append("request", "00")  # synced right away
+        journal.append("request", "01")  # synced by the timer
+        self.assertEqual(len(synced), 1)
+        time.sleep(0.3)
+        self.assertEqual(len(synced), 2)
+
+    def test_torn_record_ignored(self):
+        journal = self._journal("payee")
+        payee = self._channel(picopayments.channel.Payee, journal)
+        payee.load(PAYEE_BEFORE_REQUEST)
+        state = payee.save()
+        journal.close()
+        with open(journal.path, "a") as f:
+            f.write('["request","ab')  # crash during write
+        restored = self._channel(picopayments.channel.Payee,
+                                 self._journal("payee"))
+        self.assertEqual(restored.save(), state)
+
+    def test_stale_records_ignored(self):
+        journal = self._journal("payee")
+        payee = self._channel(picopayments.channel.Payee, journal)
+        payee.load(PAYEE_BEFORE_REQUEST)
+        payee.request_commit(1)
+        journal.close()
+        with open(journal.path) as f:
+            records = f.read()
+        payee._compact_journal()  # crash before the log was truncated
+        journal.close()
+        with open(journal.path, "w") as f:
+            f.write(records)
+        restored = self._channel(picopayments.channel.Payee,
+                                 self._journal("payee"))
+        self.assertEqual(restored.save(), payee.save())
+
+    def test_uncompacted_log(self):
+        journal = self._journal("log")
+        journal.append("request", "00")
+        journal.append("request", "01")
+        journal.close()
+        self.assertEqual(journal.read(),
+                         (None, [["request", "00"], ["request", "01"]]))
+
+    def test_deposit_recorded_before_publish(self):
+        payer = self._channel(picopayments.channel.Payer,
+                              self._journal("payer"))
+        payer.load(PAYER_BEFORE)
+        rawtx = PAYER_BEFORE["deposit_rawtx"]
+        script = picopayments.util.h2b(PAYER_BEFORE["deposit_script_hex"])
+        payer.control.create_deposit = lambda *args: (rawtx, script)
+
+        def publish(rawtx, scripts=None):
+            raise Exception("Crash during publish!")
+        payer.control.publish = publish
+        with self.assertRaises(Exception):
+            payer.deposit(PAYER_BEFORE["payer_wif"], None, None, None, 1)
+        restored = self._channel(picopayments.channel.Payer,
+                                 self._journal("payer"))
+        self.assertEqual(restored.deposit_rawtx, rawtx)
+        self.assertEqual(restored.deposit_script_hex,
+                         PAYER_BEFORE["deposit_script_hex"])
+
+    def test_recover_recorded_before_publish(self):
+        journal = self._journal("payer")
+        payer = self._channel(picopayments.channel.Payer, journal)
+        payer.load(PAYER_BEFORE)
+        payer.control.create_timeout_recover = lambda *args: "00"
+        published = []
+
+        def publish(rawtx, scripts=None):
+            published.append(journal.read()[1][-1])
+        payer.control.publish = publish
+        payer.timeout_recover()
+        self.assertEqual(published, [["set", {"timeout_rawtx": "00"}]])
+
+    def test_failed_recover_publish_rolled_back(self):
+        payer = self._channel(picopayments.channel.Payer,
+                              self._journal("payer"))
+        payer.load(PAYER_BEFORE)
+        payer.control.create_change_recover = lambda *args: "00"
+
+        def publish(rawtx, scripts=None):
+            raise Exception("Publish failed!")
+        payer.control.publish = publish
+        with self.assertRaises(Exception):
+            payer.change_recover()
+        self.assertIsNone(payer.change_rawtx)
+        restored = self._channel(picopayments.channel.Payer,
+                                 self._journal("payer"))
+        self.assertIsNone(restored.change_rawtx)
+
+
+if __name__ == "__main__":
+    unittest.main()
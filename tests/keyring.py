@@ -0,0 +1,46 @@
+import unittest
+import picopayments
+from picopayments.keyring import KeyRing
+from picopayments.keyring import get_default_keyring
+from .scripts import PAYER_WIF
+from .scripts import SPEND_SECRET
+
+
+class TestKeyRing(unittest.TestCase):
+
+    def setUp(self):
+        self.keyring = KeyRing(max_entries=2)
+
+    def test_matches_util(self):
+        util = picopayments.util
+        self.assertEqual(self.keyring.wif2sec(PAYER_WIF),
+                         util.wif2sec(PAYER_WIF))
+        self.assertEqual(self.keyring.wif2pubkey(PAYER_WIF),
+                         util.wif2pubkey(PAYER_WIF))
+        self.assertEqual(self.keyring.wif2address(PAYER_WIF),
+                         util.wif2address(PAYER_WIF))
+        self.assertEqual(self.keyring.wif2secretexponent(PAYER_WIF),
+                         util.wif2secretexponent(PAYER_WIF))
+        self.assertEqual(self.keyring.hash160hex(SPEND_SECRET),
+                         util.hash160hex(SPEND_SECRET))
+
+    def test_derived_once(self):
+        keys = self.keyring._get(PAYER_WIF)
+        self.assertIs(self.keyring._get(PAYER_WIF), keys)
+        lookup = self.keyring.hash160_lookup(PAYER_WIF)
+        self.assertIs(self.keyring.hash160_lookup(PAYER_WIF), lookup)
+
+    def test_bounded(self):
+        for i in range(5):
+            self.keyring.hash160hex("{0:02x}".format(i))
+        self.assertEqual(len(self.keyring._hashes), 2)
+
+    def test_shared_by_channels(self):
+        payee = picopayments.channel.Payee("A14456548018133352000",
+                                           testnet=True, dryrun=True)
+        self.assertIs(payee.keyring, get_default_keyring())
+        self.assertIs(payee.control.keyring, get_default_keyring())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import picopayments
+
+
+ASSET = "A14456548018133352000"
+DEPOSIT_ADDRESS = "2N1fyEhjTHqdN1PNfDVpkn1CNh3gWPC7Dq2"
+COMMIT_ADDRESS = "2MzzHSQrDiZEDJQha8CotyuPrdt49ZrALqm"
+DEPOSIT_SCRIPT = picopayments.util.h2b(
+    "63522102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d5"
+    "2103c7b09d53bdb0ef9cfea06c1e6f2192e6a91cdeac209402bc36c1c368021a861152ae"
+    "6763a9144cc776751eb4d41f23feaf94697cb7ec2fe597a4882102a73443bc32f5fec6a5"
+    "51f71af75311b0876686156d16d367562d3d29987792d5ac6703ffff00b2752102a73443"
+    "bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792d5ac6868"
+)
+COMMIT_SCRIPT = picopayments.util.h2b(
+    "6355b275a9144cc776751eb4d41f23feaf94697cb7ec2fe597a4882103c7b09d53bdb0ef"
+    "9cfea06c1e6f2192e6a91cdeac209402bc36c1c368021a8611ac67a914f9e38472e9430f"
+    "864151f3013350497bf86fe4b0882102a73443bc32f5fec6a551f71af75311b0876686"
+    "156d16d367562d3d29987792d5ac68"
+)
+DEPOSIT_RAWTX = (
+    "0100000001d85205661d29fec2e5ede0dbb8eaa0e55655c7b14b1aeac9b0e72dae01596f"
+    "63000000006b483045022100e631d8b259bd09ba8956a96e6e471e9938ddad1fa831bb12"
+    "ffa690f2d0d2640002202cf3bcc376225e1861443608cad549d63a76b636225630946942"
+    "205dfd8f4672012102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d"
+    "29987792d5ffffffff03d2b400000000000017a9145c6f176aa8bab82688c8b07562595a"
+    "622d7b889a8700000000000000001e6a1c6c4d9b5afac6415f4eff0ec371c5d8155b5821"
+    "76fa9e12aed0cc84645e310200000000001976a914a5efd9bcdc152be40dc2390607a806"
+    "b32cf2902c88ac00000000"
+)
+COMMIT_RAWTX = (
+    "01000000017231934b8873769b325c090a99dd7e5a3d8708bf13e94f677228b90787631f"
+    "0700000000fd460100483045022100fe849b43cc4bede5c1af9515f9e79ded1776d31633"
+    "31727cd592d89a78e308da0220026fb2e681d8c7e721159f35d4e6708981e751d9c573cd"
+    "7221077837d613a66601483045022100eea344bec9052b271040c69ad6d8a9fce2a860f2"
+    "6e8ff75ddaa361fb399df4c202200df793c7b938301f283802f8d42425709a4d45d1afdf"
+    "43fa1135e9a2a94505be01514cb063522102a73443bc32f5fec6a551f71af75311b08766"
+    "86156d16d367562d3d29987792d52103c7b09d53bdb0ef9cfea06c1e6f2192e6a91cdeac"
+    "209402bc36c1c368021a861152ae6763a9144cc776751eb4d41f23feaf94697cb7ec2fe5"
+    "97a4882102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29987792"
+    "d5ac6703ffff00b2752102a73443bc32f5fec6a551f71af75311b0876686156d16d36756"
+    "2d3d29987792d5ac6868ffffffff03463c00000000000017a91454eda5ac68f27ba781f5"
+    "59307be015d12fdec8018700000000000000001e6a1c5144cf3299cdb4115af7e5b1a21e"
+    "cac52fedaf164910f4fe4beb0a837c5100000000000017a9145c6f176aa8bab82688c8b0"
+    "7562595a622d7b889a8700000000"
+)
+
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = picopayments.ledger.Ledger(ASSET, netcode="XTN")
+
+    def test_untracked(self):
+        self.assertFalse(self.ledger.is_tracked(DEPOSIT_ADDRESS))
+
+    def test_observe_deposit(self):
+        self.ledger.observe(DEPOSIT_RAWTX, scripts=[DEPOSIT_SCRIPT])
+        self.assertTrue(self.ledger.is_tracked(DEPOSIT_ADDRESS))
+        balance = self.ledger.get_balance(DEPOSIT_ADDRESS)
+        self.assertEqual(balance, (1337, 46290))
+
+    def test_observe_commit(self):
+        self.ledger.observe(DEPOSIT_RAWTX, scripts=[DEPOSIT_SCRIPT])
+        self.ledger.observe(COMMIT_RAWTX, scripts=[COMMIT_SCRIPT])
+        self.ledger.observe(COMMIT_RAWTX)  # observing twice changes nothing
+        deposit_balance = self.ledger.get_balance(DEPOSIT_ADDRESS)
+        self.assertEqual(deposit_balance, (1332, 20860))
+        commit_balance = self.ledger.get_balance(COMMIT_ADDRESS)
+        self.assertEqual(commit_balance, (5, 15430))
+        utxos = self.ledger.get_utxos(DEPOSIT_ADDRESS)
+        self.assertEqual(len(utxos), 1)
+        self.assertEqual(utxos[0]["index"], 2)
+
+    def test_unknown_address_not_tracked(self):
+        self.ledger.observe(DEPOSIT_RAWTX)  # prior balance unknown
+        self.assertFalse(self.ledger.is_tracked(DEPOSIT_ADDRESS))
+
+    def test_commit_to_unknown_address(self):
+        self.ledger.observe(DEPOSIT_RAWTX, scripts=[DEPOSIT_SCRIPT])
+        self.ledger.observe(COMMIT_RAWTX)
+        self.assertFalse(self.ledger.is_tracked(COMMIT_ADDRESS))
+        deposit_balance = self.ledger.get_balance(DEPOSIT_ADDRESS)
+        self.assertEqual(deposit_balance, (1332, 20860))
+
+    def test_insufficient_balance_forgotten(self):
+        self.ledger.observe(DEPOSIT_RAWTX, scripts=[DEPOSIT_SCRIPT])
+        self.ledger.asset_balances[DEPOSIT_ADDRESS] = 4  # less than sent
+        self.ledger.observe(COMMIT_RAWTX, scripts=[COMMIT_SCRIPT])
+        self.assertFalse(self.ledger.is_tracked(DEPOSIT_ADDRESS))
+        self.assertFalse(self.ledger.is_tracked(COMMIT_ADDRESS))
+
+    def test_forget(self):
+        self.ledger.observe(DEPOSIT_RAWTX, scripts=[DEPOSIT_SCRIPT])
+        self.ledger.forget(DEPOSIT_ADDRESS)
+        self.assertFalse(self.ledger.is_tracked(DEPOSIT_ADDRESS))
+
+    def test_control_balance_from_ledger(self):
+        control = picopayments.control.Control(ASSET, testnet=True)
+        control.observe(DEPOSIT_RAWTX, scripts=[DEPOSIT_SCRIPT])
+        balance = control.get_balance(DEPOSIT_ADDRESS)  # no remote query
+        self.assertEqual(balance, (1337, 46290))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import time
+import threading
+import unittest
+import picopayments
+from picopayments.scheduler import Scheduler
+from picopayments.scheduler import BLOCK_TIME
+from picopayments.watcher import ChainWatcher
+from .watcher import FakeBtcTxStore
+from .watcher import RAWTX
+from .control import COMMIT_SCRIPT
+from .control import UNSIGNED_COMMIT_RAWTX
+
+
+ASSET = "A14456548018133352000"
+
+
+class CountingChannel(object):
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+        self.mutex = threading.Lock()
+        self.concurrent = False
+        self.updating = False
+
+    def update(self):
+        with self.mutex:
+            if self.updating:
+                self.concurrent = True
+            self.updating = True
+            self.calls += 1
+        time.sleep(0.005)
+        with self.mutex:
+            self.updating = False
+        if self.fail:
+            raise Exception("update failed")
+
+
+class DeadlineChannel(CountingChannel):
+
+    def __init__(self, blocks):
+        super(DeadlineChannel, self).__init__()
+        self.blocks = blocks
+
+    def get_blocks_until_deadline(self):
+        return self.blocks
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler(workers=2)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_updates_many_channels(self):
+        channels = [CountingChannel() for i in range(50)]
+        for channel in channels:
+            self.scheduler.register(channel, 0.01)
+        time.sleep(0.5)
+        for channel in channels:
+            self.assertGreater(channel.calls, 1)
+            self.assertFalse(channel.concurrent)
+
+    def test_unregister(self):
+        channel = CountingChannel()
+        self.scheduler.register(channel, 0.01)
+        time.sleep(0.1)
+        self.scheduler.unregister(channel)
+        time.sleep(0.05)
+        calls = channel.calls
+        time.sleep(0.1)
+        self.assertEqual(channel.calls, calls)
+        self.assertFalse(self.scheduler.is_registered(channel))
+
+    def test_failing_update(self):
+        failing = CountingChannel(fail=True)
+        channel = CountingChannel()
+        self.scheduler.register(failing, 0.01)
+        self.scheduler.register(channel, 0.01)
+        time.sleep(0.2)
+        self.assertGreater(failing.calls, 1)
+        self.assertGreater(channel.calls, 1)
+
+    def test_reschedule(self):
+        channel = CountingChannel()
+        self.scheduler.register(channel, 60)
+        time.sleep(0.1)
+        self.assertEqual(channel.calls, 1)
+        self.scheduler.reschedule(channel, 0)
+        time.sleep(0.1)
+        self.assertEqual(channel.calls, 2)
+
+    def test_adaptive_delay(self):
+        scheduler = self.scheduler
+        self.assertEqual(scheduler._next_delay(DeadlineChannel(0), 1, 3600), 1)
+        self.assertEqual(
+            scheduler._next_delay(DeadlineChannel(2), 1, 3600), BLOCK_TIME
+        )
+        self.assertEqual(
+            scheduler._next_delay(DeadlineChannel(1000), 1, 3600), 3600
+        )
+        self.assertEqual(
+            scheduler._next_delay(DeadlineChannel(None), 1, 3600), 3600
+        )
+        self.assertEqual(scheduler._next_delay(DeadlineChannel(None), 1,
+                                               None), 1)
+
+    def test_adaptive_updates(self):
+        urgent = DeadlineChannel(0)
+        idle = DeadlineChannel(None)
+        self.scheduler.register(urgent, 0.01, max_interval=60)
+        self.scheduler.register(idle, 0.01, max_interval=60)
+        time.sleep(0.2)
+        self.assertGreater(urgent.calls, 1)
+        self.assertEqual(idle.calls, 1)
+
+    def test_channel_auto_update(self):
+        payee = picopayments.channel.Payee(
+            ASSET, testnet=True, dryrun=True, auto_update_interval=0.01,
+            scheduler=self.scheduler
+        )
+        self.assertTrue(self.scheduler.is_registered(payee))
+        self.assertIsNone(payee._update_thread)
+        payee.stop()
+        self.assertFalse(self.scheduler.is_registered(payee))
+
+
+class TestDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.btctxstore = FakeBtcTxStore()
+        self.watcher = ChainWatcher(btctxstore=self.btctxstore)
+        self.payer = picopayments.channel.Payer(ASSET, testnet=True)
+        self.payer.control.btctxstore = self.btctxstore
+        self.payer.control.get_watcher = lambda: self.watcher
+        self.payer.deposit_rawtx = RAWTX
+        self.payer.deposit_script_hex = (
+            "63522102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d29"
+            "987792d52103c7b09d53bdb0ef9cfea06c1e6f2192e6a91cdeac209402bc36c1"
+            "c368021a861152ae6763a9144cc776751eb4d41f23feaf94697cb7ec2fe597a4"
+            "882102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d2998"
+            "7792d5ac6703ffff00b2752102a73443bc32f5fec6a551f71af75311b0876686"
+            "156d16d367562d3d29987792d5ac6868"
+        )
+
+    def test_idle(self):
+        payer = picopayments.channel.Payer(ASSET, testnet=True)
+        self.assertIsNone(payer.get_blocks_until_deadline())
+
+    def test_deposit_unconfirmed(self):
+        self.assertEqual(self.payer.get_blocks_until_deadline(), 1)
+
+    def test_deposit_expire(self):
+        txid = picopayments.util.gettxid(RAWTX)
+        self.btctxstore.mine(txid)
+        self.btctxstore.mine()
+        expire_time = 0xffff
+        self.assertEqual(self.payer.get_blocks_until_deadline(),
+                         expire_time - 2)
+
+    def test_deposit_expired(self):
+        self.payer.get_deposit_confirms = lambda: 0xffff + 5
+        self.assertIsNone(self.payer.get_blocks_until_deadline())
+
+    def _commit(self, delay_passed):
+        commit = {"rawtx": UNSIGNED_COMMIT_RAWTX, "script": COMMIT_SCRIPT,
+                  "revoke_secret": None}
+        self.payer._add_active(commit, 1)
+        self.btctxstore.mine(picopayments.util.gettxid(RAWTX))
+        self.btctxstore.mine(picopayments.util.gettxid(UNSIGNED_COMMIT_RAWTX))
+        for i in range(5 if delay_passed else 1):  # commit delay time is 5
+            self.btctxstore.mine()
+
+    def test_commit_delay(self):
+        self._commit(delay_passed=False)
+        self.payer.get_deposit_confirms = lambda: 0xffff  # expired
+        self.assertIsNone(self.payer.get_blocks_until_deadline())  # unseen
+        self.payer.get_confirms(UNSIGNED_COMMIT_RAWTX)  # seen published
+        self.assertEqual(self.payer.get_blocks_until_deadline(), 3)
+
+    def test_commit_delay_passed(self):
+        self._commit(delay_passed=True)
+        self.payer.get_deposit_confirms = lambda: 0xffff  # expired
+        self.payer.get_confirms(UNSIGNED_COMMIT_RAWTX)  # seen published
+        self.assertIsNone(self.payer.get_blocks_until_deadline())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,16 @@
+import os
+import random
+import threading
 import unittest
 import picopayments
+from pycoin.tx import Tx
+from pycoin.tx.script import tools
+from pycoin.tx.pay_to import SUBCLASSES
+from pycoin.tx.pay_to import build_hash160_lookup
+from pycoin.tx.pay_to import build_p2sh_lookup
+from .control import DEPOSIT_SCRIPT
+from .control import DEPOSIT_RAWTX
+from .control import UNSIGNED_COMMIT_RAWTX
 
 
 PAYER_WIF = "cTbkqeNsCnzxWTTBZG47ZXaThthdNJ2cxkkDoHgsAgkmkVtGe8TJ"
@@ -10,6 +21,7 @@ SPEND_SECRET = (
     "f3e9e94cbaf2dd78346ec9b1a542bea78a6484decd8702e97df5f6b1928137df"
 )
 SPEND_SECRET_HASH = picopayments.util.hash160hex(SPEND_SECRET)
+DEPOSIT_PAYER_WIF = "cSthi1Ye1sbHepC5s8rNukQBAKLCyct6hLg6MCH9Ybk1cKfGcPb2"
 
 
 class TestScripts(unittest.TestCase):
@@ -75,5 +87,202 @@ class TestScripts(unittest.TestCase):
         self.assertRaises(ValueError, callback)
 
 
+class TestSolvers(unittest.TestCase):
+
+    def _unsigned_commit(self):
+        tx = Tx.from_hex(UNSIGNED_COMMIT_RAWTX)
+        tx.unspents = [Tx.from_hex(DEPOSIT_RAWTX).txs_out[0]]
+        return tx
+
+    def _sign(self, tx):
+        script = picopayments.util.h2b(DEPOSIT_SCRIPT)
+        solver = picopayments.scripts.get_deposit_solver(
+            picopayments.scripts.get_deposit_expire_time(script)
+        )
+        hash160_lookup = build_hash160_lookup([
+            picopayments.util.wif2secretexponent(DEPOSIT_PAYER_WIF)
+        ])
+        picopayments.scripts.sign_p2sh(
+            tx, script, solver, hash160_lookup,
+            spend_type="create_commit", spend_secret=None
+        )
+        return tx.as_hex()
+
+    def test_cached(self):
+        get_deposit_solver = picopayments.scripts.get_deposit_solver
+        get_commit_solver = picopayments.scripts.get_commit_solver
+        self.assertIs(get_deposit_solver(5), get_deposit_solver(5))
+        self.assertIsNot(get_deposit_solver(5), get_deposit_solver(6))
+        self.assertIsNot(get_deposit_solver(5), get_commit_solver(5))
+
+    def test_commit_template(self):
+        script = picopayments.scripts.compile_commit_script(
+            PAYER_PUBKEY, PAYEE_PUBKEY, SPEND_SECRET_HASH,
+            SPEND_SECRET_HASH, 7
+        )
+        solver = picopayments.scripts.get_commit_solver(7)
+        obj = solver.from_script(script)
+        self.assertEqual(obj.delay_time, 7)
+        self.assertEqual(picopayments.util.b2h(obj.payer_sec), PAYER_PUBKEY)
+        self.assertEqual(picopayments.util.b2h(obj.payee_sec), PAYEE_PUBKEY)
+
+    def test_matches_pycoin_sign(self):
+        script = picopayments.util.h2b(DEPOSIT_SCRIPT)
+        expected = self._unsigned_commit()
+        hash160_lookup = build_hash160_lookup([
+            picopayments.util.wif2secretexponent(DEPOSIT_PAYER_WIF)
+        ])
+        expire_time = picopayments.scripts.get_deposit_expire_time(script)
+        with picopayments.scripts.DepositScriptHandler(expire_time):
+            expected.sign(hash160_lookup,
+                          p2sh_lookup=build_p2sh_lookup([script]),
+                          spend_type="create_commit", spend_secret=None)
+        self.assertEqual(self._sign(self._unsigned_commit()),
+                         expected.as_hex())
+
+    def test_parallel_signing(self):
+        expected = self._sign(self._unsigned_commit())
+        subclasses = list(SUBCLASSES)
+        results = []
+
+        def sign():
+            for i in range(3):
+                results.append(self._sign(self._unsigned_commit()))
+        threads = [threading.Thread(target=sign) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [expected] * 12)
+        self.assertEqual(SUBCLASSES, subclasses)
+
+
+def compile_text(template, **fields):
+    """Reference text compiler the byte splicing compiler must match."""
+    fields = dict((k, str(v)) for k, v in fields.items())
+    return tools.compile(template.format(**fields))
+
+
+class TestCompile(unittest.TestCase):
+
+    TIMES = [0, 1, 16, 17, 127, 128, 255, 256, 0x7fff, 0x8000, 0xffff]
+
+    def _random_hex(self, size):
+        return picopayments.util.b2h(os.urandom(size))
+
+    def test_deposit_matches_text(self):
+        for time in self.TIMES + [random.randint(0, 0xffff)
+                                  for i in range(100)]:
+            args = {
+                "payer_pubkey": self._random_hex(33),
+                "payee_pubkey": self._random_hex(33),
+                "spend_secret_hash": self._random_hex(20),
+                "expire_time": time
+            }
+            self.assertEqual(
+                picopayments.scripts.compile_deposit_script(**args),
+                compile_text(picopayments.scripts.DEPOSIT_SCRIPT, **args)
+            )
+
+    def test_commit_matches_text(self):
+        for time in self.TIMES + [random.randint(0, 0xffff)
+                                  for i in range(100)]:
+            args = {
+                "payer_pubkey": self._random_hex(33),
+                "payee_pubkey": self._random_hex(33),
+                "spend_secret_hash": self._random_hex(20),
+                "revoke_secret_hash": self._random_hex(20),
+                "delay_time": time
+            }
+            self.assertEqual(
+                picopayments.scripts.compile_commit_script(**args),
+                compile_text(picopayments.scripts.COMMIT_SCRIPT, **args)
+            )
+
+    def test_solver_templates_match_text(self):
+        self.assertEqual(
+            picopayments.scripts.get_deposit_solver(5).TEMPLATE,
+            compile_text(picopayments.scripts.DEPOSIT_SCRIPT,
+                         payer_pubkey="OP_PUBKEY", payee_pubkey="OP_PUBKEY",
+                         spend_secret_hash="OP_PUBKEYHASH", expire_time=5)
+        )
+        self.assertEqual(
+            picopayments.scripts.get_commit_solver(5).TEMPLATE,
+            compile_text(picopayments.scripts.COMMIT_SCRIPT,
+                         payer_pubkey="OP_PUBKEY", payee_pubkey="OP_PUBKEY",
+                         spend_secret_hash="OP_PUBKEYHASH",
+                         revoke_secret_hash="OP_PUBKEYHASH", delay_time=5)
+        )
+
+    def test_known_script(self):
+        script = picopayments.util.h2b(DEPOSIT_SCRIPT)
+        scripts = picopayments.scripts
+        compiled = scripts.compile_deposit_script(
+            scripts.get_deposit_payer_pubkey(script),
+            scripts.get_deposit_payee_pubkey(script),
+            scripts.get_deposit_spend_secret_hash(script),
+            scripts.get_deposit_expire_time(script)
+        )
+        self.assertEqual(compiled, script)
+
+
+class TestParsedScripts(unittest.TestCase):
+
+    def setUp(self):
+        self.deposit = picopayments.scripts.compile_deposit_script(
+            PAYER_PUBKEY, PAYEE_PUBKEY, SPEND_SECRET_HASH, 1337
+        )
+        self.commit = picopayments.scripts.compile_commit_script(
+            PAYER_PUBKEY, PAYEE_PUBKEY, SPEND_SECRET_HASH,
+            "00" * 20, 42
+        )
+
+    def test_deposit(self):
+        parsed = picopayments.scripts.DepositScript.parse(self.deposit)
+        self.assertEqual(parsed.payer_pubkey, PAYER_PUBKEY)
+        self.assertEqual(parsed.payee_pubkey, PAYEE_PUBKEY)
+        self.assertEqual(parsed.spend_secret_hash, SPEND_SECRET_HASH)
+        self.assertEqual(parsed.expire_time, 1337)
+        self.assertEqual(parsed.script, self.deposit)
+
+    def test_commit(self):
+        parsed = picopayments.scripts.CommitScript.parse(self.commit)
+        self.assertEqual(parsed.payer_pubkey, PAYER_PUBKEY)
+        self.assertEqual(parsed.payee_pubkey, PAYEE_PUBKEY)
+        self.assertEqual(parsed.spend_secret_hash, SPEND_SECRET_HASH)
+        self.assertEqual(parsed.revoke_secret_hash, "00" * 20)
+        self.assertEqual(parsed.delay_time, 42)
+
+    def test_cached(self):
+        DepositScript = picopayments.scripts.DepositScript
+        parsed = DepositScript.parse(self.deposit)
+        self.assertIs(DepositScript.parse(bytearray(self.deposit)), parsed)
+
+    def test_invalid_layout(self):
+        DepositScript = picopayments.scripts.DepositScript
+        CommitScript = picopayments.scripts.CommitScript
+        invalid = [
+            self.deposit[:-1],  # truncated
+            self.deposit + b"\x00",  # trailing data
+            b"\x00" + self.deposit[1:],  # OP_0 instead of OP_IF
+            self.deposit[:36] + b"\x20" + self.deposit[37:],  # short key
+            self.commit,  # other script type
+        ]
+        for script in invalid:
+            self.assertRaises(ValueError, DepositScript.parse, script)
+        self.assertRaises(ValueError, CommitScript.parse, self.deposit)
+
+    def test_inconsistent_payer_pubkey(self):
+        script = picopayments.scripts.compile_deposit_script(
+            PAYER_PUBKEY, PAYEE_PUBKEY, SPEND_SECRET_HASH, 1337
+        )
+        # replace the timeout branch payer pubkey with the payee pubkey
+        index = script.rindex(picopayments.util.h2b(PAYER_PUBKEY))
+        script = (script[:index] + picopayments.util.h2b(PAYEE_PUBKEY) +
+                  script[index + 33:])
+        self.assertRaises(ValueError,
+                          picopayments.scripts.DepositScript.parse, script)
+
+
 if __name__ == "__main__":
     unittest.main()
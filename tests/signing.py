@@ -0,0 +1,100 @@
+import unittest
+import picopayments
+from pycoin.tx import Tx
+from picopayments import signing
+from .control import ASSET
+from .control import DEPOSIT_SCRIPT
+from .control import DEPOSIT_RAWTX
+from .control import UNSIGNED_COMMIT_RAWTX
+from .scripts import DEPOSIT_PAYER_WIF
+from .commit import PAYEE_BEFORE_CLOSE
+from .commit import PAYEE_AFTER_CLOSE
+
+
+def unsigned_commit():
+    tx = Tx.from_hex(UNSIGNED_COMMIT_RAWTX)
+    tx.unspents = [Tx.from_hex(DEPOSIT_RAWTX).txs_out[0]]
+    return tx
+
+
+class TestSigningService(unittest.TestCase):
+
+    def setUp(self):
+        self.service = signing.SigningService(processes=2)
+        self.kwargs = {
+            "payer_wif": DEPOSIT_PAYER_WIF,
+            "deposit_script": picopayments.util.h2b(DEPOSIT_SCRIPT)
+        }
+        self.expected = signing.sign("create_commit", unsigned_commit(),
+                                     **self.kwargs)
+
+    def tearDown(self):
+        self.service.close()
+
+    def test_sign(self):
+        rawtx = self.service.sign("create_commit", unsigned_commit(),
+                                  **self.kwargs)
+        self.assertEqual(rawtx, self.expected)
+
+    def test_sign_all(self):
+        jobs = [
+            self.service.create_job("create_commit", unsigned_commit(),
+                                    **self.kwargs)
+            for i in range(4)
+        ]
+        self.assertEqual(self.service.sign_all(jobs), [self.expected] * 4)
+        self.assertEqual(self.service.sign_all([]), [])
+
+    def test_control(self):
+        control = picopayments.control.Control(ASSET, testnet=True,
+                                               signer=self.service)
+        local = picopayments.control.Control(ASSET, testnet=True)
+        script = picopayments.util.h2b(DEPOSIT_SCRIPT)
+        rawtx = control._sign_create_commit(unsigned_commit(),
+                                            DEPOSIT_PAYER_WIF, script)
+        self.assertEqual(rawtx, self.expected)
+        job = control._create_job("create_commit", unsigned_commit(),
+                                  **self.kwargs)
+        self.assertEqual(control.sign_all([job]), [self.expected])
+        job = local._create_job("create_commit", unsigned_commit(),
+                                **self.kwargs)
+        self.assertEqual(local.sign_all([job]), [self.expected])
+
+    def test_key_references(self):
+        job = self.service.create_job("create_commit", unsigned_commit(),
+                                      **self.kwargs)
+        self.assertNotIn(DEPOSIT_PAYER_WIF, repr(job))  # wif not pickled
+        self.assertEqual(self.service.sign_all([job]), [self.expected])
+
+    def test_unknown_key_reference(self):
+        job = signing.create_job("create_commit", unsigned_commit(),
+                                 **self.kwargs)  # wif instead of reference
+        with self.assertRaises(ValueError) as context:
+            self.service.sign_all([job])
+        self.assertIn("Unknown signing key reference", str(context.exception))
+
+    def test_add_key_keeps_pool(self):
+        rawtx = self.service.sign("create_commit", unsigned_commit(),
+                                  **self.kwargs)
+        self.assertEqual(rawtx, self.expected)
+        pool = self.service._pool
+        self.test_finalize_commits()  # signs with a new key
+        self.assertIs(self.service._pool, pool)
+
+    def test_finalize_commits(self):
+        control = picopayments.control.Control(ASSET, testnet=True,
+                                               dryrun=True,
+                                               signer=self.service)
+        control.add_tx(PAYEE_BEFORE_CLOSE["deposit_rawtx"])
+        commit = (
+            PAYEE_BEFORE_CLOSE["payee_wif"],
+            PAYEE_BEFORE_CLOSE["commits_active"][0]["rawtx"],
+            picopayments.util.h2b(PAYEE_BEFORE_CLOSE["deposit_script_hex"])
+        )
+        expected = PAYEE_AFTER_CLOSE["commits_active"][0]["rawtx"]
+        self.assertEqual(control.finalize_commits([commit] * 3),
+                         [expected] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
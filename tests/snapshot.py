@@ -0,0 +1,103 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import picopayments
+from picopayments import snapshot
+from .commit import ASSET
+from .commit import API_URL
+from .commit import DELAY_TIME
+from .commit import PAYER_BEFORE
+from .commit import PAYEE_BEFORE_REQUEST
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "channels")
+        self.payer = self._channel(picopayments.channel.Payer)
+        self.payee = self._channel(picopayments.channel.Payee)
+        self.payer.load(PAYER_BEFORE)
+        self.payee.load(PAYEE_BEFORE_REQUEST)
+        for quantity in range(1, 6):
+            amount, revoke_hash = self.payee.request_commit(quantity)
+            commit = self.payer.create_commit(amount, revoke_hash,
+                                              DELAY_TIME)
+            self.payee.set_commit(commit["rawtx"], commit["script"])
+        self.payee.request_commit(6)  # unanswered
+        self.payer.revoke_all(self.payee.revoke_until(3))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _channel(self, cls):
+        return cls(ASSET, api_url=API_URL, testnet=True, dryrun=True)
+
+    def test_failed_write(self):
+        snapshot.write(self.path, {"payee": self.payee})
+        self.payer.save = None  # not callable, fails while writing
+        self.assertRaises(TypeError, snapshot.write, self.path,
+                          {"payer": self.payer, "payee": self.payee})
+        self.assertEqual(os.listdir(self.tempdir), ["channels"])
+        with snapshot.Snapshot(self.path) as snap:  # old snapshot intact
+            self.assertEqual(snap.keys(), ["payee"])
+
+    def test_roundtrip(self):
+        snapshot.write(self.path, {"payer": self.payer, "payee": self.payee})
+        with snapshot.Snapshot(self.path) as snap:
+            self.assertEqual(len(snap), 2)
+            self.assertEqual(sorted(snap.keys()), ["payee", "payer"])
+            self.assertIn("payer", snap)
+            payer = snap.load("payer", self._channel(
+                picopayments.channel.Payer
+            ))
+            payee = snap.load("payee", self._channel(
+                picopayments.channel.Payee
+            ))
+        self.assertEqual(payer.save(), self.payer.save())
+        self.assertEqual(payee.save(), self.payee.save())
+        self.assertEqual(payee.active_quantities, [1, 2, 3])
+        self.assertEqual(payer.get_transferred_amount(), 3)
+
+    def test_empty_channel(self):
+        channel = self._channel(picopayments.channel.Payee)
+        snapshot.write(self.path, {"empty": channel})
+        with snapshot.Snapshot(self.path) as snap:
+            state, quantities = snap.get("empty")
+        self.assertEqual(state, channel.save())
+        self.assertEqual(quantities, [])
+
+    def test_smaller_than_json(self):
+        snapshot.write(self.path, {"payee": self.payee})
+        size = len(json.dumps(self.payee.save()))
+        self.assertLess(os.path.getsize(self.path), size * 0.6)
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"\x00" * snapshot.HEADER.size)
+        self.assertRaises(ValueError, snapshot.Snapshot, self.path)
+
+    def _assert_truncated(self):
+        with self.assertRaises(ValueError) as context:
+            snapshot.Snapshot(self.path)
+        self.assertEqual(str(context.exception), "Truncated snapshot!")
+
+    def test_empty_file(self):
+        open(self.path, "wb").close()
+        self._assert_truncated()
+
+    def test_truncated_file(self):
+        snapshot.write(self.path, {"payer": self.payer, "payee": self.payee})
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for size in [snapshot.HEADER.size - 1, len(data) // 2,
+                     len(data) - 1]:
+            with open(self.path, "wb") as f:
+                f.write(data[:size])
+            self._assert_truncated()
+
+
+if __name__ == "__main__":
+    unittest.main()
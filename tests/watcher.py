@@ -0,0 +1,235 @@
+import threading
+import unittest
+import picopayments
+from picopayments.watcher import ChainWatcher
+
+
+ASSET = "A14456548018133352000"
+RAWTX = (
+    "0100000001d85205661d29fec2e5ede0dbb8eaa0e55655c7b14b1aeac9b0e72dae01596f"
+    "63000000006b483045022100e631d8b259bd09ba8956a96e6e471e9938ddad1fa831bb12"
+    "ffa690f2d0d2640002202cf3bcc376225e1861443608cad549d63a76b636225630946942"
+    "205dfd8f4672012102a73443bc32f5fec6a551f71af75311b0876686156d16d367562d3d"
+    "29987792d5ffffffff03d2b400000000000017a9145c6f176aa8bab82688c8b07562595a"
+    "622d7b889a8700000000000000001e6a1c6c4d9b5afac6415f4eff0ec371c5d8155b5821"
+    "76fa9e12aed0cc84645e310200000000001976a914a5efd9bcdc152be40dc2390607a806"
+    "b32cf2902c88ac00000000"
+)
+TXID = picopayments.util.gettxid(RAWTX)
+
+
+class FakeHeader(object):
+
+    def __init__(self, height, previous_block_hash):
+        self.height = height
+        self.previous_block_hash = previous_block_hash
+
+
+class FakeService(object):
+
+    def __init__(self):
+        self.chain = [b"genesis"]  # block hash per height
+        self.headers = {b"genesis": FakeHeader(0, None)}
+        self.confirms = {}  # {txid: height}
+        self.calls = 0
+
+    @property
+    def height(self):
+        return len(self.chain) - 1
+
+    def get_blockchain_tip(self):
+        return self.chain[-1]
+
+    def get_blockheader(self, block_hash):
+        return self.headers[block_hash]
+
+
+class FakeBtcTxStore(object):
+
+    def __init__(self):
+        self.service = FakeService()
+
+    def confirms(self, txid):
+        self.service.calls += 1
+        height = self.service.confirms.get(txid)
+        if height is None:
+            return None
+        return self.service.height - height + 1
+
+    def mine(self, *txids, **kwargs):
+        service = self.service
+        fork = kwargs.get("fork", "")
+        block_hash = "{0}{1}".format(fork, len(service.chain)).encode("ascii")
+        service.headers[block_hash] = FakeHeader(len(service.chain),
+                                                 service.chain[-1])
+        service.chain.append(block_hash)
+        for txid in txids:
+            service.confirms.setdefault(txid, service.height)
+
+    def reorg(self, height):
+        """Drop all blocks above height and their transactions."""
+        service = self.service
+        del service.chain[height + 1:]
+        for txid, tx_height in list(service.confirms.items()):
+            if tx_height > height:
+                del service.confirms[txid]
+
+
+class TestChainWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.btctxstore = FakeBtcTxStore()
+        self.watcher = ChainWatcher(btctxstore=self.btctxstore)
+
+    def test_queries_once_per_block(self):
+        self.assertIsNone(self.watcher.get_confirms(TXID))
+        self.btctxstore.mine(TXID)
+        for i in range(10):
+            self.watcher.update()
+            self.assertEqual(self.watcher.get_confirms(TXID), 1)
+        self.assertEqual(self.btctxstore.service.calls, 2)
+        self.assertEqual(self.watcher.height, 1)
+
+    def test_confirmed_not_refetched(self):
+        self.watcher.get_confirms(TXID)
+        for i in range(3):
+            self.btctxstore.mine(TXID)
+            self.watcher.update()
+        self.assertEqual(self.watcher.get_confirms(TXID), 3)
+        self.assertEqual(self.watcher.heights, {TXID: 1})
+        self.assertEqual(self.btctxstore.service.calls, 2)
+
+    def test_reorg_refetches(self):
+        self.btctxstore.mine()
+        self.btctxstore.mine(TXID)
+        self.watcher.get_confirms(TXID)
+        self.watcher.update()
+        self.btctxstore.reorg(1)
+        self.btctxstore.mine(fork="b")
+        self.btctxstore.mine(TXID, fork="b")
+        self.watcher.update()
+        self.assertEqual(self.watcher.get_confirms(TXID), 1)
+        self.assertEqual(self.watcher.heights, {TXID: 3})
+        self.assertEqual(self.btctxstore.service.calls, 3)
+
+    def test_subscribe(self):
+        notified = []
+        self.watcher.subscribe(TXID, lambda t, c: notified.append((t, c)))
+        self.watcher.subscribe_blocks(notified.append)
+        self.btctxstore.mine(TXID)
+        self.watcher.update()
+        self.watcher.update()  # same tip, nothing new
+        self.assertEqual(notified, [(TXID, 1), 1])
+
+    def test_wait_for_confirms(self):
+        self.assertFalse(self.watcher.wait_for_confirms(TXID, 2, timeout=0.01))
+
+        def mine():
+            for i in range(2):
+                self.btctxstore.mine(TXID)
+                self.watcher.update()
+        thread = threading.Thread(target=mine)
+        thread.start()
+        self.assertTrue(self.watcher.wait_for_confirms(TXID, 2, timeout=5))
+        thread.join()
+
+    def test_channel_uses_watcher(self):
+        payee = picopayments.channel.Payee(ASSET, testnet=True,
+                                           watcher=self.watcher)
+        self.btctxstore.mine(TXID)
+        self.watcher.update()
+        self.assertIs(payee.control.watcher, self.watcher)
+        self.assertEqual(payee.control.confirms(TXID), 1)
+        self.assertEqual(self.btctxstore.service.calls, 1)
+
+    def test_detects_reorg(self):
+        for i in range(5):
+            self.btctxstore.mine()
+            self.watcher.update()
+        self.btctxstore.reorg(2)
+        self.btctxstore.mine(fork="b")
+        self.btctxstore.mine(fork="b")
+        self.btctxstore.mine(fork="b")
+        self.watcher.update()
+        self.assertEqual(self.watcher.get_forks(), (1, 3))
+        self.assertEqual(self.watcher.get_forks(1), (1, None))
+
+    def test_concurrent_updates(self):
+        self.btctxstore.mine()
+        self.watcher.update()
+        self.btctxstore.mine()
+        service = self.btctxstore.service
+        get_blockheader = service.get_blockheader
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_header(block_hash):  # first caller blocks on the new tip
+            if not started.is_set():
+                started.set()
+                release.wait(5)
+            return get_blockheader(block_hash)
+        service.get_blockheader = slow_header
+        thread = threading.Thread(target=self.watcher.update)
+        thread.start()
+        started.wait(5)
+        second = threading.Thread(target=self.watcher.update)
+        second.start()
+        second.join(0.5)  # finishes first unless updates are serialized
+        release.set()
+        thread.join()
+        second.join()
+        self.assertEqual(self.watcher.height, 2)
+        self.assertEqual(self.watcher.get_forks(), (0, None))
+
+
+class TestConfirmHeights(unittest.TestCase):
+
+    def setUp(self):
+        self.btctxstore = FakeBtcTxStore()
+        self.watcher = ChainWatcher(btctxstore=self.btctxstore)
+        self.payer = picopayments.channel.Payer(ASSET, testnet=True,
+                                                watcher=self.watcher)
+        self.payer.control.watcher = None  # confirms from remote service
+        self.payer.control.btctxstore = self.btctxstore
+        self.payer.control.get_watcher = lambda: self.watcher
+
+    def test_derived_from_tip(self):
+        self.btctxstore.mine()
+        self.btctxstore.mine(TXID)
+        self.assertEqual(self.payer.get_confirms(RAWTX), 1)
+        for i in range(3):
+            self.btctxstore.mine()
+            self.watcher.update()
+        self.assertEqual(self.payer.get_confirms(RAWTX), 4)
+        self.assertEqual(self.btctxstore.service.calls, 1)
+
+    def test_stale_tip_not_recorded(self):
+        self.btctxstore.mine(TXID)
+        self.watcher.update()
+        self.btctxstore.mine()  # cached tip is one block behind
+        self.assertEqual(self.payer.get_confirms(RAWTX), 2)
+        self.assertEqual(self.payer.confirm_heights, {})
+        self.assertEqual(self.payer.get_confirms(RAWTX), 2)
+        self.assertEqual(self.payer.confirm_heights, {TXID: 1})
+
+    def test_unconfirmed(self):
+        self.assertEqual(self.payer.get_confirms(RAWTX), 0)
+        self.assertEqual(self.payer.get_confirms(RAWTX), 0)
+        self.assertEqual(self.btctxstore.service.calls, 2)
+
+    def test_reorg_invalidates(self):
+        self.btctxstore.mine()
+        self.btctxstore.mine()
+        self.btctxstore.mine(TXID)
+        self.assertEqual(self.payer.get_confirms(RAWTX), 1)
+        self.btctxstore.reorg(1)
+        self.btctxstore.mine(TXID, fork="b")
+        self.btctxstore.mine(fork="b")
+        self.btctxstore.mine(fork="b")
+        self.watcher.update()
+        self.assertEqual(self.payer.get_confirms(RAWTX), 3)
+        self.assertEqual(self.btctxstore.service.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()